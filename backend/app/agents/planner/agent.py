@@ -1,43 +1,232 @@
-from dotenv import load_dotenv
 from google import genai
-import os
-from google.adk.agents import Agent, LlmAgent
-from google.genai import types
+import asyncio
+import httpx
+import json
+import logging
+from google.adk.agents import LlmAgent
+from google.genai import errors, types
 import time
-import re
-import tempfile
-import os
-from fastapi import UploadFile
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, TypeVar
+from opentelemetry import trace
+from app.core.config import settings
+from app.core.resilience import CircuitBreaker, CircuitOpenError, RetryPolicy, retry_async
+from app.core.tracing import tracer
+from .result_cache import result_cache, youtube_video_identity
+from .scene_index import scene_index_reader
+from .video_context import VideoContextCache
 
-load_dotenv()
+logger = logging.getLogger(__name__)
 
-client = genai.Client(api_key=os.getenv("GOOGLE_API_KEY"))
+client = genai.Client(api_key=settings.GOOGLE_API_KEY)
 
-async def upload_to_gemini(file_path: str):
-    """Uploads a file to Gemini and returns the file object."""
-    print(f"Uploading file: {file_path}")
-    myfile = client.files.upload(file=file_path)
-    print(f"File uploaded: {myfile.name}, state: {myfile.state}")
+# Model the planner's tools ask about videos; part of their result cache keys.
+PLANNER_TOOL_MODEL = "gemini-2.5-flash-preview-05-20"
 
+T = TypeVar("T")
+
+def _is_gemini_failure(e: BaseException) -> bool:
+    # Uploads talk to Gemini's HTTP API directly, so its 5xx answers arrive as httpx errors there.
+    if isinstance(e, httpx.HTTPStatusError):
+        return e.response.status_code >= 500
+    return isinstance(e, (errors.ServerError, httpx.TransportError, asyncio.TimeoutError))
+
+def _is_transient_gemini_error(e: BaseException) -> bool:
+    # Timeouts are not retried: another full wait would outlast the planner's own patience.
+    return isinstance(e, (errors.ServerError, httpx.TransportError)) or (isinstance(e, errors.ClientError) and e.code == 429)
+
+# Shared by every Gemini call in the process, so an outage fails calls fast instead of each waiting out its timeout.
+gemini_breaker = CircuitBreaker(
+    "gemini",
+    failure_threshold=settings.GEMINI_BREAKER_FAILURES,
+    reset_timeout=settings.GEMINI_BREAKER_RESET_SECONDS,
+    is_failure=_is_gemini_failure,
+)
+# For reads and generations only; uploads and deletes are not retried.
+gemini_retry = RetryPolicy(settings.GEMINI_RETRY_ATTEMPTS, 0.5, 8.0, retry_on=_is_transient_gemini_error)
+
+async def call_gemini(fn: Callable[[], Awaitable[T]]) -> T:
+    """Calls Gemini through its circuit breaker, retrying transient errors with jittered backoff."""
+    return await retry_async(fn, gemini_retry, gemini_breaker)
+
+video_context_cache = VideoContextCache(
+    client, result_cache.client, PLANNER_TOOL_MODEL,
+    ttl=settings.PLANNER_VIDEO_CONTEXT_TTL_SECONDS, enabled=settings.PLANNER_VIDEO_CONTEXT_CACHE
+)
+
+# Reply the model gives when a video's scene index does not hold the answer.
+INDEX_INSUFFICIENT = "INSUFFICIENT_INDEX"
+INDEX_ANSWER_PROMPT = f"""Below is a scene-by-scene index of a video, as JSON: each scene's start and end in seconds, a description,
+its on-screen text and its transcript. Answer the question using only this index, citing timestamps where useful.
+If the index does not contain enough information to answer fully and accurately, reply with exactly {INDEX_INSUFFICIENT}.
+
+Question: {{question}}
+
+Index:
+{{index}}"""
+
+GEMINI_UPLOAD_URL = "https://generativelanguage.googleapis.com/upload/v1beta/files"
+# Resumable upload chunks must be a multiple of 256 KiB (except the last one).
+GEMINI_UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+
+@tracer.start_as_current_span("gemini.upload_stream")
+async def upload_stream_to_gemini(chunks: AsyncIterator[bytes], size: int, mime_type: str, display_name: str = None) -> str:
+    """
+    Uploads a stream of chunks of known total size to Gemini with the resumable upload protocol
+    and returns the file name (e.g. "files/abc123"). The file is usually still PROCESSING;
+    use wait_for_gemini_file before referencing it.
+    """
+    logger.info("Uploading stream to Gemini: %s (%d bytes)", display_name, size)
+    # The whole upload is one call through the breaker: a 5xx from the start or any chunk counts against Gemini,
+    # and only a finished upload counts for it.
+    async with httpx.AsyncClient(timeout=httpx.Timeout(120.0, connect=10.0)) as http, gemini_breaker.guard():
+        start = await http.post(
+            GEMINI_UPLOAD_URL,
+            headers={
+                "x-goog-api-key": settings.GOOGLE_API_KEY,
+                "X-Goog-Upload-Protocol": "resumable",
+                "X-Goog-Upload-Command": "start",
+                "X-Goog-Upload-Header-Content-Length": str(size),
+                "X-Goog-Upload-Header-Content-Type": mime_type,
+            },
+            json={"file": {"display_name": display_name}} if display_name else {},
+        )
+        start.raise_for_status()
+        upload_url = start.headers["x-goog-upload-url"]
+
+        offset = 0
+        buffer = bytearray()
+
+        async def send(body: bytes, finalize: bool) -> httpx.Response:
+            response = await http.post(
+                upload_url,
+                headers={
+                    "X-Goog-Upload-Command": "upload, finalize" if finalize else "upload",
+                    "X-Goog-Upload-Offset": str(offset),
+                },
+                content=body,
+            )
+            response.raise_for_status()
+            return response
+
+        async for chunk in chunks:
+            buffer.extend(chunk)
+            # Keep the tail buffered so the final request can carry the finalize command.
+            while len(buffer) > GEMINI_UPLOAD_CHUNK_SIZE:
+                await send(bytes(buffer[:GEMINI_UPLOAD_CHUNK_SIZE]), finalize=False)
+                offset += GEMINI_UPLOAD_CHUNK_SIZE
+                del buffer[:GEMINI_UPLOAD_CHUNK_SIZE]
+        final = await send(bytes(buffer), finalize=True)
+
+    if final.headers.get("x-goog-upload-status") != "final":
+        raise Exception("Gemini upload was not finalized.")
+    file_name = final.json()["file"]["name"]
+    logger.info("Stream uploaded to Gemini: %s", file_name)
+    return file_name
+
+@tracer.start_as_current_span("gemini.wait_for_file")
+async def wait_for_gemini_file(file_name: str):
+    """
+    Waits, without blocking the event loop, until an uploaded Gemini file is ACTIVE and returns it.
+    Polls with exponential backoff and raises TimeoutError after GEMINI_UPLOAD_TIMEOUT seconds.
+    """
+    deadline = time.monotonic() + settings.GEMINI_UPLOAD_TIMEOUT
+    myfile = await call_gemini(lambda: client.aio.files.get(name=file_name))
+    polls = 1
+
+    delay = settings.GEMINI_POLL_INITIAL_DELAY
     while myfile.state != "ACTIVE":
-        print(f"Waiting for file to become active. Current state: {myfile.state}")
-        time.sleep(2)
-        myfile = client.files.get(name=myfile.name)
         if myfile.state == "FAILED":
             raise Exception(f"Gemini file processing failed: {myfile.error}")
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError(f"Gemini file {myfile.name} did not become active within {settings.GEMINI_UPLOAD_TIMEOUT:.0f}s")
+        logger.debug("Waiting for Gemini file %s to become active, state: %s", file_name, myfile.state)
+        await asyncio.sleep(min(delay, remaining))
+        delay = min(delay * 2, settings.GEMINI_POLL_MAX_DELAY)
+        myfile = await call_gemini(lambda: client.aio.files.get(name=file_name))
+        polls += 1
 
-    print(f"File is active: {myfile.name}")
+    trace.get_current_span().set_attribute("gemini.polls", polls)
+    logger.info("Gemini file %s is active after %d polls", file_name, polls)
     return myfile
 
-async def generate_from_file(file_id: str, prompt: str):
-    file_reference = client.files.get(name=file_id)
-    response = client.models.generate_content(
-        model="gemini-2.5-flash-preview-05-20",
-        contents=[file_reference, prompt]
+async def delete_gemini_file(file_name: str):
+    """Deletes an uploaded file from Gemini."""
+    await client.aio.files.delete(name=file_name)
+
+async def _generate_content(**kwargs) -> types.GenerateContentResponse:
+    """
+    Calls Gemini on behalf of a planner tool, raising asyncio.TimeoutError after PLANNER_TOOL_TIMEOUT_SECONDS
+    and CircuitOpenError while Gemini is failing.
+    """
+    return await call_gemini(lambda: asyncio.wait_for(client.aio.models.generate_content(**kwargs), settings.PLANNER_TOOL_TIMEOUT_SECONDS))
+
+def _timed_out(question: str) -> str:
+    # Returned to the planner rather than raised, so it can still answer from its other tool results.
+    return f"Analyzing the video for \"{question}\" timed out after {settings.PLANNER_TOOL_TIMEOUT_SECONDS:.0f}s. Try a narrower question."
+
+def _unavailable(question: str, e: CircuitOpenError) -> str:
+    return f"Could not analyze the video for \"{question}\": {e}."
+
+async def _file_video(file_id: str):
+    return await call_gemini(lambda: asyncio.wait_for(client.aio.files.get(name=file_id), settings.PLANNER_TOOL_TIMEOUT_SECONDS))
+
+async def _youtube_video(youtube_url: str):
+    return types.Part(file_data=types.FileData(file_uri=youtube_url))
+
+async def _generate_about_video(video: str, load_video: Callable[[], Awaitable], prompt: str) -> str:
+    """Asks about a video through its cached context if it has one, otherwise sends the video along with the prompt."""
+    cached_content = await video_context_cache.lookup(video)
+    if cached_content:
+        try:
+            response = await _generate_content(
+                model=PLANNER_TOOL_MODEL,
+                contents=[prompt],
+                config=types.GenerateContentConfig(cached_content=cached_content)
+            )
+            return response.text
+        except errors.APIError as e:
+            logger.warning("Cached video context %s failed, sending the video instead: %s", cached_content, e)
+            await video_context_cache.invalidate(video, cached_content)
+
+    video_content = await load_video()
+    # The conversation is active (again); later calls can use the cached context.
+    video_context_cache.create_in_background(video, [video_content])
+    response = await _generate_content(
+        model=PLANNER_TOOL_MODEL,
+        contents=[video_content, prompt]
     )
-    return response
+    return response.text
+
+async def open_video_context(gemini_file_id: str = "", youtube_url: str = ""):
+    """Caches the context of a new conversation's video up front, so its first tool calls can already use it."""
+    if gemini_file_id:
+        await video_context_cache.create(f"file:{gemini_file_id}", [await _file_video(gemini_file_id)])
+    elif youtube_url:
+        await video_context_cache.create(youtube_video_identity(youtube_url), [await _youtube_video(youtube_url)])
+
+async def generate_from_file(file_id: str, prompt: str) -> str:
+    """
+    Generates text output from a video uploaded to Gemini.
 
-def generate_from_youtube(
+    Args:
+        file_id: The name of the uploaded Gemini file. Example: "files/abc123"
+        prompt: A textual instruction for the model.
+
+    Returns:
+        str: The text generated by the Gemini model based on the video and prompt.
+    """
+    async def generate() -> str:
+        return await _generate_about_video(f"file:{file_id}", lambda: _file_video(file_id), prompt)
+
+    try:
+        return await result_cache.get_or_generate(result_cache.key(f"file:{file_id}", prompt, PLANNER_TOOL_MODEL), generate)
+    except asyncio.TimeoutError:
+        return _timed_out(prompt)
+    except CircuitOpenError as e:
+        return _unavailable(prompt, e)
+
+async def generate_from_youtube(
     youtube_url: str,
     prompt: str = "Summarize this video in detail."
 ) -> str:
@@ -57,16 +246,85 @@ def generate_from_youtube(
         str: The text generated by the Gemini model based on the video
             and prompt. Example: "This video explains..."
     """
-    response = client.models.generate_content(
-        model="gemini-2.5-flash-preview-05-20",
-        contents=[
-            types.Part(
-                file_data=types.FileData(file_uri=youtube_url)
-            ),
-            types.Part(text=prompt)
-        ]
+    video = youtube_video_identity(youtube_url)
+
+    async def generate() -> str:
+        return await _generate_about_video(video, lambda: _youtube_video(youtube_url), prompt)
+
+    try:
+        return await result_cache.get_or_generate(result_cache.key(video, prompt, PLANNER_TOOL_MODEL), generate)
+    except asyncio.TimeoutError:
+        return _timed_out(prompt)
+    except CircuitOpenError as e:
+        return _unavailable(prompt, e)
+
+async def answer_from_scene_index(question: str, gemini_file_id: str = "", youtube_url: str = "") -> str:
+    """
+    Answers a question about a video from its precomputed scene index (timestamped descriptions, on-screen text
+    and transcript), which is much faster than analyzing the video again. Falls back to analyzing the video
+    itself when the video has no index or the index cannot answer the question.
+
+    Args:
+        question: The question to answer about the video.
+        gemini_file_id: The Gemini File ID of an uploaded video, if the message gives one.
+            Example: "files/abc123"
+        youtube_url: The URL of a YouTube video, if the message gives one.
+
+    Returns:
+        str: The answer to the question.
+    """
+    try:
+        segments = await scene_index_reader.load(gemini_file_id=gemini_file_id, youtube_url=youtube_url)
+    except Exception as e:
+        logger.warning("Failed to load scene index, analyzing the video instead: %s", e)
+        segments = None
+
+    if segments:
+        async def generate() -> str:
+            response = await _generate_content(
+                model=PLANNER_TOOL_MODEL,
+                contents=[INDEX_ANSWER_PROMPT.format(question=question, index=json.dumps(segments))]
+            )
+            return response.text
+
+        video = f"file:{gemini_file_id}" if gemini_file_id else youtube_video_identity(youtube_url)
+        try:
+            answer = await result_cache.get_or_generate(result_cache.key(f"index:{video}", question, PLANNER_TOOL_MODEL), generate)
+        except (asyncio.TimeoutError, CircuitOpenError):
+            answer = None
+        if answer and answer.strip() != INDEX_INSUFFICIENT:
+            return answer
+
+    if gemini_file_id:
+        return await generate_from_file(gemini_file_id, question)
+    if youtube_url:
+        return await generate_from_youtube(youtube_url, question)
+    return "No video was given to answer the question about."
+
+async def answer_questions_about_video(questions: List[str], gemini_file_id: str = "", youtube_url: str = "") -> Dict[str, str]:
+    """
+    Answers several independent questions about a video at the same time, e.g. a summary plus a specific detail,
+    which is much faster than asking them one after another. Each question is answered like
+    answer_from_scene_index does.
+
+    Args:
+        questions: The questions to answer about the video.
+            Example: ["Summarize this video in detail.", "What is written on the whiteboard?"]
+        gemini_file_id: The Gemini File ID of an uploaded video, if the message gives one.
+            Example: "files/abc123"
+        youtube_url: The URL of a YouTube video, if the message gives one.
+
+    Returns:
+        dict: Each question mapped to its answer.
+    """
+    answers = await asyncio.gather(
+        *(answer_from_scene_index(question, gemini_file_id, youtube_url) for question in questions),
+        return_exceptions=True
     )
-    return response.text
+    return {
+        question: answer if isinstance(answer, str) else f"Failed to answer: {answer}"
+        for question, answer in zip(questions, answers)
+    }
 
 
 planner_agent = LlmAgent(
@@ -81,12 +339,12 @@ planner_agent = LlmAgent(
                                     4.  **Synthesize, Don't Recite:** Combine information from all tool calls into one coherent, easy-to-understand answer.
 
                                     **Workflow:**
-                                    1.  **Execute:** Run the best tool for the initial query.
+                                    1.  **Execute:** Run the best tool for the initial query. For questions about a video, start with `answer_from_scene_index`, or `answer_questions_about_video` to ask several independent questions at once (e.g. a summary plus a specific detail); use `generate_from_file` or `generate_from_youtube` directly only when you need a fresh look at the video itself.
                                     2.  **Evaluate:** Analyze the result against the user's specific need.
                                     3.  **Iterate:** If information is missing, formulate and execute a new tool call to fill the gap. Repeat as necessary.
                                     4.  **Deliver:** Present the final, synthesized answer.""",
                     description="Orchestrates video analysis and answers follow-up questions based on the extracted text.",
-                    tools=[generate_from_youtube, generate_from_file]
+                    tools=[answer_from_scene_index, answer_questions_about_video, generate_from_youtube, generate_from_file]
         )
 
 root_agent = planner_agent
\ No newline at end of file
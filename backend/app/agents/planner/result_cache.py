@@ -0,0 +1,153 @@
+import asyncio
+import hashlib
+import json
+import logging
+import re
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Set
+from redis.exceptions import RedisError
+from app.core.config import settings
+from app.core.metrics import InstrumentedAsyncRedis
+
+logger = logging.getLogger(__name__)
+
+STATS_KEY = "planner_result_cache:stats"
+YOUTUBE_VIDEO_ID_PATTERN = re.compile(r"(?:[?&]v=|youtu\.be/|/shorts/|/embed/|/live/)([A-Za-z0-9_-]{11})")
+
+def youtube_video_identity(youtube_url: str) -> str:
+    """Identifies a YouTube video by its ID, so the different URL forms of one video share cache entries."""
+    match = YOUTUBE_VIDEO_ID_PATTERN.search(youtube_url)
+    return f"youtube:{match.group(1)}" if match else f"youtube:{youtube_url.strip()}"
+
+def normalize_prompt(prompt: str) -> str:
+    return " ".join(prompt.split()).casefold()
+
+
+class ResultCache:
+    """
+    Caches the text the planner's tools generate, keyed by (video identity, normalized prompt, model):
+    a per-process LRU of up to `local_max_entries` results in front of Redis, where results expire after `ttl` seconds.
+
+    Results larger than `max_result_bytes` are not cached. Concurrent misses for the same key in a process share one
+    generation. Hits and misses are counted in a Redis hash, so the rate covers every process using the cache.
+    """
+    def __init__(self, client, ttl: int, local_max_entries: int, max_result_bytes: int):
+        self.client = client
+        self.ttl = ttl
+        self.local_max_entries = local_max_entries
+        self.max_result_bytes = max_result_bytes
+        self._local: "OrderedDict[str, tuple]" = OrderedDict()
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self._stat_tasks: Set[asyncio.Task] = set()
+
+    def key(self, video: str, prompt: str, model: str) -> str:
+        digest = hashlib.sha256(json.dumps([video, normalize_prompt(prompt), model]).encode()).hexdigest()
+        return f"planner_result_cache:{digest}"
+
+    def _get_local(self, key: str) -> Optional[str]:
+        entry = self._local.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._local[key]
+            return None
+        self._local.move_to_end(key)
+        return value
+
+    def _set_local(self, key: str, value: str, ttl: float):
+        self._local[key] = (time.monotonic() + ttl, value)
+        self._local.move_to_end(key)
+        while len(self._local) > self.local_max_entries:
+            self._local.popitem(last=False)
+
+    def _count(self, field: str):
+        # Off the request path; a lost count only skews the reported rate.
+        async def count():
+            try:
+                await self.client.hincrby(STATS_KEY, field, 1)
+            except RedisError:
+                pass
+        task = asyncio.create_task(count())
+        self._stat_tasks.add(task)
+        task.add_done_callback(self._stat_tasks.discard)
+
+    async def get_or_generate(self, key: str, generate: Callable[[], Awaitable[str]]) -> str:
+        """Returns the cached result for a key, or generates, caches and returns it."""
+        value = self._get_local(key)
+        if value is not None:
+            self._count("local_hits")
+            return value
+
+        in_flight = self._in_flight.get(key)
+        if in_flight is not None:
+            self._count("local_hits")
+            return await asyncio.shield(in_flight)
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            value = await self._lookup_or_generate(key, generate)
+            future.set_result(value)
+            return value
+        except BaseException as e:
+            future.set_exception(e)
+            # Waiters re-raise it; mark it retrieved in case there are none.
+            future.exception()
+            raise
+        finally:
+            del self._in_flight[key]
+
+    async def _lookup_or_generate(self, key: str, generate: Callable[[], Awaitable[str]]) -> str:
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            pipe.get(key)
+            pipe.ttl(key)
+            value, remaining_ttl = await pipe.execute()
+        except RedisError as e:
+            logger.warning("Planner result cache lookup failed, generating instead: %s", e)
+            value, remaining_ttl = None, None
+
+        if value is not None:
+            self._count("redis_hits")
+            # Kept locally no longer than it lives in Redis.
+            self._set_local(key, value, remaining_ttl if remaining_ttl and remaining_ttl > 0 else self.ttl)
+            return value
+
+        self._count("misses")
+        value = await generate()
+        if value and len(value.encode()) <= self.max_result_bytes:
+            self._set_local(key, value, self.ttl)
+            try:
+                await self.client.set(key, value, ex=self.ttl)
+            except RedisError as e:
+                logger.warning("Failed to store planner result in the cache: %s", e)
+        return value
+
+    async def snapshot(self) -> dict:
+        """Hit counts and hit rate across every process using the cache."""
+        counts = {field: int(count) for field, count in (await self.client.hgetall(STATS_KEY)).items()}
+        local_hits = counts.get("local_hits", 0)
+        redis_hits = counts.get("redis_hits", 0)
+        misses = counts.get("misses", 0)
+        lookups = local_hits + redis_hits + misses
+        return {
+            "local_hits": local_hits,
+            "redis_hits": redis_hits,
+            "misses": misses,
+            "hit_rate": (local_hits + redis_hits) / lookups if lookups else 0.0,
+        }
+
+result_cache = ResultCache(
+    InstrumentedAsyncRedis(
+        host=settings.REDIS_HOST,
+        port=settings.REDIS_PORT,
+        db=settings.REDIS_DB,
+        decode_responses=True,
+        metrics_client="planner",
+    ),
+    ttl=settings.PLANNER_CACHE_TTL_SECONDS,
+    local_max_entries=settings.PLANNER_CACHE_LOCAL_MAX_ENTRIES,
+    max_result_bytes=settings.PLANNER_CACHE_MAX_RESULT_BYTES,
+)
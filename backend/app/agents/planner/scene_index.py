@@ -0,0 +1,38 @@
+from typing import List, Optional
+from sqlalchemy import JSON, text
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from app.core.config import settings
+from app.db.session import async_database_url
+from .result_cache import youtube_video_identity
+
+
+class SceneIndexReader:
+    """Reads the scene indexes the API's job workers store in PostgreSQL after ingesting a video."""
+    def __init__(self, database_url: str, pool_size: int):
+        self.database_url = database_url
+        self.pool_size = pool_size
+        self._engine: Optional[AsyncEngine] = None
+
+    def _require_engine(self) -> AsyncEngine:
+        if self._engine is None:
+            self._engine = create_async_engine(self.database_url, pool_size=self.pool_size, pool_pre_ping=True)
+        return self._engine
+
+    async def load(self, gemini_file_id: str = "", youtube_url: str = "") -> Optional[List[dict]]:
+        """Returns the scene segments of an uploaded or YouTube video, or None if it has not been indexed."""
+        if gemini_file_id:
+            query = text(
+                "SELECT i.segments FROM video_scene_indexes i"
+                " JOIN video_assets a ON a.content_hash = i.video_asset_hash"
+                " WHERE a.gemini_file_id = :gemini_file_id"
+            )
+            params = {"gemini_file_id": gemini_file_id}
+        elif youtube_url:
+            query = text("SELECT segments FROM video_scene_indexes WHERE video_key = :video_key")
+            params = {"video_key": youtube_video_identity(youtube_url)}
+        else:
+            return None
+        async with self._require_engine().connect() as connection:
+            return (await connection.execute(query.columns(segments=JSON), params)).scalar()
+
+scene_index_reader = SceneIndexReader(async_database_url(), settings.PLANNER_DB_POOL_SIZE)
@@ -0,0 +1,105 @@
+import asyncio
+import logging
+from typing import Dict, List, Optional, Set
+from google.genai import types
+from redis.exceptions import RedisError
+
+logger = logging.getLogger(__name__)
+
+
+class VideoContextCache:
+    """
+    Keeps a Gemini cached-content handle per video, so the tool calls of a conversation reuse the video's processed
+    tokens instead of sending the whole video with every call.
+
+    A handle lives `ttl` seconds past its last use. A use that finds less than half of that left extends the handle,
+    and its Redis mapping, by another `ttl`. Once no conversation asks about the video any more, Gemini drops the handle
+    and Redis the mapping. Handles are shared through Redis by every process and conversation on the same video.
+    """
+    def __init__(self, genai_client, redis_client, model: str, ttl: int, enabled: bool = True):
+        self.genai_client = genai_client
+        self.redis_client = redis_client
+        self.model = model
+        self.ttl = ttl
+        self.enabled = enabled
+        self._creating: Dict[str, asyncio.Task] = {}
+        self._background: Set[asyncio.Task] = set()
+
+    def _key(self, video: str) -> str:
+        return f"video_context:{self.model}:{video}"
+
+    async def create(self, video: str, contents: List) -> Optional[str]:
+        """
+        Returns the handle of a video's cached context, creating it from `contents` if there is none yet.
+        Concurrent calls for one video in a process share one creation.
+        """
+        if not self.enabled:
+            return None
+        task = self._creating.get(video)
+        if task is None:
+            task = asyncio.create_task(self._create(video, contents))
+            self._creating[video] = task
+            task.add_done_callback(lambda _: self._creating.pop(video, None))
+        return await asyncio.shield(task)
+
+    async def _create(self, video: str, contents: List) -> Optional[str]:
+        key = self._key(video)
+        existing = await self.redis_client.get(key)
+        if existing:
+            return existing
+        cached = await self.genai_client.aio.caches.create(
+            model=self.model,
+            config=types.CreateCachedContentConfig(contents=contents, ttl=f"{self.ttl}s", display_name=video[:128]),
+        )
+        if not await self.redis_client.set(key, cached.name, ex=self.ttl, nx=True):
+            # Another process cached the same video first; keep one handle.
+            await self.genai_client.aio.caches.delete(name=cached.name)
+            return await self.redis_client.get(key)
+        logger.info("Cached video context for %s: %s", video, cached.name)
+        return cached.name
+
+    def create_in_background(self, video: str, contents: List):
+        """Starts caching a video's context without waiting for it, e.g. for a conversation picked up again after expiry."""
+        if not self.enabled or video in self._creating:
+            return
+
+        async def create():
+            try:
+                await self.create(video, contents)
+            except Exception as e:
+                logger.warning("Failed to cache video context for %s: %s", video, e)
+        task = asyncio.create_task(create())
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def lookup(self, video: str) -> Optional[str]:
+        """Returns the handle of a video's cached context, extending its life if needed, or None if there is none."""
+        if not self.enabled:
+            return None
+        key = self._key(video)
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.get(key)
+            pipe.ttl(key)
+            name, remaining = await pipe.execute()
+        except RedisError as e:
+            logger.warning("Video context lookup failed: %s", e)
+            return None
+        if name and 0 <= remaining < self.ttl / 2:
+            try:
+                await self.genai_client.aio.caches.update(name=name, config=types.UpdateCachedContentConfig(ttl=f"{self.ttl}s"))
+                await self.redis_client.expire(key, self.ttl)
+            except Exception as e:
+                logger.warning("Failed to extend cached video context %s: %s", name, e)
+                await self.invalidate(video, name)
+                return None
+        return name
+
+    async def invalidate(self, video: str, name: str):
+        """Forgets a handle that Gemini no longer accepts, unless it was replaced in the meantime."""
+        key = self._key(video)
+        try:
+            if await self.redis_client.get(key) == name:
+                await self.redis_client.delete(key)
+        except RedisError as e:
+            logger.warning("Failed to invalidate cached video context %s: %s", name, e)
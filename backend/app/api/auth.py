@@ -1,46 +1,64 @@
+import logging
 from fastapi import APIRouter, Depends, HTTPException, status, Body
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
-from google.oauth2 import id_token
-from google.auth.transport import requests as google_requests
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.crud import user_crud
 from app.models import api_models
 from app.security import core
+from app.security.google_id_token import google_id_token_verifier
+from app.security.hashing import PasswordHasherBusy, password_hasher
 from app.api import dependencies
 from app.core.config import settings
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter(prefix="/auth", tags=["Authentication"])
 
+password_hasher_busy_exception = HTTPException(
+    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+    detail="Too many sign-ins in progress, please try again shortly.",
+    headers={"Retry-After": "1"},
+)
+
 @router.post("/register", response_model=api_models.User)
-def register_user(
-    user_in: api_models.UserCreate, db: Session = Depends(dependencies.get_db)
+async def register_user(
+    user_in: api_models.UserCreate, db: AsyncSession = Depends(dependencies.get_async_db)
 ):
     """
     Register a new user.
     """
-    user = user_crud.get_user_by_email(db, email=user_in.email)
+    user = await user_crud.get_user_by_email_async(db, email=user_in.email)
     if user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="An account with this email already exists.",
         )
-    user = user_crud.create_user(db, user=user_in)
+    try:
+        hashed_password = await password_hasher.hash(user_in.password)
+    except PasswordHasherBusy:
+        raise password_hasher_busy_exception
+    user = await user_crud.create_user_async(db, user=user_in, hashed_password=hashed_password)
     return user
 
 
 @router.post("/login", response_model=api_models.Token)
-def login_for_access_token(
-    db: Session = Depends(dependencies.get_db),
+async def login_for_access_token(
+    db: AsyncSession = Depends(dependencies.get_async_db),
     form_data: OAuth2PasswordRequestForm = Depends(),
 ):
     """
     Authenticate user and return a JWT access token.
     """
-    user = user_crud.get_user_by_email(db, email=form_data.username)
-    if not user or not core.verify_password(
-        form_data.password, user.hashed_password
-    ):
+    user = await user_crud.get_user_by_email_async(db, email=form_data.username)
+    valid, new_hash = False, None
+    # Accounts created through Google Sign-In have no password.
+    if user and user.hashed_password:
+        try:
+            valid, new_hash = await password_hasher.verify_and_update(form_data.password, user.hashed_password)
+        except PasswordHasherBusy:
+            raise password_hasher_busy_exception
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
@@ -48,7 +66,10 @@ def login_for_access_token(
         )
     if not user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
-        
+    if new_hash:
+        # The stored hash uses an outdated bcrypt cost.
+        await user_crud.update_user_password_hash_async(db, user_id=user.id, hashed_password=new_hash)
+
     access_token = core.create_access_token(
         data={"sub": user.email, "first_name": user.first_name, "last_name": user.last_name}
     )
@@ -56,36 +77,35 @@ def login_for_access_token(
 
 @router.post("/google-login", response_model=api_models.Token)
 async def google_login(
-    request: api_models.GoogleIdTokenRequest, db: Session = Depends(dependencies.get_db)
+    request: api_models.GoogleIdTokenRequest, db: AsyncSession = Depends(dependencies.get_async_db)
 ):
     """
     Authenticate user with Google ID token and return a JWT access token.
     """
     try:
-        # Specify the CLIENT_ID of the app that accesses the backend:
-        google_id_info = id_token.verify_oauth2_token(
-            request.id_token_str, google_requests.Request(), settings.GOOGLE_CLIENT_ID
-        )
-        print(f"[Google Login] ID Token verified. Info: {google_id_info}")
+        # Checked against the CLIENT_ID of the app that accesses the backend, with locally cached certificates.
+        google_id_info = await google_id_token_verifier.verify(request.id_token_str)
+        # The token's claims are personal data; only its subject is logged.
+        logger.debug("Google ID token verified for subject %s", google_id_info["sub"])
         
         google_user_id = google_id_info['sub']
         email = google_id_info['email']
         first_name = google_id_info.get('given_name', '')
         last_name = google_id_info.get('family_name', '')
 
-        user = user_crud.get_user_by_google_id(db, google_id=google_user_id)
+        user = await user_crud.get_user_by_google_id_async(db, google_id=google_user_id)
         if not user:
             # If user doesn't exist with google_id, check by email
-            user = user_crud.get_user_by_email(db, email=email)
+            user = await user_crud.get_user_by_email_async(db, email=email)
             if user:
                 # If user exists with email but no google_id, link google_id and update names if empty
-                user = user_crud.update_user_google_id(db, user_id=user.id, google_id=google_user_id)
+                user = await user_crud.update_user_google_id_async(db, user_id=user.id, google_id=google_user_id)
                 if not user.first_name:
-                    user = user_crud.update_user_name(db, user_id=user.id, first_name=first_name, last_name=last_name)
+                    user = await user_crud.update_user_name_async(db, user_id=user.id, first_name=first_name, last_name=last_name)
             else:
                 # Create new user with google_id and names
                 user_in = api_models.UserCreateGoogle(email=email, google_id=google_user_id, first_name=first_name, last_name=last_name)
-                user = user_crud.create_user_google(db, user=user_in)
+                user = await user_crud.create_user_google_async(db, user=user_in)
         
         if not user.is_active:
             raise HTTPException(status_code=400, detail="Inactive user")
@@ -1,204 +1,239 @@
+import base64
 import httpx
+import logging
 import uuid
 import json
+import math
 import re
-from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, status, File, UploadFile, Form
+from datetime import datetime
+from typing import List, Optional, Tuple
+from fastapi import APIRouter, Depends, HTTPException, status, File, UploadFile, Form, Query, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
+from sse_starlette.sse import EventSourceResponse
+from starlette.background import BackgroundTask
 from app.api import dependencies
+from app.core.admission import AdmissionRejected, adk_admission
+from app.core.resilience import CircuitOpenError
+from app.core.tracing import record_span, trace_url
 from app.models import db_models, api_models
 from app.crud import job_crud
-from app.agents.planner.agent import upload_to_gemini
+from app.db.session import AsyncSessionLocal
+from app.services.adk_service import adk_service
 from app.services.history_service import history_service
-from app.core.config import settings
-from app.services.s3_service import s3_service # New import
+from app.services.job_queue import job_queue
+from app.services.ingestion_service import ingestion_service
 
-router = APIRouter(prefix="/api/chat", tags=["Chat"])
+logger = logging.getLogger(__name__)
 
-async def create_adk_session(session_id: str, current_user: str) -> bool:
-    """
-    Creates a session on the external ADK service.
-    Returns True on success, False on failure.
-    """
-    adk_session_url = f"{settings.ADK_API_URL}/apps/{settings.APP_NAME}/users/{current_user}/sessions/{session_id}"
-    try:
-        print(f"Attempting to create ADK session at: {adk_session_url}")
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                adk_session_url,
-                headers={"Content-Type": "application/json"},
-                data=json.dumps({}),
-                timeout=120.0
-            )
-            response.raise_for_status() 
-            print(f"Successfully created ADK session for user {current_user}, session {session_id}")
-            return True
-    except httpx.HTTPStatusError as e:
-        print(f"Failed to create ADK session. HTTP Status: {e.response.status_code}, Response: {e.response.text}")
-        return False
-    except httpx.RequestError as e:
-        print(f"Failed to create ADK session due to network error: {e}")
-        return False
+router = APIRouter(prefix="/api/chat", tags=["Chat"])
 
+def admission_rejected_exception(e: AdmissionRejected) -> HTTPException:
+    return HTTPException(status_code=e.status_code, detail=e.detail, headers={"Retry-After": str(e.retry_after)})
 
-import tempfile
-import os
+def circuit_open_exception(e: CircuitOpenError) -> HTTPException:
+    return HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))})
 
-# ... (keep existing imports)
+async def trace_multipart_parsing(request: Request):
+    # FastAPI receives and parses the whole form before resolving dependencies, so the first one sees it done.
+    record_span("multipart_parse", request.state.started_ns)
 
-@router.post("/start", response_model=api_models.ChatResponse)
+@router.post("/start", response_model=api_models.ChatResponse, status_code=status.HTTP_202_ACCEPTED)
 async def start_chat(
-    db: Session = Depends(dependencies.get_db),
-    current_user: db_models.User = Depends(dependencies.get_current_user),
+    _: None = Depends(trace_multipart_parsing),
+    db: AsyncSession = Depends(dependencies.get_async_db),
+    current_user: db_models.User = Depends(dependencies.get_current_user_async),
     message: str = Form(...),
     file: Optional[UploadFile] = File(None),
 ):
     """
     Starts a new conversation.
-    1. Creates a Job in the local DB.
-    2. Creates a session on the ADK service.
-    3. Sends the first message to the ADK service.
+    1. Streams the uploaded video (if any) into S3, skipping the upload of content seen before,
+       and creates a PENDING Job in the local DB.
+    2. Queues the video's upload to Gemini, the wait for Gemini processing, ADK session creation
+       and the first turn for the background workers.
+    The client polls /api/chat/job/{job_id} until the job becomes ACTIVE or ERROR.
     """
     job_type = db_models.JobType.TEXT
-    gemini_file_id = None
     source_url = None
-    display_video_url = None # New variable
+    display_video_url = None
+    gemini_file_id = None
+    ingestion_timings = None
+    video_asset_hash = None
     title = message[:50]
-    
-    # Combine message and context for the first turn
-    first_turn_message = message
+
     youtube_url_pattern = re.compile(r'(https?://(?:www\.)?(?:youtube\.com/watch\?v=|youtu\.be/)[^\s]+)')
     url_match = youtube_url_pattern.search(message)
 
     if file:
         job_type = db_models.JobType.VIDEO
-        
-        # Stream the file to a temporary location to avoid memory issues
-        with tempfile.NamedTemporaryFile(delete=False, suffix=file.filename) as temp_file:
-            while chunk := await file.read(1024*1024): # Read in 1MB chunks
-                temp_file.write(chunk)
-            temp_file_path = temp_file.name
+        title = file.filename
 
         try:
-            # Upload to S3 for display
-            with open(temp_file_path, "rb") as f:
-                display_video_url = await s3_service.upload_file(f, os.path.basename(temp_file_path), file.content_type)
-
-            # Upload to Gemini for analysis
-            gemini_file = await upload_to_gemini(temp_file_path)
-            gemini_file_id = gemini_file.name
-            title = file.filename
-        finally:
-            # Clean up the temporary file
-            os.remove(temp_file_path)
-            
+            stored = await ingestion_service.store_upload(file)
+            display_video_url = stored.display_video_url
+            gemini_file_id = stored.gemini_file_id
+            ingestion_timings = stored.timings
+            video_asset_hash = stored.content_hash
+        except CircuitOpenError as e:
+            raise circuit_open_exception(e)
+        except Exception:
+            logger.exception("Failed to store upload %s for user %s", file.filename, current_user.id)
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Failed to store the uploaded video. Please try again later."
+            )
+
     elif url_match:
         job_type = db_models.JobType.YOUTUBE
         source_url = url_match.group(1)
         display_video_url = source_url # Store YouTube URL for display
 
-    job = job_crud.create_job(
-        db=db, user_id=current_user.id, job_type=job_type, prompt=message,
-        title=title, gemini_file_id=gemini_file_id, source_url=source_url,
-        display_video_url=display_video_url, # Pass the new URL
-        current_agent="ADK"
-    )
-    session_id = str(job.id)
-
-    # Set job status to PROCESSING immediately after creation
-    job_crud.update_job_status(db, job_id=job.id, user_id=current_user.id, status=db_models.JobStatus.PROCESSING)
+    try:
+        job = await job_crud.create_job_async(
+            db=db, user_id=current_user.id, job_type=job_type, prompt=message,
+            title=title, gemini_file_id=gemini_file_id, source_url=source_url,
+            display_video_url=display_video_url,
+            current_agent="Queue", ingestion_timings=ingestion_timings,
+            video_asset_hash=video_asset_hash
+        )
+    except Exception:
+        await db.rollback()
+        if video_asset_hash:
+            await ingestion_service.release(db, video_asset_hash)
+        raise
 
-    # Await and check the result of session creation
-    session_created = await create_adk_session(session_id, str(current_user.id))
-    
-    if not session_created:
-        job_crud.update_job_status(db, job_id=job.id, user_id=current_user.id, status=db_models.JobStatus.ERROR, error_message="Failed to create ADK session.")
+    try:
+        await job_queue.enqueue_start(job.id, current_user.id, message)
+    except Exception as e:
+        logger.exception("Failed to queue job %s", job.id)
+        await job_crud.transition_job_async(db, job_id=job.id, user_id=current_user.id, status=db_models.JobStatus.ERROR, error_message=f"Failed to queue job: {e}")
+        if video_asset_hash:
+            await ingestion_service.release(db, video_asset_hash)
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-            detail="Failed to create a session with the analysis service. Please try again later."
+            detail="Failed to queue the conversation for analysis. Please try again later."
         )
 
-    # Proceed to send the first message
-    chat_response = await continue_chat(
-        job_id=job.id,
-        db=db,
-        current_user=current_user,
-        message=first_turn_message,  # Pass the combined message
-    )
-    
-    # After continue_chat, the status should be updated by continue_chat itself.
-    # We just return the response.
-    return chat_response
+    return {"response": "", "conversation_id": job.id, "display_video_url": display_video_url}
 
 
 
 @router.post("/{job_id}", response_model=api_models.ChatResponse)
 async def continue_chat(
     job_id: uuid.UUID,
-    db: Session = Depends(dependencies.get_db),
-    current_user: db_models.User = Depends(dependencies.get_current_user),
+    db: AsyncSession = Depends(dependencies.get_async_db),
+    current_user: db_models.User = Depends(dependencies.get_current_user_async),
     message: str = Form(...),
 ):
     """
 
     Continues an existing conversation by sending a message to the ADK service.
     """
-    job = job_crud.get_job(db, job_id=job_id, user_id=current_user.id)
+    job = await job_crud.get_job_async(db, job_id=job_id, user_id=current_user.id)
     if not job:
         raise HTTPException(status_code=404, detail="Conversation not found")
+    if job.status in (db_models.JobStatus.PENDING, db_models.JobStatus.PROCESSING):
+        raise HTTPException(status_code=409, detail="Conversation is still being prepared")
 
     session_id = str(job.id)
-    adk_url = f"{settings.ADK_API_URL}/run"
 
     try:
-        async with httpx.AsyncClient() as client:
-            request_data = {
-                "app_name": settings.APP_NAME,
-                "user_id": str(current_user.id),
-                "session_id": session_id,
-                "new_message":{
-                    "role": "user",
-                    "parts": [
-                        {"text": message + (f"\n\nGemini File ID: {job.gemini_file_id}" if job.gemini_file_id else "") + (f"\n\nYouTube URL: {job.source_url}" if job.source_url else "")}
-                    ]
-                }
-            }
-            print(f"Sending request to ADK /run: URL={settings.ADK_API_URL}/run, Data={json.dumps(request_data)}")
-            response = await client.post(
-                f"{settings.ADK_API_URL}/run",
-                headers={"Content-Type": "application/json"},
-                data=json.dumps(request_data),
-                timeout=300.0
-            )
-            response.raise_for_status()
-            adk_result = response.json()
-            print(f"Received response from ADK /run: Status={response.status_code}, Response={response.text}")
-
-        assistant_message = ""  # Initialize to an empty string
-        for event in adk_result:
-            if event.get("content", {}).get("role") == "model" and "text" in event.get("content", {}).get("parts", [{}])[0]:
-                assistant_message = event["content"]["parts"][0]["text"]
-
-        history_service.add_message_to_history(db, session_id, "USER", message)
-        history_service.add_message_to_history(db, session_id, "ASSISTANT", assistant_message)
-        job_crud.update_job_status(db, job_id=job_id, user_id=current_user.id, status=db_models.JobStatus.ACTIVE)
-
+        adk_slot = await adk_admission.acquire(current_user.id)
+    except AdmissionRejected as e:
+        raise admission_rejected_exception(e)
+    try:
+        assistant_message = await adk_service.run_chat_turn(db, job, current_user.id, message)
         return {"response": assistant_message, "conversation_id": session_id, "display_video_url": job.display_video_url}
 
+    except CircuitOpenError as e:
+        # Nothing was sent, so the conversation itself is fine; the client can retry later.
+        raise circuit_open_exception(e)
     except httpx.RequestError as e:
-        job_crud.update_job_status(db, job_id=job_id, user_id=current_user.id, status=db_models.JobStatus.ERROR, error_message=f"ADK service unavailable: {e}")
+        await job_crud.transition_job_async(db, job_id=job_id, user_id=current_user.id, status=db_models.JobStatus.ERROR, error_message=f"ADK service unavailable: {e}")
         raise HTTPException(status_code=503, detail=f"ADK service unavailable: {e}")
     except Exception as e:
-        job_crud.update_job_status(db, job_id=job_id, user_id=current_user.id, status=db_models.JobStatus.ERROR, error_message=f"Error communicating with ADK service: {e}")
+        await db.rollback()
+        await job_crud.transition_job_async(db, job_id=job_id, user_id=current_user.id, status=db_models.JobStatus.ERROR, error_message=f"Error communicating with ADK service: {e}")
         raise HTTPException(status_code=500, detail=f"Error communicating with ADK service: {e}")
+    finally:
+        await adk_admission.release(current_user.id, adk_slot)
+
+@router.post("/{job_id}/stream")
+async def stream_chat(
+    job_id: uuid.UUID,
+    db: AsyncSession = Depends(dependencies.get_async_db),
+    current_user: db_models.User = Depends(dependencies.get_current_user_async),
+    message: str = Form(...),
+):
+    """
+    Continues an existing conversation like POST /{job_id}, but streams the reply as Server-Sent Events
+    while ADK generates it: "delta" (text chunks), "tool_call"/"tool_result" (tool progress),
+    then "done" with the full response, or "error".
+    """
+    job = await job_crud.get_job_async(db, job_id=job_id, user_id=current_user.id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    if job.status in (db_models.JobStatus.PENDING, db_models.JobStatus.PROCESSING):
+        raise HTTPException(status_code=409, detail="Conversation is still being prepared")
 
-@router.get("/history", response_model=List[api_models.Job])
+    user_id = current_user.id
+    # Taken before streaming starts, so a rejection is still an HTTP status. Released by the response once it is
+    # done, which also covers a client that disconnects before the stream is iterated.
+    try:
+        adk_slot = await adk_admission.acquire(user_id)
+    except AdmissionRejected as e:
+        raise admission_rejected_exception(e)
+    turn = adk_service.stream_chat_turn(job, user_id, message)
+
+    async def event_stream():
+        # The request's DB session is closed before streaming starts, so failures are recorded on a fresh one.
+        try:
+            async for event, payload in turn:
+                yield {"event": event, "data": json.dumps(payload)}
+        except CircuitOpenError as e:
+            yield {"event": "error", "data": json.dumps({"detail": str(e), "retry_after": math.ceil(e.retry_after)})}
+        except Exception as e:
+            error_message = f"ADK service unavailable: {e}" if isinstance(e, httpx.RequestError) else f"Error communicating with ADK service: {e}"
+            async with AsyncSessionLocal() as error_db:
+                await job_crud.transition_job_async(error_db, job_id=job_id, user_id=user_id, status=db_models.JobStatus.ERROR, error_message=error_message)
+            yield {"event": "error", "data": json.dumps({"detail": error_message})}
+
+    async def finish_turn():
+        # A turn whose client went away runs on until ADK's stream ends, and keeps its slot until then.
+        await turn.wait()
+        await adk_admission.release(user_id, adk_slot)
+
+    return EventSourceResponse(event_stream(), background=BackgroundTask(finish_turn))
+
+def _encode_cursor(created_at: datetime, item_id: uuid.UUID) -> str:
+    return base64.urlsafe_b64encode(json.dumps([created_at.isoformat(), str(item_id)]).encode()).decode()
+
+def _decode_cursor(cursor: str) -> Tuple[datetime, uuid.UUID]:
+    try:
+        created_at, item_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(created_at), uuid.UUID(item_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+@router.get("/history", response_model=List[api_models.JobSummary])
 def get_history(
+    response: Response,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
     db: Session = Depends(dependencies.get_db),
     current_user: db_models.User = Depends(dependencies.get_current_user),
 ):
-    """Gets the list of all jobs (conversations) for the current user."""
-    return job_crud.get_jobs_by_user(db, user_id=current_user.id)
+    """
+    Gets a page of the jobs (conversations) of the current user, newest first.
+    When there are more, the X-Next-Cursor header holds the cursor of the next page.
+    """
+    before = _decode_cursor(cursor) if cursor else None
+    jobs = job_crud.get_job_summaries_by_user(db, user_id=current_user.id, limit=limit + 1, before=before)
+    if len(jobs) > limit:
+        jobs = jobs[:limit]
+        response.headers["X-Next-Cursor"] = _encode_cursor(jobs[-1].created_at, jobs[-1].id)
+    return jobs
 
 
 @router.get("/history/{job_id}", response_model=List[api_models.Message])
@@ -211,12 +246,31 @@ def get_chat_history(
     job = job_crud.get_job(db, job_id=job_id, user_id=current_user.id)
     if not job:
         raise HTTPException(status_code=404, detail="Conversation not found")
-        
-    if job.messages:
-        return job.messages
 
-    # If no history in DB, return empty list.
-    return []
+    return history_service.get_history(db, job_id=job.id)
+
+@router.get("/{job_id}/messages", response_model=List[api_models.Message])
+def get_messages(
+    job_id: uuid.UUID,
+    response: Response,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    db: Session = Depends(dependencies.get_db),
+    current_user: db_models.User = Depends(dependencies.get_current_user),
+):
+    """
+    Gets the latest messages of a job, oldest first. When there are older ones, the X-Next-Cursor header holds
+    the cursor of the page before.
+    """
+    job = job_crud.get_job(db, job_id=job_id, user_id=current_user.id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+
+    before = _decode_cursor(cursor) if cursor else None
+    messages, has_older = history_service.get_messages_page(db, job_id=job.id, limit=limit, before=before)
+    if has_older:
+        response.headers["X-Next-Cursor"] = _encode_cursor(datetime.fromisoformat(messages[0]["created_at"]), messages[0]["id"])
+    return messages
 
 @router.get("/job/{job_id}", response_model=api_models.Job)
 def get_job_details(
@@ -228,4 +282,6 @@ def get_job_details(
     job = job_crud.get_job(db, job_id=job_id, user_id=current_user.id)
     if not job:
         raise HTTPException(status_code=404, detail="Job not found")
-    return job
\ No newline at end of file
+    details = api_models.Job.model_validate(job)
+    details.trace_url = trace_url(job.trace_id)
+    return details
\ No newline at end of file
@@ -2,27 +2,26 @@ from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from app.core.config import settings
-from app.db.session import get_db
+from app.core.user_cache import user_cache
+from app.db.session import get_db, get_async_db
 from app.models import db_models, api_models
 from app.crud import user_crud
 
 # This scheme will be used to extract the token from the "Authorization" header
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
-def get_current_user(
-    db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)
-) -> db_models.User:
-    """
-    Dependency to get the current user from a JWT token.
-    """
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
+credentials_exception = HTTPException(
+    status_code=status.HTTP_401_UNAUTHORIZED,
+    detail="Could not validate credentials",
+    headers={"WWW-Authenticate": "Bearer"},
+)
+
+def _decode_token(token: str) -> api_models.TokenData:
+    """Validates a JWT and returns its subject, raising 401 if it can't be trusted."""
     try:
         payload = jwt.decode(
             token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM]
@@ -30,15 +29,42 @@ def get_current_user(
         email: str = payload.get("sub")
         if email is None:
             raise credentials_exception
-        token_data = api_models.TokenData(email=email)
+        return api_models.TokenData(email=email)
     except (JWTError, ValidationError):
         raise credentials_exception
-    
-    user = user_crud.get_user_by_email(db, email=token_data.email)
-    
+
+def _check_user(user: db_models.User) -> db_models.User:
     if user is None:
         raise credentials_exception
     if not user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
-        
     return user
+
+def get_current_user(
+    db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)
+) -> db_models.User:
+    """
+    Dependency to get the current user from a JWT token.
+    """
+    token_data = _decode_token(token)
+    # The session only connects on its first query, so a cache hit never touches the database.
+    user = user_cache.get(token_data.email)
+    if user is None:
+        user = user_crud.get_user_by_email(db, email=token_data.email)
+        if user is not None:
+            user_cache.set(user)
+    return _check_user(user)
+
+async def get_current_user_async(
+    db: AsyncSession = Depends(get_async_db), token: str = Depends(oauth2_scheme)
+) -> db_models.User:
+    """
+    Async variant of get_current_user for async routes.
+    """
+    token_data = _decode_token(token)
+    user = await user_cache.get_async(token_data.email)
+    if user is None:
+        user = await user_crud.get_user_by_email_async(db, email=token_data.email)
+        if user is not None:
+            await user_cache.set_async(user)
+    return _check_user(user)
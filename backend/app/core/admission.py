@@ -0,0 +1,198 @@
+import asyncio
+import logging
+import math
+import random
+import uuid
+from contextlib import asynccontextmanager
+from typing import Optional
+from redis.exceptions import RedisError
+from app.core.config import settings
+from app.core.redis_client import async_redis
+
+logger = logging.getLogger(__name__)
+
+# Slots are sorted-set members scored by when their lease runs out, so slots of crashed holders free themselves.
+# Returns 0 when a slot was taken, 1 when the global cap is reached, 2 when the caller's own cap is.
+ACQUIRE_SCRIPT = """
+local now = redis.call('TIME')
+local now_ms = now[1] * 1000 + math.floor(now[2] / 1000)
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now_ms)
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', now_ms)
+if redis.call('ZCARD', KEYS[2]) >= tonumber(ARGV[3]) then
+    return 2
+end
+if redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[2]) then
+    return 1
+end
+local expires_at = now_ms + tonumber(ARGV[4])
+redis.call('ZADD', KEYS[1], expires_at, ARGV[1])
+redis.call('ZADD', KEYS[2], expires_at, ARGV[1])
+redis.call('PEXPIRE', KEYS[1], ARGV[4])
+redis.call('PEXPIRE', KEYS[2], ARGV[4])
+return 0
+"""
+
+# Takes a place in the wait queue unless it is full. Returns 1 when queued, 0 when full.
+ENQUEUE_SCRIPT = """
+local now = redis.call('TIME')
+local now_ms = now[1] * 1000 + math.floor(now[2] / 1000)
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now_ms)
+if redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[2]) then
+    return 0
+end
+redis.call('ZADD', KEYS[1], now_ms + tonumber(ARGV[3]), ARGV[1])
+redis.call('PEXPIRE', KEYS[1], ARGV[3])
+return 1
+"""
+
+GLOBAL_CAP = 1
+USER_CAP = 2
+
+
+class AdmissionRejected(Exception):
+    """Raised when a call cannot be admitted; `status_code` is 429 for the caller's own cap, 503 otherwise."""
+    def __init__(self, status_code: int, detail: str, retry_after: int):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Caps how many calls to an expensive upstream (ADK, Gemini uploads) run at once, in total and per user,
+    consistently across every worker through Redis.
+
+    A caller over a cap waits up to `max_wait` seconds for a slot, as one of at most `queue_depth` waiters; when the
+    queue is full or the wait runs out it is turned away with AdmissionRejected. Slots are leased for `lease` seconds,
+    which must outlast the calls they cover, so a crashed worker's slots are reclaimed. If Redis is unavailable,
+    calls are admitted unchecked.
+    """
+    def __init__(self, client, name: str, description: str, global_limit: int, per_user_limit: int, queue_depth: int, max_wait: float, lease: float):
+        self.client = client
+        self.name = name
+        self.description = description
+        self.global_limit = global_limit
+        self.per_user_limit = per_user_limit
+        self.queue_depth = queue_depth
+        self.max_wait = max_wait
+        self.lease_ms = int(lease * 1000)
+        self.rejected = {GLOBAL_CAP: 0, USER_CAP: 0}
+        self._acquire_script = client.register_script(ACQUIRE_SCRIPT)
+        self._enqueue_script = client.register_script(ENQUEUE_SCRIPT)
+
+    def _global_key(self) -> str:
+        return f"admission:{self.name}:in_flight"
+
+    def _user_key(self, user_id: int) -> str:
+        return f"admission:{self.name}:user:{user_id}"
+
+    def _queue_key(self) -> str:
+        return f"admission:{self.name}:waiting"
+
+    async def _try_acquire(self, user_id: int, token: str) -> int:
+        return await self._acquire_script(
+            keys=[self._global_key(), self._user_key(user_id)],
+            args=[token, self.global_limit, self.per_user_limit, self.lease_ms],
+        )
+
+    def _reject(self, cap: int) -> AdmissionRejected:
+        self.rejected[cap] += 1
+        retry_after = max(1, math.ceil(self.max_wait))
+        if cap == USER_CAP:
+            return AdmissionRejected(429, f"Too many {self.description} requests in progress for this account, please wait for one to finish.", retry_after)
+        return AdmissionRejected(503, f"The service is at capacity for {self.description} requests, please try again shortly.", retry_after)
+
+    async def acquire(self, user_id: int, max_wait: Optional[float] = None, queue: bool = True) -> Optional[str]:
+        """
+        Takes a slot for a user, waiting up to `max_wait` seconds (default: the controller's) for one, and returns the
+        token to release it with. Background workers, which their own concurrency already bounds, pass queue=False to
+        wait without taking a place in the wait queue.
+        """
+        token = uuid.uuid4().hex
+        try:
+            result = await self._try_acquire(user_id, token)
+            if result == 0:
+                return token
+
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + (self.max_wait if max_wait is None else max_wait)
+            if queue:
+                queue_lease = int((deadline - loop.time()) * 1000) + 1000
+                if not await self._enqueue_script(keys=[self._queue_key()], args=[token, self.queue_depth, queue_lease]):
+                    raise self._reject(result)
+            try:
+                delay = 0.05
+                while result != 0:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        raise self._reject(result)
+                    await asyncio.sleep(min(delay * random.uniform(0.5, 1.0), remaining))
+                    delay = min(delay * 2, 1.0)
+                    result = await self._try_acquire(user_id, token)
+            finally:
+                if queue:
+                    await self.client.zrem(self._queue_key(), token)
+            return token
+        except RedisError as e:
+            logger.warning("Admission check for %s failed, admitting unchecked: %s", self.name, e)
+            return None
+
+    async def release(self, user_id: int, token: Optional[str]):
+        """Frees a slot taken by acquire."""
+        if token is None:
+            return
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            pipe.zrem(self._global_key(), token)
+            pipe.zrem(self._user_key(user_id), token)
+            await pipe.execute()
+        except RedisError as e:
+            # The slot frees itself when its lease runs out.
+            logger.warning("Failed to release %s admission slot: %s", self.name, e)
+
+    @asynccontextmanager
+    async def admit(self, user_id: int, max_wait: Optional[float] = None, queue: bool = True):
+        """Holds a slot for the duration of the block."""
+        token = await self.acquire(user_id, max_wait=max_wait, queue=queue)
+        try:
+            yield
+        finally:
+            await self.release(user_id, token)
+
+    async def snapshot(self) -> dict:
+        pipe = self.client.pipeline(transaction=False)
+        pipe.zcard(self._global_key())
+        pipe.zcard(self._queue_key())
+        in_flight, waiting = await pipe.execute()
+        return {
+            "in_flight": in_flight,
+            "waiting": waiting,
+            "global_limit": self.global_limit,
+            "per_user_limit": self.per_user_limit,
+            "rejected_global": self.rejected[GLOBAL_CAP],
+            "rejected_per_user": self.rejected[USER_CAP],
+        }
+
+adk_admission = AdmissionController(
+    async_redis,
+    "adk",
+    "conversation",
+    global_limit=settings.ADK_CONCURRENCY_LIMIT,
+    per_user_limit=settings.ADK_PER_USER_CONCURRENCY_LIMIT,
+    queue_depth=settings.ADMISSION_QUEUE_DEPTH,
+    max_wait=settings.ADMISSION_MAX_WAIT_SECONDS,
+    # Covers a run streamed to its timeout.
+    lease=settings.ADK_SESSION_TIMEOUT + settings.ADK_RUN_TIMEOUT + 60,
+)
+
+gemini_upload_admission = AdmissionController(
+    async_redis,
+    "gemini_upload",
+    "video upload",
+    global_limit=settings.GEMINI_UPLOAD_CONCURRENCY_LIMIT,
+    per_user_limit=settings.GEMINI_UPLOAD_PER_USER_CONCURRENCY_LIMIT,
+    queue_depth=settings.ADMISSION_QUEUE_DEPTH,
+    max_wait=settings.ADMISSION_MAX_WAIT_SECONDS,
+    lease=settings.GEMINI_UPLOAD_ADMISSION_LEASE_SECONDS,
+)
@@ -10,25 +10,153 @@ class Settings:
         
         # Database   
     DATABASE_URL: str = os.getenv("DATABASE_URL", "")
+    # Defaults to DATABASE_URL with the asyncpg driver.
+    ASYNC_DATABASE_URL: str = os.getenv("ASYNC_DATABASE_URL", "")
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", 10))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", 20))
+    DB_POOL_TIMEOUT: float = float(os.getenv("DB_POOL_TIMEOUT", 30.0))
+    DB_POOL_RECYCLE: int = int(os.getenv("DB_POOL_RECYCLE", 1800))
+    DB_POOL_PRE_PING: bool = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+    DB_STATEMENT_TIMEOUT_MS: int = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", 30000))
 
         # Security
     SECRET_KEY: str = os.getenv("JWT_SECRET_KEY", "")
     ALGORITHM: str = os.getenv("ALGORITHM", "HS256")
     ACCESS_TOKEN_EXPIRE_MINUTES: int = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30))
+    # Raising the cost rehashes each stored password on its owner's next login.
+    BCRYPT_ROUNDS: int = int(os.getenv("BCRYPT_ROUNDS", 12))
+    PASSWORD_HASH_WORKERS: int = int(os.getenv("PASSWORD_HASH_WORKERS", 2))
+    # Hashing requests queued beyond the busy workers before new ones are turned away with 503.
+    PASSWORD_HASH_QUEUE_DEPTH: int = int(os.getenv("PASSWORD_HASH_QUEUE_DEPTH", 16))
+    # Authenticated users are cached per process and in Redis. A change made in another process is seen
+    # here after at most USER_CACHE_LOCAL_TTL_SECONDS.
+    USER_CACHE_LOCAL_TTL_SECONDS: float = float(os.getenv("USER_CACHE_LOCAL_TTL_SECONDS", 10.0))
+    USER_CACHE_LOCAL_MAX_SIZE: int = int(os.getenv("USER_CACHE_LOCAL_MAX_SIZE", 10000))
+    USER_CACHE_TTL_SECONDS: int = int(os.getenv("USER_CACHE_TTL_SECONDS", 300))
         
         # Google
     GEMINI_API_KEY: str = os.getenv("GEMINI_API_KEY", "")
     GOOGLE_CLIENT_ID: str = os.getenv("GOOGLE_CLIENT_ID", "")
     GOOGLE_CLIENT_SECRET: str = os.getenv("GOOGLE_CLIENT_SECRET", "")
+    # Signing certificates for Google ID tokens; point at a local stand-in in tests.
+    GOOGLE_CERTS_URL: str = os.getenv("GOOGLE_CERTS_URL", "https://www.googleapis.com/oauth2/v1/certs")
+    GOOGLE_CERTS_REFRESH_MARGIN_SECONDS: float = float(os.getenv("GOOGLE_CERTS_REFRESH_MARGIN_SECONDS", 300.0))
+    GOOGLE_CERTS_MIN_REFRESH_INTERVAL_SECONDS: float = float(os.getenv("GOOGLE_CERTS_MIN_REFRESH_INTERVAL_SECONDS", 60.0))
+    GOOGLE_ID_TOKEN_CLOCK_SKEW_SECONDS: int = int(os.getenv("GOOGLE_ID_TOKEN_CLOCK_SKEW_SECONDS", 0))
+
+        # Gemini, called by the planner agent (also loaded by the ADK server) and by ingestion
+    GOOGLE_API_KEY: str = os.getenv("GOOGLE_API_KEY", "")
+    # Polling schedule while an uploaded file is PROCESSING on Gemini's side.
+    GEMINI_POLL_INITIAL_DELAY: float = float(os.getenv("GEMINI_POLL_INITIAL_DELAY", 1.0))
+    GEMINI_POLL_MAX_DELAY: float = float(os.getenv("GEMINI_POLL_MAX_DELAY", 15.0))
+    GEMINI_UPLOAD_TIMEOUT: float = float(os.getenv("GEMINI_UPLOAD_TIMEOUT", 900.0))
+    # Shared by every Gemini call in the process, like the ADK breaker.
+    GEMINI_BREAKER_FAILURES: int = int(os.getenv("GEMINI_BREAKER_FAILURES", 5))
+    GEMINI_BREAKER_RESET_SECONDS: float = float(os.getenv("GEMINI_BREAKER_RESET_SECONDS", 30.0))
+    GEMINI_RETRY_ATTEMPTS: int = int(os.getenv("GEMINI_RETRY_ATTEMPTS", 3))
+
+        # Planner agent tools
+    # Longest a single Gemini call of a planner tool may take before the tool gives up on it.
+    PLANNER_TOOL_TIMEOUT_SECONDS: float = float(os.getenv("PLANNER_TOOL_TIMEOUT_SECONDS", 120.0))
+    # Tool results are cached per process and in Redis.
+    PLANNER_CACHE_TTL_SECONDS: int = int(os.getenv("PLANNER_CACHE_TTL_SECONDS", 24 * 3600))
+    PLANNER_CACHE_LOCAL_MAX_ENTRIES: int = int(os.getenv("PLANNER_CACHE_LOCAL_MAX_ENTRIES", 256))
+    PLANNER_CACHE_MAX_RESULT_BYTES: int = int(os.getenv("PLANNER_CACHE_MAX_RESULT_BYTES", 256 * 1024))
+    # A video's Gemini cached context lives this long past its last use.
+    PLANNER_VIDEO_CONTEXT_CACHE: bool = os.getenv("PLANNER_VIDEO_CONTEXT_CACHE", "true").lower() == "true"
+    PLANNER_VIDEO_CONTEXT_TTL_SECONDS: int = int(os.getenv("PLANNER_VIDEO_CONTEXT_TTL_SECONDS", 1800))
+    # Connections the planner keeps for reading scene indexes.
+    PLANNER_DB_POOL_SIZE: int = int(os.getenv("PLANNER_DB_POOL_SIZE", 5))
 
         # ADK
     ADK_API_URL: str = os.getenv("ADK_API_URL", "http://localhost:8000")
     APP_NAME: str = "planner"
+    ADK_MAX_CONNECTIONS: int = int(os.getenv("ADK_MAX_CONNECTIONS", 100))
+    ADK_MAX_KEEPALIVE_CONNECTIONS: int = int(os.getenv("ADK_MAX_KEEPALIVE_CONNECTIONS", 20))
+    ADK_KEEPALIVE_EXPIRY: float = float(os.getenv("ADK_KEEPALIVE_EXPIRY", 30.0))
+    # Requires the optional `h2` package (pip install "httpx[http2]").
+    ADK_HTTP2: bool = os.getenv("ADK_HTTP2", "false").lower() == "true"
+    ADK_CONNECT_TIMEOUT: float = float(os.getenv("ADK_CONNECT_TIMEOUT", 10.0))
+    ADK_POOL_TIMEOUT: float = float(os.getenv("ADK_POOL_TIMEOUT", 30.0))
+    ADK_SESSION_TIMEOUT: float = float(os.getenv("ADK_SESSION_TIMEOUT", 120.0))
+    ADK_RUN_TIMEOUT: float = float(os.getenv("ADK_RUN_TIMEOUT", 300.0))
+    # After this many consecutive failures, ADK calls fail fast for ADK_BREAKER_RESET_SECONDS before one probe is let through.
+    ADK_BREAKER_FAILURES: int = int(os.getenv("ADK_BREAKER_FAILURES", 5))
+    ADK_BREAKER_RESET_SECONDS: float = float(os.getenv("ADK_BREAKER_RESET_SECONDS", 30.0))
+    ADK_RETRY_ATTEMPTS: int = int(os.getenv("ADK_RETRY_ATTEMPTS", 3))
+
+        # Admission control, enforced across workers through Redis. Calls over a cap wait up to
+        # ADMISSION_MAX_WAIT_SECONDS for a slot, as one of at most ADMISSION_QUEUE_DEPTH waiters per upstream.
+    ADK_CONCURRENCY_LIMIT: int = int(os.getenv("ADK_CONCURRENCY_LIMIT", 64))
+    ADK_PER_USER_CONCURRENCY_LIMIT: int = int(os.getenv("ADK_PER_USER_CONCURRENCY_LIMIT", 2))
+    GEMINI_UPLOAD_CONCURRENCY_LIMIT: int = int(os.getenv("GEMINI_UPLOAD_CONCURRENCY_LIMIT", 8))
+    GEMINI_UPLOAD_PER_USER_CONCURRENCY_LIMIT: int = int(os.getenv("GEMINI_UPLOAD_PER_USER_CONCURRENCY_LIMIT", 1))
+    # Upload slots of a crashed worker are reclaimed after this long; must outlast the slowest upload.
+    GEMINI_UPLOAD_ADMISSION_LEASE_SECONDS: float = float(os.getenv("GEMINI_UPLOAD_ADMISSION_LEASE_SECONDS", 3600.0))
+    ADMISSION_QUEUE_DEPTH: int = int(os.getenv("ADMISSION_QUEUE_DEPTH", 100))
+    ADMISSION_MAX_WAIT_SECONDS: float = float(os.getenv("ADMISSION_MAX_WAIT_SECONDS", 10.0))
 
     # AWS S3
     AWS_ACCESS_KEY_ID: str = os.getenv("AWS_ACCESS_KEY_ID", "")
     AWS_SECRET_ACCESS_KEY: str = os.getenv("AWS_SECRET_ACCESS_KEY", "")
     AWS_S3_BUCKET_NAME: str = os.getenv("AWS_S3_BUCKET_NAME", "")
+    AWS_REGION: str = os.getenv("AWS_REGION", "")
+    # Set to use a local S3 stand-in (e.g. a moto server) instead of AWS.
+    AWS_S3_ENDPOINT_URL: str = os.getenv("AWS_S3_ENDPOINT_URL", "")
+    S3_MULTIPART_PART_SIZE: int = int(os.getenv("S3_MULTIPART_PART_SIZE", 8 * 1024 * 1024))
+    S3_MULTIPART_CONCURRENCY: int = int(os.getenv("S3_MULTIPART_CONCURRENCY", 4))
+    S3_MAX_POOL_CONNECTIONS: int = int(os.getenv("S3_MAX_POOL_CONNECTIONS", 50))
+    # Attempts per S3 request, with botocore's jittered backoff between them.
+    S3_MAX_ATTEMPTS: int = int(os.getenv("S3_MAX_ATTEMPTS", 3))
+    S3_BREAKER_FAILURES: int = int(os.getenv("S3_BREAKER_FAILURES", 5))
+    S3_BREAKER_RESET_SECONDS: float = float(os.getenv("S3_BREAKER_RESET_SECONDS", 30.0))
+
+    # Redis
+    REDIS_HOST: str = os.getenv("REDIS_HOST", "localhost")
+    REDIS_PORT: int = int(os.getenv("REDIS_PORT", 6379))
+    REDIS_DB: int = int(os.getenv("REDIS_DB", 0))
+    HISTORY_CACHE_TTL_SECONDS: int = int(os.getenv("HISTORY_CACHE_TTL_SECONDS", 3600))
+    HISTORY_CACHE_MAX_MESSAGES: int = int(os.getenv("HISTORY_CACHE_MAX_MESSAGES", 500))
+
+    # Chat messages are queued in Redis and written to the database in batches.
+    MESSAGE_WRITE_BATCH_SIZE: int = int(os.getenv("MESSAGE_WRITE_BATCH_SIZE", 100))
+    MESSAGE_WRITE_FLUSH_INTERVAL_SECONDS: float = float(os.getenv("MESSAGE_WRITE_FLUSH_INTERVAL_SECONDS", 0.5))
+    MESSAGE_WRITE_CLAIM_IDLE_SECONDS: int = int(os.getenv("MESSAGE_WRITE_CLAIM_IDLE_SECONDS", 60))
+
+    # Background jobs
+    JOB_WORKER_CONCURRENCY: int = int(os.getenv("JOB_WORKER_CONCURRENCY", 4))
+    # Workers renew their claim on a running job; a job whose worker stopped renewing it for this long is taken over.
+    JOB_VISIBILITY_TIMEOUT_SECONDS: int = int(os.getenv("JOB_VISIBILITY_TIMEOUT_SECONDS", 900))
+    JOB_MAX_DELIVERIES: int = int(os.getenv("JOB_MAX_DELIVERIES", 3))
+    # Times a job turned away by a dependency that is down or at capacity is queued again before it fails.
+    JOB_MAX_REQUEUES: int = int(os.getenv("JOB_MAX_REQUEUES", 10))
+
+    # Ingestion: 1 MiB chunks downloaded from S3 ahead of the Gemini upload before the download waits.
+    INGEST_BUFFER_CHUNKS: int = int(os.getenv("INGEST_BUFFER_CHUNKS", 8))
+    # Gemini deletes uploaded files after 48 hours; only reuse one with this much life left.
+    GEMINI_FILE_TTL_HOURS: int = int(os.getenv("GEMINI_FILE_TTL_HOURS", 48))
+    GEMINI_FILE_REUSE_MARGIN_HOURS: int = int(os.getenv("GEMINI_FILE_REUSE_MARGIN_HOURS", 6))
+    # Index each new video's scenes once, so the planner can answer follow-ups without re-reading the video.
+    SCENE_INDEX_ENABLED: bool = os.getenv("SCENE_INDEX_ENABLED", "true").lower() == "true"
+    # Longest the index generation may take; the start job waits for it before finishing.
+    SCENE_INDEX_TIMEOUT_SECONDS: float = float(os.getenv("SCENE_INDEX_TIMEOUT_SECONDS", 600.0))
+
+    # Tracing: "gcp" (Cloud Trace), "console", "memory" (kept in process, for tests) or "none".
+    TRACING_EXPORTER: str = os.getenv("TRACING_EXPORTER", "none").lower()
+    TRACING_SAMPLE_RATIO: float = float(os.getenv("TRACING_SAMPLE_RATIO", 1.0))
+    # Link to a trace in the tracing UI, e.g. "https://console.cloud.google.com/traces/list?tid={trace_id}".
+    TRACE_URL_TEMPLATE: str = os.getenv("TRACE_URL_TEMPLATE", "")
+
+    # Logging: JSON lines written by a background thread. LOG_LEVELS overrides the level per module,
+    # e.g. "app.services.adk_service=DEBUG,app.crud=WARNING".
+    LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO").upper()
+    LOG_LEVELS: str = os.getenv("LOG_LEVELS", "")
+    # Records waiting for the writer thread; beyond this, new records are dropped instead of blocking.
+    LOG_QUEUE_SIZE: int = int(os.getenv("LOG_QUEUE_SIZE", 10000))
+    # Longest message, field or argument written; longer ones are cut.
+    LOG_MAX_FIELD_CHARS: int = int(os.getenv("LOG_MAX_FIELD_CHARS", 2000))
+    # Share of full request/response payload dumps (DEBUG) kept.
+    LOG_PAYLOAD_SAMPLE_RATE: float = float(os.getenv("LOG_PAYLOAD_SAMPLE_RATE", 0.01))
 
 
 settings = Settings()
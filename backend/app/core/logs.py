@@ -0,0 +1,147 @@
+import json
+import logging
+import queue
+import random
+import reprlib
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+from app.core.config import settings
+from app.core.metrics import LOG_RECORDS_DROPPED
+from app.core.tracing import current_trace_id
+
+# Modules log through logging.getLogger(__name__) with %-style arguments, which are only formatted, on the writer
+# thread, for records that pass their logger's level and sampling. configure_logging installs the pipeline.
+
+_listener: Optional[QueueListener] = None
+
+
+def log_fields(sample_rate: float = 1.0, **fields) -> dict:
+    """
+    Builds the `extra` of a log call: structured fields written alongside the message, and the share of such records
+    to keep. Warnings and errors are always kept.
+    """
+    return {"fields": fields, "sample_rate": sample_rate}
+
+def _cap(text: str, limit: int) -> str:
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit]}... ({len(text)} chars)"
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps a record with probability `sample_rate` (see log_fields); runs on the caller's thread, before queueing."""
+    def filter(self, record: logging.LogRecord) -> bool:
+        sample_rate = getattr(record, "sample_rate", 1.0)
+        return record.levelno >= logging.WARNING or sample_rate >= 1.0 or random.random() < sample_rate
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    Hands records to the writer thread unformatted, tagged with the current trace id, which lives in the caller's
+    context. Drops records rather than wait when the queue is full.
+    """
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.trace_id = current_trace_id()
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc()
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Writes a record as one JSON line. Arguments and fields are cut to `max_chars`, and containers are summarized
+    before they are turned into text, so a large payload never costs more than its first few items.
+    """
+    def __init__(self, max_chars: int):
+        super().__init__()
+        self.max_chars = max_chars
+        self._repr = reprlib.Repr()
+        self._repr.maxstring = max_chars
+        self._repr.maxother = max_chars
+        self._repr.maxlevel = 4
+        self._repr.maxdict = self._repr.maxlist = self._repr.maxtuple = 20
+
+    def _short(self, value):
+        if isinstance(value, (int, float, bool)) or value is None:
+            return value
+        if isinstance(value, str):
+            return _cap(value, self.max_chars)
+        if isinstance(value, (dict, list, tuple, set)):
+            return self._repr.repr(value)
+        return _cap(str(value), self.max_chars)
+
+    def _message(self, record: logging.LogRecord) -> str:
+        if not record.args:
+            return _cap(str(record.msg), self.max_chars)
+        args = record.args
+        if isinstance(args, dict) and "%(" not in str(record.msg):
+            # logging unpacks a lone mapping argument; here it is a payload for a single %s.
+            args = (self._short(args),)
+        elif isinstance(args, dict):
+            args = {name: self._short(value) for name, value in args.items()}
+        else:
+            args = tuple(self._short(arg) for arg in args)
+        try:
+            return _cap(str(record.msg) % args, self.max_chars)
+        except (TypeError, ValueError):
+            return _cap(record.getMessage(), self.max_chars)
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": self._message(record),
+        }
+        trace_id = getattr(record, "trace_id", None)
+        if trace_id:
+            entry["trace_id"] = trace_id
+        for name, value in getattr(record, "fields", {}).items():
+            entry[name] = self._short(value)
+        if record.exc_info:
+            entry["exception"] = _cap(self.formatException(record.exc_info), self.max_chars * 4)
+        return json.dumps(entry, default=str)
+
+
+def _module_levels(spec: str) -> Dict[str, str]:
+    levels = {}
+    for item in spec.split(","):
+        name, _, level = item.partition("=")
+        if name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+def configure_logging():
+    """
+    Routes the root logger through a bounded queue to a background thread writing JSON lines to stdout, and applies
+    LOG_LEVEL and the per-module LOG_LEVELS. Called once, when the app is created.
+    """
+    global _listener
+    if _listener is not None:
+        return
+    handler = NonBlockingQueueHandler(queue.Queue(settings.LOG_QUEUE_SIZE))
+    handler.addFilter(SamplingFilter())
+    writer = logging.StreamHandler(sys.stdout)
+    writer.setFormatter(JsonFormatter(settings.LOG_MAX_FIELD_CHARS))
+
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(settings.LOG_LEVEL)
+    for name, level in _module_levels(settings.LOG_LEVELS).items():
+        logging.getLogger(name).setLevel(level)
+
+    _listener = QueueListener(handler.queue, writer)
+    _listener.start()
+
+def shutdown_logging():
+    """Writes out the records still queued and stops the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,214 @@
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Callable, Dict, Mapping
+import redis
+import redis.asyncio
+from prometheus_client import Counter, Gauge, Histogram
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from app.core.resilience import CLOSED, HALF_OPEN, OPEN, circuit_breakers
+from opentelemetry import trace
+from opentelemetry.trace import SpanKind
+from app.core.tracing import tracer
+
+# Prometheus metrics of this process. Everything recorded on a request's path is a histogram observation or a counter
+# increment; pool and breaker state is read when /metrics is scraped instead.
+
+# Stages run from milliseconds (DB writes) to many minutes (Gemini processing a long video).
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 900)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Time to handle an HTTP request, including streaming its response.",
+    ["method", "route", "status"],
+    buckets=STAGE_BUCKETS,
+)
+STAGE_LATENCY = Histogram(
+    "stage_duration_seconds", "Time spent in each stage of ingesting a video and running a conversation turn.",
+    ["stage"],
+    buckets=STAGE_BUCKETS,
+)
+REDIS_LATENCY = Histogram(
+    "redis_command_duration_seconds", "Round trip of a Redis command or pipeline.",
+    ["client", "command"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1),
+)
+HTTP_POOL_WAIT = Histogram(
+    "http_pool_wait_seconds", "Time a request waited for a connection from a shared HTTP client's pool.",
+    ["pool"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+CACHE_LOOKUPS = Counter(
+    "cache_lookups_total", "Lookups in an in-process or Redis cache, by whether they hit.",
+    ["cache", "result"],
+)
+PASSWORD_HASH_REJECTED = Counter(
+    "password_hash_rejected_total", "Password hashing calls turned away because the pool was full.",
+)
+PASSWORD_HASH_IN_FLIGHT = Gauge(
+    "password_hash_in_flight", "Password hashing calls running or queued in the process pool.",
+)
+LOG_RECORDS_DROPPED = Counter(
+    "log_records_dropped_total", "Log records dropped because the log writer fell behind.",
+)
+JOB_TRANSITIONS = Counter(
+    "job_status_transitions_total", "Jobs created in or moved to a status, and transitions refused by the status checks.",
+    ["status", "outcome"],
+)
+
+
+def observe_stage(stage: str, seconds: float):
+    STAGE_LATENCY.labels(stage).observe(seconds)
+
+@contextmanager
+def time_stage(stage: str):
+    """Records how long the block takes as `stage`, whether it succeeds or fails, and traces it as a span of that name."""
+    started = time.perf_counter()
+    try:
+        with tracer.start_as_current_span(stage):
+            yield
+    finally:
+        STAGE_LATENCY.labels(stage).observe(time.perf_counter() - started)
+
+@contextmanager
+def time_redis(client: str, command: str):
+    """
+    Records the round trip of a Redis command or pipeline, and traces it as a child span when it runs inside a trace,
+    so background polling such as the job workers' reads starts no traces of its own.
+    """
+    started = time.perf_counter()
+    span = nullcontext()
+    if trace.get_current_span().get_span_context().is_valid:
+        span = tracer.start_as_current_span(
+            f"redis {command}", kind=SpanKind.CLIENT, attributes={"db.system": "redis", "redis.client": client}
+        )
+    try:
+        with span:
+            yield
+    finally:
+        REDIS_LATENCY.labels(client, command).observe(time.perf_counter() - started)
+
+def observe_timings(timings: Mapping[str, float]):
+    """Records timings collected as {"<stage>_seconds": seconds}, like a job's ingestion_timings."""
+    for name, seconds in timings.items():
+        STAGE_LATENCY.labels(name.removesuffix("_seconds")).observe(seconds)
+
+
+class MetricsMiddleware:
+    """
+    Times every HTTP request by route template, so /api/chat/{job_id} is one series rather than one per job.
+    A plain ASGI middleware, which unlike BaseHTTPMiddleware leaves streamed responses alone.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # The router records the matched route in the scope.
+            route = scope.get("route")
+            REQUEST_LATENCY.labels(scope["method"], getattr(route, "path", "unmatched"), str(status)).observe(time.perf_counter() - started)
+
+
+class InstrumentedAsyncPipeline(redis.asyncio.client.Pipeline):
+    async def execute(self, raise_on_error: bool = True):
+        with time_redis(self.metrics_client, "PIPELINE"):
+            return await super().execute(raise_on_error)
+
+
+class InstrumentedAsyncRedis(redis.asyncio.Redis):
+    """An asyncio Redis client that records, and traces, each command and pipeline under `metrics_client`."""
+    def __init__(self, *args, metrics_client: str, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics_client = metrics_client
+
+    async def execute_command(self, *args, **options):
+        with time_redis(self.metrics_client, str(args[0]).upper()):
+            return await super().execute_command(*args, **options)
+
+    def pipeline(self, transaction: bool = True, shard_hint=None) -> InstrumentedAsyncPipeline:
+        pipe = InstrumentedAsyncPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+        pipe.metrics_client = self.metrics_client
+        return pipe
+
+
+class InstrumentedPipeline(redis.client.Pipeline):
+    def execute(self, raise_on_error: bool = True):
+        with time_redis(self.metrics_client, "PIPELINE"):
+            return super().execute(raise_on_error)
+
+
+class InstrumentedRedis(redis.Redis):
+    """A blocking Redis client that records, and traces, each command and pipeline under `metrics_client`."""
+    def __init__(self, *args, metrics_client: str, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics_client = metrics_client
+
+    def execute_command(self, *args, **options):
+        with time_redis(self.metrics_client, str(args[0]).upper()):
+            return super().execute_command(*args, **options)
+
+    def pipeline(self, transaction: bool = True, shard_hint=None) -> InstrumentedPipeline:
+        pipe = InstrumentedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+        pipe.metrics_client = self.metrics_client
+        return pipe
+
+
+class PoolCollector:
+    """
+    Reports connection pool usage when scraped: SQLAlchemy pools by engine name, and HTTP pools by the name of a
+    callable returning a snapshot with "connections", "idle" and "max_connections". Time spent waiting for an HTTP
+    connection is recorded as it happens, in HTTP_POOL_WAIT.
+    """
+    def __init__(self, db_pools: Dict[str, object], http_pools: Dict[str, Callable[[], dict]]):
+        self.db_pools = db_pools
+        self.http_pools = http_pools
+
+    def collect(self):
+        checked_out = GaugeMetricFamily("db_pool_checked_out_connections", "Connections in use.", labels=["engine"])
+        checked_in = GaugeMetricFamily("db_pool_idle_connections", "Open connections waiting in the pool.", labels=["engine"])
+        overflow = GaugeMetricFamily("db_pool_overflow_connections", "Connections open beyond pool_size.", labels=["engine"])
+        size = GaugeMetricFamily("db_pool_size", "Configured pool_size.", labels=["engine"])
+        for name, pool in self.db_pools.items():
+            checked_out.add_metric([name], pool.checkedout())
+            checked_in.add_metric([name], pool.checkedin())
+            overflow.add_metric([name], max(pool.overflow(), 0))
+            size.add_metric([name], pool.size())
+        yield from (checked_out, checked_in, overflow, size)
+
+        connections = GaugeMetricFamily("http_pool_connections", "Open connections.", labels=["pool"])
+        idle = GaugeMetricFamily("http_pool_idle_connections", "Open connections not serving a request.", labels=["pool"])
+        limit = GaugeMetricFamily("http_pool_max_connections", "Configured connection limit.", labels=["pool"])
+        for name, snapshot in self.http_pools.items():
+            snapshot = snapshot()
+            connections.add_metric([name], snapshot["connections"])
+            idle.add_metric([name], snapshot["idle"])
+            limit.add_metric([name], snapshot["max_connections"])
+        yield from (connections, idle, limit)
+
+
+class CircuitBreakerCollector:
+    """Reports the state of every circuit breaker in the process when scraped."""
+    def collect(self):
+        state = GaugeMetricFamily("circuit_breaker_state", "1 for the state each dependency's breaker is in.", labels=["dependency", "state"])
+        failures = GaugeMetricFamily("circuit_breaker_consecutive_failures", "Failures since the last success.", labels=["dependency"])
+        opened = CounterMetricFamily("circuit_breaker_opened", "Times the breaker opened.", labels=["dependency"])
+        rejected = CounterMetricFamily("circuit_breaker_rejected_calls", "Calls failed fast while the breaker was open.", labels=["dependency"])
+        for name, breaker in circuit_breakers.items():
+            for candidate in (CLOSED, OPEN, HALF_OPEN):
+                state.add_metric([name, candidate], 1 if breaker.state == candidate else 0)
+            failures.add_metric([name], breaker.failures)
+            opened.add_metric([name], breaker.opened_count)
+            rejected.add_metric([name], breaker.rejected)
+        yield from (state, failures, opened, rejected)
@@ -1,10 +1,12 @@
-import redis
 import json
-from typing import List, Dict
+from typing import Callable, List, Dict
+from redis.exceptions import WatchError
+from app.core.config import settings
+from app.core.metrics import InstrumentedAsyncRedis, InstrumentedRedis
 
 class RedisClient:
     def __init__(self, host='localhost', port=6379, db=0):
-        self.client = redis.Redis(host=host, port=port, db=db, decode_responses=True)
+        self.client = InstrumentedRedis(host=host, port=port, db=db, decode_responses=True, metrics_client="sync")
 
     def rpush(self, key: str, value: str):
         self.client.rpush(key, value)
@@ -12,9 +14,52 @@ class RedisClient:
     def lrange(self, key: str, start: int, end: int) -> List[str]:
         return self.client.lrange(key, start, end)
 
+    def history_key(self, conversation_id: str) -> str:
+        return f"chat_history:{conversation_id}"
+
+    def history_version_key(self, conversation_id: str) -> str:
+        return f"chat_history_version:{conversation_id}"
+
+    def history_pending_key(self, conversation_id: str) -> str:
+        return f"chat_history_pending:{conversation_id}"
+
     def get_history(self, conversation_id: str) -> List[str]:
         """Retrieves the current chat history for a job from Redis as a list of JSON strings."""
-        key = f"chat_history:{conversation_id}"
+        key = self.history_key(conversation_id)
         return self.lrange(key, 0, -1)
 
-redis_client = RedisClient()
\ No newline at end of file
+    def get_pending_history(self, conversation_id: str) -> List[str]:
+        """Retrieves the messages of a job not yet written to the database, as JSON strings in no particular order."""
+        return self.client.hvals(self.history_pending_key(conversation_id))
+
+    def cache_history(self, conversation_id: str, load: Callable[[], List[str]], ttl: int, max_len: int) -> List[str]:
+        """
+        Replaces the cached chat history with what `load` returns and returns it. Histories longer than `max_len` are
+        not cached, nor is anything if a message was appended while `load` ran, since its result may be out of date.
+        """
+        version_key = self.history_version_key(conversation_id)
+        key = self.history_key(conversation_id)
+        with self.client.pipeline() as pipe:
+            pipe.watch(version_key)
+            values = load()
+            if not values or len(values) > max_len:
+                return values
+            pipe.multi()
+            pipe.delete(key)
+            pipe.rpush(key, *values)
+            pipe.expire(key, ttl)
+            try:
+                pipe.execute()
+            except WatchError:
+                pass
+        return values
+
+    def delete(self, key: str):
+        self.client.delete(key)
+
+redis_client = RedisClient(host=settings.REDIS_HOST, port=settings.REDIS_PORT, db=settings.REDIS_DB)
+
+# Used by code running on the event loop (background workers, streams).
+async_redis = InstrumentedAsyncRedis(
+    host=settings.REDIS_HOST, port=settings.REDIS_PORT, db=settings.REDIS_DB, decode_responses=True, metrics_client="async"
+)
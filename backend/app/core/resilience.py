@@ -0,0 +1,142 @@
+import asyncio
+import logging
+import math
+import random
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Every breaker in this process by dependency name, for health and metrics endpoints.
+circuit_breakers: Dict[str, "CircuitBreaker"] = {}
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency whose circuit breaker is open."""
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"{name} is unavailable, failing fast for another {math.ceil(retry_after)}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Fails calls to a dependency fast once it looks unhealthy, instead of letting each one wait out its timeout.
+
+    After `failure_threshold` consecutive failures the breaker opens and rejects calls with CircuitOpenError for
+    `reset_timeout` seconds. It then turns half-open and lets a single probe call through: success closes it again,
+    failure reopens it. `is_failure` decides which exceptions count; errors the dependency answered on purpose,
+    such as a 404, should not.
+    """
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float, is_failure: Optional[Callable[[BaseException], bool]] = None):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.is_failure = is_failure or (lambda e: True)
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.opened_count = 0
+        self.rejected = 0
+        self._probing = False
+        circuit_breakers[name] = self
+
+    def _allow(self):
+        if self.state == OPEN:
+            remaining = self.opened_at + self.reset_timeout - time.monotonic()
+            if remaining > 0:
+                self.rejected += 1
+                raise CircuitOpenError(self.name, remaining)
+            self.state = HALF_OPEN
+            self._probing = False
+        if self.state == HALF_OPEN:
+            if self._probing:
+                self.rejected += 1
+                raise CircuitOpenError(self.name, self.reset_timeout)
+            self._probing = True
+
+    def _open(self):
+        if self.state != OPEN:
+            self.opened_count += 1
+            logger.warning("Circuit breaker for %s opened after %d consecutive failures", self.name, self.failures)
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+        self._probing = False
+
+    def _record_success(self):
+        if self.state != CLOSED:
+            logger.info("Circuit breaker for %s closed", self.name)
+        self.state = CLOSED
+        self.failures = 0
+        self._probing = False
+
+    def _record_failure(self):
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            self._open()
+
+    @asynccontextmanager
+    async def guard(self):
+        """Runs the block as one call through the breaker."""
+        self._allow()
+        try:
+            yield
+        except asyncio.CancelledError:
+            # Says nothing about the dependency; let the next call probe instead.
+            self._probing = False
+            raise
+        except Exception as e:
+            if self.is_failure(e):
+                self._record_failure()
+            else:
+                self._record_success()
+            raise
+        self._record_success()
+
+    async def call(self, fn: Callable[..., Awaitable[T]], *args, **kwargs) -> T:
+        """Calls `fn(*args, **kwargs)` through the breaker."""
+        async with self.guard():
+            return await fn(*args, **kwargs)
+
+    def snapshot(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "opened_count": self.opened_count,
+            "rejected": self.rejected,
+        }
+
+
+@dataclass
+class RetryPolicy:
+    """Bounded retries with full-jitter exponential backoff, for idempotent operations only."""
+    attempts: int
+    base_delay: float
+    max_delay: float
+    retry_on: Callable[[BaseException], bool]
+
+
+async def retry_async(fn: Callable[[], Awaitable[T]], policy: RetryPolicy, breaker: Optional[CircuitBreaker] = None) -> T:
+    """
+    Calls `fn`, through `breaker` if given, retrying errors `policy.retry_on` accepts up to `policy.attempts` times
+    in total. An open breaker is never retried.
+    """
+    for attempt in range(1, policy.attempts + 1):
+        try:
+            if breaker is not None:
+                return await breaker.call(fn)
+            return await fn()
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            if attempt == policy.attempts or not policy.retry_on(e):
+                raise
+            await asyncio.sleep(random.uniform(0, min(policy.max_delay, policy.base_delay * 2 ** (attempt - 1))))
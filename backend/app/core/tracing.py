@@ -0,0 +1,134 @@
+import time
+from typing import Dict, Optional
+from opentelemetry import propagate, trace
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter, SimpleSpanProcessor, SpanExporter
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+from opentelemetry.trace import SpanKind, Status, StatusCode, format_trace_id
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app.core.config import settings
+
+tracer = trace.get_tracer("scenespeak")
+
+# Holds the finished spans when TRACING_EXPORTER is "memory".
+span_exporter: Optional[SpanExporter] = None
+
+# Longest SQL statement recorded on a query span.
+MAX_STATEMENT_LENGTH = 2000
+
+
+def configure_tracing(exporter: str = settings.TRACING_EXPORTER, sample_ratio: float = settings.TRACING_SAMPLE_RATIO):
+    """
+    Installs the process's tracer provider. Spans are always created, so jobs get trace ids and context is propagated
+    to ADK, but are only exported with an exporter other than "none". Called once, when the app is created.
+    """
+    global span_exporter
+    provider = TracerProvider(
+        resource=Resource.create({"service.name": "scenespeak-api"}),
+        sampler=ParentBased(TraceIdRatioBased(sample_ratio)),
+    )
+    if exporter == "memory":
+        span_exporter = InMemorySpanExporter()
+        provider.add_span_processor(SimpleSpanProcessor(span_exporter))
+    elif exporter == "console":
+        provider.add_span_processor(BatchSpanProcessor(ConsoleSpanExporter()))
+    elif exporter == "gcp":
+        from opentelemetry.exporter.cloud_trace import CloudTraceSpanExporter
+        provider.add_span_processor(BatchSpanProcessor(CloudTraceSpanExporter()))
+    trace.set_tracer_provider(provider)
+
+def shutdown_tracing():
+    """Flushes spans still waiting to be exported."""
+    provider = trace.get_tracer_provider()
+    if isinstance(provider, TracerProvider):
+        provider.shutdown()
+
+def current_trace_id() -> Optional[str]:
+    """Returns the hex id of the trace being recorded, or None outside a sampled trace."""
+    span_context = trace.get_current_span().get_span_context()
+    if not span_context.is_valid or not span_context.trace_flags.sampled:
+        return None
+    return format_trace_id(span_context.trace_id)
+
+def record_span(name: str, start_ns: int, end_ns: Optional[int] = None):
+    """Records work that has already happened, from `start_ns` to `end_ns` (default: now), as a child span."""
+    tracer.start_span(name, start_time=start_ns).end(end_time=end_ns)
+
+def trace_url(trace_id: Optional[str]) -> Optional[str]:
+    """Links a trace id to the tracing UI, if TRACE_URL_TEMPLATE is set."""
+    if not trace_id or not settings.TRACE_URL_TEMPLATE:
+        return None
+    return settings.TRACE_URL_TEMPLATE.format(trace_id=trace_id)
+
+def inject_trace_context(carrier: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+    """Adds the current trace context (traceparent) to HTTP headers or a queued payload, and returns it."""
+    carrier = {} if carrier is None else carrier
+    propagate.inject(carrier)
+    return carrier
+
+def extract_trace_context(carrier: Optional[Dict[str, str]]):
+    return propagate.extract(carrier or {})
+
+
+class TracingMiddleware:
+    """
+    Starts a server span per HTTP request, continuing the caller's trace if the request carries one, and names it after
+    the matched route once routing is done. Also records when the request arrived, as `request.state.started_ns`,
+    for spans of work done before the endpoint runs, such as parsing the body.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        scope.setdefault("state", {})["started_ns"] = time.time_ns()
+        headers = {name.decode("latin-1"): value.decode("latin-1") for name, value in scope["headers"]}
+
+        with tracer.start_as_current_span(scope["method"], context=propagate.extract(headers), kind=SpanKind.SERVER) as span:
+            async def send_with_status(message):
+                if message["type"] == "http.response.start":
+                    span.set_attribute("http.response.status_code", message["status"])
+                    if message["status"] >= 500:
+                        span.set_status(Status(StatusCode.ERROR))
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_status)
+            finally:
+                route = getattr(scope.get("route"), "path", None)
+                if route:
+                    span.update_name(f"{scope['method']} {route}")
+                    span.set_attribute("http.route", route)
+
+
+def instrument_engine(engine: Engine, name: str):
+    """Traces every query run on a SQLAlchemy engine (for an async engine, pass its sync_engine) as a child span."""
+    @event.listens_for(engine, "before_cursor_execute")
+    def start_query_span(conn, cursor, statement, parameters, context, executemany):
+        operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "QUERY"
+        span = tracer.start_span(
+            f"db {operation}",
+            kind=SpanKind.CLIENT,
+            attributes={"db.system": "postgresql", "db.engine": name, "db.statement": statement[:MAX_STATEMENT_LENGTH]},
+        )
+        conn.info.setdefault("query_spans", []).append(span)
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def end_query_span(conn, cursor, statement, parameters, context, executemany):
+        spans = conn.info.get("query_spans")
+        if spans:
+            spans.pop().end()
+
+    @event.listens_for(engine, "handle_error")
+    def fail_query_span(exception_context):
+        spans = exception_context.connection.info.get("query_spans") if exception_context.connection is not None else None
+        if spans:
+            span = spans.pop()
+            span.record_exception(exception_context.original_exception)
+            span.set_status(Status(StatusCode.ERROR))
+            span.end()
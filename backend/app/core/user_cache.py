@@ -0,0 +1,135 @@
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+from redis.exceptions import RedisError
+from app.core.config import settings
+from app.core.redis_client import redis_client, async_redis
+from app.models import db_models
+
+logger = logging.getLogger(__name__)
+
+# Columns kept for an authenticated user; routes only need identity and status, never the password hash.
+CACHED_FIELDS = ("id", "email", "first_name", "last_name", "google_id", "is_active")
+
+class UserCache:
+    """
+    Two-tier cache of authenticated users keyed by token subject (email): a per-process TTL/LRU in front of Redis.
+
+    Updates made through user_crud drop the Redis entry and this process's local copy. Other processes drop their
+    local copy when it expires, so a change takes up to `local_ttl` seconds to be seen everywhere.
+    """
+    def __init__(self, client, async_client, local_ttl: float, local_max_size: int, ttl: int):
+        self.client = client
+        self.async_client = async_client
+        self.local_ttl = local_ttl
+        self.local_max_size = local_max_size
+        self.ttl = ttl
+        self._local: "OrderedDict[str, tuple]" = OrderedDict()
+        # The sync dependency runs in the threadpool, so the local tier is shared between threads.
+        self._lock = threading.Lock()
+
+    def _key(self, email: str) -> str:
+        return f"user_cache:{email}"
+
+    def _get_local(self, email: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._local.get(email)
+            if entry is None:
+                return None
+            expires_at, fields = entry
+            if expires_at <= time.monotonic():
+                del self._local[email]
+                return None
+            self._local.move_to_end(email)
+            return fields
+
+    def _set_local(self, email: str, fields: dict):
+        with self._lock:
+            self._local[email] = (time.monotonic() + self.local_ttl, fields)
+            self._local.move_to_end(email)
+            while len(self._local) > self.local_max_size:
+                self._local.popitem(last=False)
+
+    def _drop_local(self, email: str):
+        with self._lock:
+            self._local.pop(email, None)
+
+    def _to_user(self, fields: dict) -> db_models.User:
+        # Detached from any session; enough for routes that read the user's columns.
+        return db_models.User(**fields)
+
+    def get(self, email: str) -> Optional[db_models.User]:
+        """Returns the cached user for a token subject, or None on a miss."""
+        fields = self._get_local(email)
+        if fields is None:
+            try:
+                value = self.client.get(self._key(email))
+            except RedisError as e:
+                logger.warning("User cache lookup failed, falling back to the database: %s", e)
+                return None
+            if value is None:
+                return None
+            fields = json.loads(value)
+            self._set_local(email, fields)
+        return self._to_user(fields)
+
+    def set(self, user: db_models.User):
+        """Caches a user loaded from the database."""
+        fields = {name: getattr(user, name) for name in CACHED_FIELDS}
+        self._set_local(user.email, fields)
+        try:
+            self.client.setex(self._key(user.email), self.ttl, json.dumps(fields))
+        except RedisError as e:
+            logger.warning("Failed to cache user %s: %s", user.id, e)
+
+    def invalidate(self, email: str):
+        """Drops a user from both tiers after it changed."""
+        self._drop_local(email)
+        try:
+            self.client.delete(self._key(email))
+        except RedisError as e:
+            # The change is committed by now; the stale entry expires after `ttl` seconds.
+            logger.warning("Failed to invalidate cached user %s: %s", email, e)
+
+    async def get_async(self, email: str) -> Optional[db_models.User]:
+        """Async variant of get for code running on the event loop."""
+        fields = self._get_local(email)
+        if fields is None:
+            try:
+                value = await self.async_client.get(self._key(email))
+            except RedisError as e:
+                logger.warning("User cache lookup failed, falling back to the database: %s", e)
+                return None
+            if value is None:
+                return None
+            fields = json.loads(value)
+            self._set_local(email, fields)
+        return self._to_user(fields)
+
+    async def set_async(self, user: db_models.User):
+        """Async variant of set."""
+        fields = {name: getattr(user, name) for name in CACHED_FIELDS}
+        self._set_local(user.email, fields)
+        try:
+            await self.async_client.setex(self._key(user.email), self.ttl, json.dumps(fields))
+        except RedisError as e:
+            logger.warning("Failed to cache user %s: %s", user.id, e)
+
+    async def invalidate_async(self, email: str):
+        """Async variant of invalidate."""
+        self._drop_local(email)
+        try:
+            await self.async_client.delete(self._key(email))
+        except RedisError as e:
+            logger.warning("Failed to invalidate cached user %s: %s", email, e)
+
+user_cache = UserCache(
+    redis_client.client,
+    async_redis,
+    local_ttl=settings.USER_CACHE_LOCAL_TTL_SECONDS,
+    local_max_size=settings.USER_CACHE_LOCAL_MAX_SIZE,
+    ttl=settings.USER_CACHE_TTL_SECONDS,
+)
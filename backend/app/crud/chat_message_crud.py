@@ -0,0 +1,41 @@
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import tuple_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+import uuid
+from app.models import db_models
+
+def get_messages_by_job(db: Session, job_id: uuid.UUID) -> List[db_models.ChatMessage]:
+    """
+    Fetches all messages of a conversation, oldest first.
+    """
+    return (
+        db.query(db_models.ChatMessage)
+        .filter(db_models.ChatMessage.job_id == job_id)
+        .order_by(db_models.ChatMessage.created_at, db_models.ChatMessage.id)
+        .all()
+    )
+
+def get_latest_messages_by_job(db: Session, job_id: uuid.UUID, limit: int, before: Optional[Tuple[datetime, uuid.UUID]] = None) -> List[db_models.ChatMessage]:
+    """
+    Fetches up to `limit` of a conversation's most recent messages, newest first.
+    `before` is the (created_at, id) of the oldest message already fetched.
+    """
+    query = db.query(db_models.ChatMessage).filter(db_models.ChatMessage.job_id == job_id)
+    if before is not None:
+        query = query.filter(tuple_(db_models.ChatMessage.created_at, db_models.ChatMessage.id) < before)
+    return query.order_by(db_models.ChatMessage.created_at.desc(), db_models.ChatMessage.id.desc()).limit(limit).all()
+
+async def insert_messages(db: AsyncSession, messages: List[Dict]):
+    """
+    Inserts a batch of messages with a single multi-row INSERT. Messages whose id is already stored are skipped,
+    so a batch can safely be written more than once.
+    """
+    await db.execute(
+        insert(db_models.ChatMessage)
+        .values(messages)
+        .on_conflict_do_nothing(index_elements=[db_models.ChatMessage.id])
+    )
+    await db.commit()
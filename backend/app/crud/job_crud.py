@@ -1,67 +1,121 @@
-from typing import List
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
+from sqlalchemy import Row, insert, select, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
+import logging
 import uuid
+from app.core.metrics import JOB_TRANSITIONS, time_stage
+from app.core.tracing import current_trace_id
 from app.models import db_models
 
-def create_job(db: Session, user_id: int, job_type: db_models.JobType, prompt: str, title: str, gemini_file_id: str = None, source_url: str = None, display_video_url: str = None, current_agent: str = None) -> db_models.Job:
-    """
-    Creates a new job record in the database.
-    """
-    db_job = db_models.Job(
-        user_id=user_id, 
-        job_type=job_type,
-        prompt=prompt,
-        title=title,
-        gemini_file_id=gemini_file_id,
-        source_url=source_url,
-        display_video_url=display_video_url,
-        current_agent=current_agent
+logger = logging.getLogger(__name__)
+
+# Statuses a job may move to, each with the statuses it may move from. New jobs start PENDING or PROCESSING.
+# PROCESSING -> PROCESSING records a start job's progress (ingested, Gemini done) and lets a redelivered or requeued
+# start job pick its job up again.
+ALLOWED_TRANSITIONS = {
+    db_models.JobStatus.PROCESSING: (db_models.JobStatus.PENDING, db_models.JobStatus.PROCESSING),
+    db_models.JobStatus.ACTIVE: (db_models.JobStatus.PROCESSING, db_models.JobStatus.ACTIVE, db_models.JobStatus.ERROR),
+    db_models.JobStatus.ERROR: (db_models.JobStatus.PENDING, db_models.JobStatus.PROCESSING, db_models.JobStatus.ACTIVE, db_models.JobStatus.ERROR),
+}
+
+def _insert_job(user_id: int, job_type: db_models.JobType, prompt: str, title: str, status: db_models.JobStatus, **values):
+    return (
+        insert(db_models.Job)
+        .values(
+            user_id=user_id, job_type=job_type, prompt=prompt, title=title, status=status, trace_id=current_trace_id(),
+            **{name: value for name, value in values.items() if value is not None}
+        )
+        .returning(db_models.Job)
+    )
+
+def _transition_job(job_id: uuid.UUID, user_id: int, status: db_models.JobStatus, **values):
+    # Points the job at the trace that moved it last, e.g. the turn that failed; None keeps the previous one.
+    values["trace_id"] = current_trace_id()
+    return (
+        update(db_models.Job)
+        .where(
+            db_models.Job.id == job_id,
+            db_models.Job.user_id == user_id,
+            db_models.Job.status.in_(ALLOWED_TRANSITIONS[status]),
+        )
+        .values(status=status, **{name: value for name, value in values.items() if value is not None})
+        .returning(db_models.Job)
+        .execution_options(populate_existing=True)
     )
-    db.add(db_job)
-    db.commit()
-    db.refresh(db_job)
-    return db_job
+
+def _count_transition(status: db_models.JobStatus, db_job: Optional[db_models.Job], outcome: str = "applied"):
+    JOB_TRANSITIONS.labels(status.value, outcome if db_job is not None else "refused").inc()
 
 def get_job(db: Session, job_id: uuid.UUID, user_id: int) -> db_models.Job:
     """
     Fetches a job by its ID, ensuring it belongs to the correct user.
     """
-    print(f"Attempting to fetch job with ID: {job_id} for user ID: {user_id}")
     job = db.query(db_models.Job).filter(db_models.Job.id == job_id, db_models.Job.user_id == user_id).first()
-    if job:
-        print(f"Found job: {job.id} for user: {job.user_id}")
-    else:
-        print(f"Job with ID: {job_id} not found for user ID: {user_id}")
+    if job is None:
+        logger.debug("Job %s not found for user %s", job_id, user_id)
     return job
 
-def get_jobs_by_user(db: Session, user_id: int) -> List[db_models.Job]:
+def get_job_summaries_by_user(db: Session, user_id: int, limit: int, before: Optional[Tuple[datetime, uuid.UUID]] = None) -> List[Row]:
     """
-    Fetches all jobs for a specific user.
+    Fetches a page of a user's jobs, newest first, loading only the columns shown in the conversation list.
+    `before` is the (created_at, id) of the last job on the previous page.
     """
-    return db.query(db_models.Job).filter(db_models.Job.user_id == user_id).order_by(db_models.Job.created_at.desc()).all()
+    query = db.query(
+        db_models.Job.id,
+        db_models.Job.title,
+        db_models.Job.status,
+        db_models.Job.job_type,
+        db_models.Job.source_url,
+        db_models.Job.display_video_url,
+        db_models.Job.created_at,
+    ).filter(db_models.Job.user_id == user_id)
+    if before is not None:
+        query = query.filter(tuple_(db_models.Job.created_at, db_models.Job.id) < before)
+    return query.order_by(db_models.Job.created_at.desc(), db_models.Job.id.desc()).limit(limit).all()
+
 
-def update_job_status(db: Session, job_id: uuid.UUID, user_id: int, status: db_models.JobStatus, result: str = None, error_message: str = None):
+# Async variants, used by async routes and background workers so queries don't block the event loop.
+
+async def create_job_async(db: AsyncSession, user_id: int, job_type: db_models.JobType, prompt: str, title: str, gemini_file_id: str = None, source_url: str = None, display_video_url: str = None, current_agent: str = None, ingestion_timings: dict = None, video_asset_hash: str = None, status: db_models.JobStatus = db_models.JobStatus.PENDING) -> db_models.Job:
     """
-    Updates the status and result of a job, ensuring it belongs to the correct user.
+    Creates a new job record in the database with a single INSERT ... RETURNING.
     """
-    db_job = db.query(db_models.Job).filter(db_models.Job.id == job_id, db_models.Job.user_id == user_id).first()
-    if db_job:
-        db_job.status = status
-        if result:
-            db_job.result = result
-        if error_message:
-            db_job.error_message = error_message
-        db.commit()
-        db.refresh(db_job)
+    with time_stage("db_job_create"):
+        result = await db.execute(_insert_job(
+            user_id, job_type, prompt, title, status,
+            gemini_file_id=gemini_file_id,
+            source_url=source_url,
+            display_video_url=display_video_url,
+            current_agent=current_agent,
+            ingestion_timings=ingestion_timings,
+            video_asset_hash=video_asset_hash
+        ))
+        db_job = result.scalars().first()
+        await db.commit()
+    _count_transition(status, db_job, "created")
     return db_job
 
-def update_job_agent(db: Session, job_id: uuid.UUID, user_id: int, agent_name: str):
+async def get_job_async(db: AsyncSession, job_id: uuid.UUID, user_id: int) -> db_models.Job:
+    """
+    Fetches a job by its ID, ensuring it belongs to the correct user.
+    """
+    result = await db.execute(select(db_models.Job).where(db_models.Job.id == job_id, db_models.Job.user_id == user_id))
+    return result.scalars().first()
+
+async def transition_job_async(db: AsyncSession, job_id: uuid.UUID, user_id: int, status: db_models.JobStatus, current_agent: Any = None, error_message: str = None, ingestion_timings: dict = None, gemini_file_id: str = None, display_video_url: str = None, video_asset_hash: str = None) -> Optional[db_models.Job]:
     """
-    Updates the current agent of a job, ensuring it belongs to the correct user.
+    Moves a job to `status`, setting any other given columns, with a single UPDATE ... RETURNING that also checks
+    the job belongs to the correct user and may make the transition. Returns None if it doesn't or can't.
     """
-    db_job = db.query(db_models.Job).filter(db_models.Job.id == job_id, db_models.Job.user_id == user_id).first()
-    if db_job:
-        db_job.current_agent = agent_name
-        db.commit()
-        db.refresh(db_job)
+    with time_stage("db_job_transition"):
+        result = await db.execute(_transition_job(
+            job_id, user_id, status,
+            current_agent=current_agent, error_message=error_message, ingestion_timings=ingestion_timings,
+            gemini_file_id=gemini_file_id, display_video_url=display_video_url, video_asset_hash=video_asset_hash
+        ))
+        db_job = result.scalars().first()
+        await db.commit()
+    _count_transition(status, db_job)
     return db_job
@@ -0,0 +1,23 @@
+from typing import Dict, List, Optional
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models import db_models
+
+async def get_scene_index(db: AsyncSession, video_key: str) -> Optional[db_models.VideoSceneIndex]:
+    """
+    Fetches the scene index of a video by its key.
+    """
+    result = await db.execute(select(db_models.VideoSceneIndex).where(db_models.VideoSceneIndex.video_key == video_key))
+    return result.scalars().first()
+
+async def create_scene_index(db: AsyncSession, video_key: str, model: str, segments: List[Dict], video_asset_hash: str = None):
+    """
+    Stores the scene index of a video. If a concurrent job indexed the same video first, keeps that one.
+    """
+    await db.execute(
+        insert(db_models.VideoSceneIndex)
+        .values(video_key=video_key, video_asset_hash=video_asset_hash, model=model, segments=segments)
+        .on_conflict_do_nothing(index_elements=[db_models.VideoSceneIndex.video_key])
+    )
+    await db.commit()
@@ -1,5 +1,8 @@
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from app.models import db_models, api_models
+from app.core.user_cache import user_cache
 from app.security.core import get_password_hash
 
 def get_user_by_email(db: Session, email: str) -> db_models.User:
@@ -44,6 +47,7 @@ def update_user_google_id(db: Session, user_id: int, google_id: str) -> db_model
         db_user.google_id = google_id
         db.commit()
         db.refresh(db_user)
+        user_cache.invalidate(db_user.email)
     return db_user
 
 def update_user_name(db: Session, user_id: int, first_name: str, last_name: str) -> db_models.User:
@@ -56,4 +60,90 @@ def update_user_name(db: Session, user_id: int, first_name: str, last_name: str)
         db_user.last_name = last_name
         db.commit()
         db.refresh(db_user)
+        user_cache.invalidate(db_user.email)
+    return db_user
+
+def deactivate_user(db: Session, user_id: int) -> db_models.User:
+    """
+    Deactivates a user, which rejects their tokens from then on.
+    """
+    db_user = db.query(db_models.User).filter(db_models.User.id == user_id).first()
+    if db_user:
+        db_user.is_active = False
+        db.commit()
+        db.refresh(db_user)
+        user_cache.invalidate(db_user.email)
+    return db_user
+
+
+# Async variants, used by async routes so queries don't block the event loop.
+
+async def get_user_by_email_async(db: AsyncSession, email: str) -> db_models.User:
+    """
+    Fetches a user by their email address.
+    """
+    result = await db.execute(select(db_models.User).where(db_models.User.email == email))
+    return result.scalars().first()
+
+async def get_user_by_google_id_async(db: AsyncSession, google_id: str) -> db_models.User:
+    """
+    Fetches a user by their Google ID.
+    """
+    result = await db.execute(select(db_models.User).where(db_models.User.google_id == google_id))
+    return result.scalars().first()
+
+async def create_user_async(db: AsyncSession, user: api_models.UserCreate, hashed_password: str) -> db_models.User:
+    """
+    Creates a new user in the database with email, first name, last name, and an already hashed password.
+    """
+    db_user = db_models.User(email=user.email, first_name=user.first_name, last_name=user.last_name, hashed_password=hashed_password)
+    db.add(db_user)
+    await db.commit()
+    await db.refresh(db_user)
+    return db_user
+
+async def create_user_google_async(db: AsyncSession, user: api_models.UserCreateGoogle) -> db_models.User:
+    """
+    Creates a new user in the database with Google ID, first name, and last name.
+    """
+    db_user = db_models.User(email=user.email, google_id=user.google_id, first_name=user.first_name, last_name=user.last_name)
+    db.add(db_user)
+    await db.commit()
+    await db.refresh(db_user)
+    return db_user
+
+async def update_user_google_id_async(db: AsyncSession, user_id: int, google_id: str) -> db_models.User:
+    """
+    Updates an existing user's Google ID.
+    """
+    db_user = await db.get(db_models.User, user_id)
+    if db_user:
+        db_user.google_id = google_id
+        await db.commit()
+        await db.refresh(db_user)
+        await user_cache.invalidate_async(db_user.email)
+    return db_user
+
+async def update_user_name_async(db: AsyncSession, user_id: int, first_name: str, last_name: str) -> db_models.User:
+    """
+    Updates an existing user's first and last name.
+    """
+    db_user = await db.get(db_models.User, user_id)
+    if db_user:
+        db_user.first_name = first_name
+        db_user.last_name = last_name
+        await db.commit()
+        await db.refresh(db_user)
+        await user_cache.invalidate_async(db_user.email)
+    return db_user
+
+async def update_user_password_hash_async(db: AsyncSession, user_id: int, hashed_password: str) -> db_models.User:
+    """
+    Replaces a user's password hash, e.g. with one using the current bcrypt cost.
+    """
+    db_user = await db.get(db_models.User, user_id)
+    if db_user:
+        db_user.hashed_password = hashed_password
+        await db.commit()
+        await db.refresh(db_user)
     return db_user
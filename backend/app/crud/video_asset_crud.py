@@ -0,0 +1,91 @@
+from datetime import datetime
+from sqlalchemy import delete, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models import db_models
+
+async def get_video_asset(db: AsyncSession, content_hash: str) -> db_models.VideoAsset:
+    """
+    Fetches a stored video by the SHA-256 hash of its content.
+    """
+    result = await db.execute(select(db_models.VideoAsset).where(db_models.VideoAsset.content_hash == content_hash))
+    return result.scalars().first()
+
+async def create_video_asset(db: AsyncSession, content_hash: str, s3_key: str, display_video_url: str, size_bytes: int, content_type: str = None, gemini_file_id: str = None, gemini_expires_at: datetime = None) -> db_models.VideoAsset:
+    """
+    Records a newly uploaded video holding one reference. If a concurrent upload of the same
+    content registered it first, takes a reference on that record instead.
+    """
+    db_asset = db_models.VideoAsset(
+        content_hash=content_hash,
+        s3_key=s3_key,
+        display_video_url=display_video_url,
+        size_bytes=size_bytes,
+        content_type=content_type,
+        gemini_file_id=gemini_file_id,
+        gemini_expires_at=gemini_expires_at,
+        ref_count=1
+    )
+    db.add(db_asset)
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        existing = await acquire_video_asset(db, content_hash)
+        if existing is None:
+            raise
+        return existing
+    await db.refresh(db_asset)
+    return db_asset
+
+async def acquire_video_asset(db: AsyncSession, content_hash: str, gemini_file_id: str = None, gemini_expires_at: datetime = None) -> db_models.VideoAsset:
+    """
+    Atomically takes one more reference on a stored video, optionally replacing its Gemini file.
+    Returns None if the asset no longer exists.
+    """
+    values = {
+        "ref_count": db_models.VideoAsset.ref_count + 1,
+        "last_used_at": datetime.utcnow(),
+    }
+    if gemini_file_id:
+        values["gemini_file_id"] = gemini_file_id
+        values["gemini_expires_at"] = gemini_expires_at
+    result = await db.execute(
+        update(db_models.VideoAsset)
+        .where(db_models.VideoAsset.content_hash == content_hash)
+        .values(**values)
+        .returning(db_models.VideoAsset)
+        .execution_options(populate_existing=True)
+    )
+    db_asset = result.scalars().first()
+    await db.commit()
+    return db_asset
+
+async def set_gemini_file(db: AsyncSession, content_hash: str, gemini_file_id: str, gemini_expires_at: datetime):
+    """
+    Records a stored video's new Gemini file, without taking a reference.
+    """
+    await db.execute(
+        update(db_models.VideoAsset)
+        .where(db_models.VideoAsset.content_hash == content_hash)
+        .values(gemini_file_id=gemini_file_id, gemini_expires_at=gemini_expires_at, last_used_at=datetime.utcnow())
+    )
+    await db.commit()
+
+async def release_video_asset(db: AsyncSession, content_hash: str) -> bool:
+    """
+    Atomically drops one reference on a stored video. Returns True if it was the last one and the
+    record was deleted, in which case the caller owns cleanup of the S3 object and Gemini file.
+    """
+    await db.execute(
+        update(db_models.VideoAsset)
+        .where(db_models.VideoAsset.content_hash == content_hash)
+        .values(ref_count=db_models.VideoAsset.ref_count - 1)
+    )
+    # Only delete if nobody took a new reference in between.
+    result = await db.execute(
+        delete(db_models.VideoAsset)
+        .where(db_models.VideoAsset.content_hash == content_hash, db_models.VideoAsset.ref_count <= 0)
+    )
+    await db.commit()
+    return result.rowcount == 1
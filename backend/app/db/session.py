@@ -1,16 +1,48 @@
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from app.core.config import settings
 
-# Create the SQLAlchemy engine for PostgreSQL
+def _pool_options() -> dict:
+    return {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+
+def async_database_url() -> str:
+    """Derives the asyncpg URL from DATABASE_URL unless ASYNC_DATABASE_URL is set."""
+    if settings.ASYNC_DATABASE_URL:
+        return settings.ASYNC_DATABASE_URL
+    url = settings.DATABASE_URL
+    for prefix in ("postgresql+psycopg2://", "postgresql://", "postgres://"):
+        if url.startswith(prefix):
+            return "postgresql+asyncpg://" + url[len(prefix):]
+    return url
+
+# Create the SQLAlchemy engine for PostgreSQL (used by sync routes and Alembic)
 engine = create_engine(
-    settings.DATABASE_URL
+    settings.DATABASE_URL,
+    connect_args={"options": f"-c statement_timeout={settings.DB_STATEMENT_TIMEOUT_MS}"},
+    **_pool_options()
+)
+
+# Async engine for async routes and background workers, so queries never block the event loop
+async_engine = create_async_engine(
+    async_database_url(),
+    connect_args={"server_settings": {"statement_timeout": str(settings.DB_STATEMENT_TIMEOUT_MS)}},
+    **_pool_options()
 )
 
 # Create a configured "Session" class
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async sessions keep attributes loaded after commit; lazy loads would need I/O outside an await.
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
 # Create a Base class for our models to inherit from
 Base = declarative_base()
 
@@ -21,3 +53,8 @@ def get_db():
         yield db
     finally:
         db.close()
+
+# Dependency to get an async DB session for async API routes
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -1,10 +1,47 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, generate_latest
+
+from .agents.planner.result_cache import result_cache
+from .core.admission import adk_admission, gemini_upload_admission
+from .core.logs import configure_logging, shutdown_logging
+from .core.metrics import CircuitBreakerCollector, MetricsMiddleware, PoolCollector
+from .core.tracing import TracingMiddleware, configure_tracing, instrument_engine, shutdown_tracing
+from .core.redis_client import async_redis
+from .core.resilience import circuit_breakers
+from .db.session import async_engine, engine
+from .security.google_id_token import google_id_token_verifier
+from .security.hashing import password_hasher
+from .services.adk_service import adk_service
+from .services.job_queue import job_queue
+from .services.message_writer import message_writer
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Opens shared clients and starts the background job workers and message writer on startup; tears them down on shutdown."""
+    await adk_service.open()
+    await password_hasher.start()
+    await google_id_token_verifier.start()
+    await job_queue.start()
+    await message_writer.start()
+    yield
+    await job_queue.stop()
+    await message_writer.stop()
+    await adk_service.close()
+    password_hasher.close()
+    await google_id_token_verifier.close()
+    await async_redis.aclose()
+    await result_cache.client.aclose()
+    await async_engine.dispose()
+    shutdown_tracing()
+    shutdown_logging()
 
 app = FastAPI(
     title="SceneSpeak API",
     description="Backend services for the SceneSpeak application.",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 # Configure CORS
@@ -22,13 +59,48 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
+# Added last so they are outermost and cover everything, CORS preflights included.
+app.add_middleware(TracingMiddleware)
+app.add_middleware(MetricsMiddleware)
+
+configure_logging()
+configure_tracing()
+instrument_engine(engine, "sync")
+instrument_engine(async_engine.sync_engine, "async")
+
+REGISTRY.register(PoolCollector(
+    db_pools={"sync": engine.pool, "async": async_engine.pool},
+    http_pools={"adk": adk_service.pool_snapshot},
+))
+REGISTRY.register(CircuitBreakerCollector())
 
 @app.get("/", tags=["Health Check"])
 def read_root():
     """A simple health check endpoint."""
     return {"status": "ok", "message": "Welcome to the Scene Speak API!"}
 
+@app.get("/metrics", tags=["Health Check"], include_in_schema=False)
+def metrics():
+    """Prometheus metrics of this process."""
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+@app.get("/health/planner-cache", tags=["Health Check"])
+async def planner_cache_health():
+    """Reports hit counts and hit rate of the planner tools' result cache across all processes."""
+    return {"status": "ok", "cache": await result_cache.snapshot()}
+
+@app.get("/health/admission", tags=["Health Check"])
+async def admission_health():
+    """Reports slots in use and waiters across all workers, and this process's rejections, per admission-controlled upstream."""
+    return {"status": "ok", "adk": await adk_admission.snapshot(), "gemini_upload": await gemini_upload_admission.snapshot()}
+
+@app.get("/health/circuit-breakers", tags=["Health Check"])
+def circuit_breakers_health():
+    """Reports the state, failure streak, openings and fast-failed calls of each dependency's circuit breaker in this process."""
+    return {"status": "ok", "breakers": {name: breaker.snapshot() for name, breaker in circuit_breakers.items()}}
+
 # In the future, we will include our API routers here
 from .api import auth, chat
 
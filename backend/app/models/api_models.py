@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr
-from typing import Optional, List
+from typing import Optional, List, Dict
 import uuid
 from datetime import datetime
 import enum
@@ -91,6 +91,19 @@ class GoogleIdTokenRequest(BaseModel):
 #                  Job Models
 # ============================================
 
+class JobSummary(BaseModel):
+    """The columns of a job shown in the conversation list."""
+    id: uuid.UUID
+    title: str
+    status: JobStatus
+    job_type: JobType
+    source_url: Optional[str] = None
+    display_video_url: Optional[str] = None
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
 class Job(BaseModel):
     id: uuid.UUID
     user_id: int
@@ -102,6 +115,10 @@ class Job(BaseModel):
     gemini_file_id: Optional[str] = None
     source_url: Optional[str] = None
     display_video_url: Optional[str] = None
+    ingestion_timings: Optional[Dict[str, float]] = None
+    error_message: Optional[str] = None
+    trace_id: Optional[str] = None
+    trace_url: Optional[str] = None
     created_at: datetime
     updated_at: datetime
 
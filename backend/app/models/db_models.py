@@ -1,11 +1,14 @@
 import uuid
 from sqlalchemy import (
+    BigInteger,
     Column,
     Integer,
     String,
     Boolean,
     DateTime,
     ForeignKey,
+    Index,
+    JSON,
     Enum as SQLAlchemyEnum,
 )
 from sqlalchemy.orm import relationship
@@ -64,10 +67,20 @@ class Job(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     error_message = Column(String, nullable=True)
+    ingestion_timings = Column(JSON, nullable=True) # Seconds spent per ingestion stage/sink
+    video_asset_hash = Column(String(64), ForeignKey("video_assets.content_hash"), nullable=True)
+    trace_id = Column(String(32), nullable=True) # Trace of the request or worker run that last changed the job
 
     owner = relationship("User", back_populates="jobs")
+    video_asset = relationship("VideoAsset", back_populates="jobs")
     messages = relationship("ChatMessage", back_populates="job", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        # Serves the per-user conversation list, newest first, including keyset page boundaries. Composite, not
+        # covering: the listed columns are read from the table for the page's rows.
+        Index("ix_jobs_user_id_created_at_id", user_id, created_at.desc(), id.desc()),
+    )
+
 
 class ChatMessage(Base):
     __tablename__ = "chat_messages"
@@ -82,3 +95,45 @@ class ChatMessage(Base):
 
     job = relationship("Job", back_populates="messages")
 
+    __table_args__ = (
+        Index("ix_chat_messages_job_id_created_at_id", job_id, created_at, id),
+    )
+
+
+class VideoAsset(Base):
+    __tablename__ = "video_assets"
+
+    content_hash = Column(String(64), primary_key=True) # SHA-256 of the uploaded bytes
+
+    s3_key = Column(String, nullable=False)
+    display_video_url = Column(String, nullable=False)
+    gemini_file_id = Column(String, nullable=True)
+    gemini_expires_at = Column(DateTime, nullable=True)
+    content_type = Column(String, nullable=True)
+    size_bytes = Column(BigInteger, nullable=False)
+
+    ref_count = Column(Integer, nullable=False, default=0) # Number of jobs using this asset
+
+    created_at = Column(DateTime, default=datetime.utcnow)
+    last_used_at = Column(DateTime, default=datetime.utcnow)
+
+    jobs = relationship("Job", back_populates="video_asset")
+
+    __table_args__ = (
+        # Lets the planner find the scene index of the Gemini file it was given.
+        Index("ix_video_assets_gemini_file_id", gemini_file_id),
+    )
+
+
+class VideoSceneIndex(Base):
+    __tablename__ = "video_scene_indexes"
+
+    video_key = Column(String, primary_key=True) # "asset:<content hash>" or "youtube:<video id>"
+    video_asset_hash = Column(String(64), ForeignKey("video_assets.content_hash", ondelete="CASCADE"), nullable=True, index=True)
+
+    model = Column(String, nullable=False)
+    # [{"start_seconds", "end_seconds", "description", "on_screen_text", "transcript"}, ...] in order
+    segments = Column(JSON, nullable=False)
+
+    created_at = Column(DateTime, default=datetime.utcnow)
+
@@ -0,0 +1,117 @@
+import asyncio
+import logging
+import re
+import time
+from typing import Dict, Mapping, Optional, Any
+import httpx
+from google.auth import jwt
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+GOOGLE_ISSUERS = ("accounts.google.com", "https://accounts.google.com")
+MAX_AGE_PATTERN = re.compile(r"max-age=(\d+)")
+
+class GoogleIdTokenVerifier:
+    """
+    Verifies Google ID tokens against a locally cached copy of Google's signing certificates.
+
+    The certificates are kept for as long as their Cache-Control max-age allows and refreshed in the background
+    `refresh_margin` seconds before they expire, so verifying a token is a local signature check. A token signed
+    with a key that is not cached yet (Google rotated its keys early) triggers one refresh, at most every
+    `min_refresh_interval` seconds.
+    """
+    def __init__(self, certs_url: str, client_id: str, refresh_margin: float, min_refresh_interval: float, clock_skew: int):
+        self.certs_url = certs_url
+        self.client_id = client_id
+        self.refresh_margin = refresh_margin
+        self.min_refresh_interval = min_refresh_interval
+        self.clock_skew = clock_skew
+        self.certs: Dict[str, str] = {}
+        self.expires_at = 0.0
+        self.fetched_at = 0.0
+        self._client: Optional[httpx.AsyncClient] = None
+        self._refresh_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def _require_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=10.0)
+        return self._client
+
+    async def start(self):
+        """Loads the certificates and starts refreshing them in the background. Called from the app lifespan."""
+        try:
+            await self.refresh()
+        except Exception as e:
+            # Not fatal: the refresher keeps retrying, and a login before then fetches them itself.
+            logger.warning("Failed to load Google signing certificates at startup: %s", e)
+        self._task = asyncio.create_task(self._refresh_periodically())
+
+    async def close(self):
+        """Stops the background refresh and closes the HTTP client."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def refresh(self, if_older_than: float = 0.0):
+        """
+        Fetches the current certificates and records when they expire, unless the cached ones were fetched less than
+        `if_older_than` seconds ago, e.g. by a concurrent caller.
+        """
+        async with self._refresh_lock:
+            if self.certs and time.monotonic() - self.fetched_at < if_older_than:
+                return
+            response = await self._require_client().get(self.certs_url)
+            response.raise_for_status()
+            match = MAX_AGE_PATTERN.search(response.headers.get("cache-control", ""))
+            max_age = int(match.group(1)) if match else 0
+            now = time.monotonic()
+            self.certs = response.json()
+            self.fetched_at = now
+            self.expires_at = now + max_age
+
+    async def _refresh_periodically(self):
+        while True:
+            delay = max(self.expires_at - self.refresh_margin - time.monotonic(), self.min_refresh_interval)
+            await asyncio.sleep(delay)
+            try:
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Keep using the certificates we have; they may well still be valid.
+                logger.warning("Failed to refresh Google signing certificates: %s", e)
+
+    def _decode(self, token: str) -> Mapping[str, Any]:
+        return jwt.decode(token, certs=self.certs, audience=self.client_id, clock_skew_in_seconds=self.clock_skew)
+
+    async def verify(self, token: str) -> Mapping[str, Any]:
+        """
+        Verifies a Google ID token's signature, audience, expiry and issuer and returns its claims.
+        Raises ValueError if the token is not valid.
+        """
+        if not self.certs:
+            await self.refresh(if_older_than=self.min_refresh_interval)
+        try:
+            claims = self._decode(token)
+        except ValueError:
+            if jwt.decode_header(token).get("kid") in self.certs:
+                raise
+            await self.refresh(if_older_than=self.min_refresh_interval)
+            claims = self._decode(token)
+        if claims.get("iss") not in GOOGLE_ISSUERS:
+            raise ValueError(f"Wrong issuer: {claims.get('iss')}")
+        return claims
+
+google_id_token_verifier = GoogleIdTokenVerifier(
+    settings.GOOGLE_CERTS_URL,
+    settings.GOOGLE_CLIENT_ID,
+    refresh_margin=settings.GOOGLE_CERTS_REFRESH_MARGIN_SECONDS,
+    min_refresh_interval=settings.GOOGLE_CERTS_MIN_REFRESH_INTERVAL_SECONDS,
+    clock_skew=settings.GOOGLE_ID_TOKEN_CLOCK_SKEW_SECONDS,
+)
@@ -0,0 +1,87 @@
+import asyncio
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Tuple
+from app.core.config import settings
+from app.core.metrics import PASSWORD_HASH_IN_FLIGHT, PASSWORD_HASH_REJECTED, observe_stage
+from app.security.core import pwd_context
+
+class PasswordHasherBusy(Exception):
+    """Raised when the password hashing pool already has as much work queued as it accepts."""
+
+
+# Run in the worker processes; each returns its result along with how long the bcrypt work took.
+
+def _ready() -> Tuple[None, float]:
+    return None, 0.0
+
+def _hash(password: str) -> Tuple[str, float]:
+    started = time.perf_counter()
+    return pwd_context.hash(password), time.perf_counter() - started
+
+def _verify_and_update(password: str, hashed_password: str) -> Tuple[Tuple[bool, Optional[str]], float]:
+    started = time.perf_counter()
+    return pwd_context.verify_and_update(password, hashed_password), time.perf_counter() - started
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt in a dedicated process pool, so login bursts neither block the event loop nor starve the threadpool
+    that serves sync routes.
+
+    At most `workers + queue_depth` operations are accepted at once; beyond that, calls fail fast with
+    PasswordHasherBusy instead of queueing without bound.
+    """
+    def __init__(self, workers: int, queue_depth: int):
+        self.workers = workers
+        self.max_in_flight = workers + queue_depth
+        self.in_flight = 0
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def _require_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # Workers are spawned rather than forked from a process running an event loop and threads.
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._executor
+
+    async def start(self):
+        """Spawns the worker processes up front, so the first logins don't wait for them. Called from the app lifespan."""
+        executor = self._require_executor()
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(executor, _ready) for _ in range(self.workers)))
+
+    async def _run(self, fn, *args):
+        if self.in_flight >= self.max_in_flight:
+            PASSWORD_HASH_REJECTED.inc()
+            raise PasswordHasherBusy()
+        self.in_flight += 1
+        PASSWORD_HASH_IN_FLIGHT.inc()
+        try:
+            started = time.perf_counter()
+            result, seconds = await asyncio.get_running_loop().run_in_executor(self._require_executor(), fn, *args)
+            observe_stage("password_hash", seconds)
+            observe_stage("password_hash_queue_wait", max(time.perf_counter() - started - seconds, 0.0))
+            return result
+        finally:
+            self.in_flight -= 1
+            PASSWORD_HASH_IN_FLIGHT.dec()
+
+    async def hash(self, password: str) -> str:
+        """Hashes a plain password with the configured bcrypt cost."""
+        return await self._run(_hash, password)
+
+    async def verify_and_update(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """
+        Verifies a plain password against a hashed one. If it matches but the hash uses another bcrypt cost than
+        configured, also returns a new hash to store in its place, otherwise None.
+        """
+        return await self._run(_verify_and_update, password, hashed_password)
+
+    def close(self):
+        """Shuts the worker processes down. Called from the app lifespan."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+password_hasher = PasswordHasher(settings.PASSWORD_HASH_WORKERS, settings.PASSWORD_HASH_QUEUE_DEPTH)
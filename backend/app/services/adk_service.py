@@ -0,0 +1,315 @@
+import asyncio
+import httpx
+import json
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.core.logs import log_fields
+from app.core.metrics import HTTP_POOL_WAIT, time_stage
+from app.core.resilience import CircuitBreaker, RetryPolicy, retry_async
+from app.core.tracing import inject_trace_context
+from app.crud import job_crud
+from app.db.session import AsyncSessionLocal
+from app.models import db_models
+from app.services.history_service import history_service
+
+logger = logging.getLogger(__name__)
+
+# Requests that failed before reaching ADK, so retrying them cannot run anything twice.
+NOT_SENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+def _is_adk_failure(e: BaseException) -> bool:
+    if isinstance(e, httpx.HTTPStatusError):
+        return e.response.status_code >= 500
+    return isinstance(e, httpx.TransportError)
+
+def _is_not_sent(e: BaseException) -> bool:
+    return isinstance(e, NOT_SENT_ERRORS)
+
+def _is_existing_session(response: httpx.Response) -> bool:
+    # ADK refuses to create a session id twice with 400 "Session already exists: <id>".
+    return response.status_code == 400 and "already exists" in response.text
+
+def _is_transient(e: BaseException) -> bool:
+    return _is_not_sent(e) or (isinstance(e, httpx.HTTPStatusError) and e.response.status_code in (502, 503, 504))
+
+
+class StreamedTurn:
+    """
+    A conversation turn streamed from ADK by a task of its own, so that once started it runs to the end of ADK's
+    stream, and is stored, even if the client stops listening. Iterating it starts the turn and relays its
+    (event, payload) pairs, then raises its error, if any. `wait` returns once a started turn is over.
+    """
+    def __init__(self, run: Callable[[asyncio.Queue], Awaitable[None]]):
+        self._run = run
+        self._events: asyncio.Queue = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+        self._error_delivered = False
+
+    async def _relay(self):
+        try:
+            await self._run(self._events)
+        finally:
+            self._events.put_nowait(None)
+
+    async def __aiter__(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._relay())
+        while (event := await self._events.get()) is not None:
+            yield event
+        self._error_delivered = True
+        await self._task
+
+    async def wait(self):
+        """Waits for the turn to end, if it was started, logging an error nobody iterating it was told about."""
+        if self._task is None:
+            return
+        error = (await asyncio.gather(self._task, return_exceptions=True))[0]
+        if isinstance(error, Exception) and not self._error_delivered:
+            logger.warning("Streamed turn failed after its client went away: %s", error)
+
+
+class AdkService:
+    def __init__(self, base_url: str, app_name: str):
+        self.base_url = base_url
+        self.app_name = app_name
+        self.client: Optional[httpx.AsyncClient] = None
+        self.breaker = CircuitBreaker(
+            "adk", settings.ADK_BREAKER_FAILURES, settings.ADK_BREAKER_RESET_SECONDS, is_failure=_is_adk_failure
+        )
+        # Runs append to the session, so only requests ADK never received are retried.
+        self.run_retry = RetryPolicy(settings.ADK_RETRY_ATTEMPTS, 0.2, 2.0, retry_on=_is_not_sent)
+        # Gateway errors on session creation mean it did not happen either.
+        self.session_retry = RetryPolicy(settings.ADK_RETRY_ATTEMPTS, 0.2, 2.0, retry_on=_is_transient)
+
+    async def open(self):
+        """Creates the shared, keep-alive HTTP client. Called once from the app lifespan."""
+        self.client = httpx.AsyncClient(
+            base_url=self.base_url,
+            headers={"Content-Type": "application/json"},
+            limits=httpx.Limits(
+                max_connections=settings.ADK_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.ADK_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=settings.ADK_KEEPALIVE_EXPIRY,
+            ),
+            http2=settings.ADK_HTTP2,
+        )
+
+    async def close(self):
+        """Closes the shared HTTP client and its pooled connections."""
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    def pool_snapshot(self) -> dict:
+        """Connection counts of the shared client's pool."""
+        # httpx exposes no pool statistics; its transport's httpcore pool does.
+        pool = getattr(getattr(self.client, "_transport", None), "_pool", None)
+        connections = list(pool.connections) if pool is not None else []
+        return {
+            "connections": len(connections),
+            "idle": sum(1 for connection in connections if connection.is_idle()),
+            "max_connections": settings.ADK_MAX_CONNECTIONS,
+        }
+
+    def _timeout(self, total: float) -> httpx.Timeout:
+        return httpx.Timeout(total, connect=settings.ADK_CONNECT_TIMEOUT, pool=settings.ADK_POOL_TIMEOUT)
+
+    def _require_client(self) -> httpx.AsyncClient:
+        if self.client is None:
+            raise RuntimeError("ADK client is not open; AdkService.open() must run at startup.")
+        return self.client
+
+    def _checkout_trace(self):
+        started = time.perf_counter()
+        checked_out = False
+
+        async def trace(event_name: str, info: dict):
+            # The first transport event fires once a pooled (or new) connection has been handed out.
+            nonlocal checked_out
+            if not checked_out:
+                checked_out = True
+                HTTP_POOL_WAIT.labels("adk").observe(time.perf_counter() - started)
+
+        return trace
+
+    def _raise_for_server_error(self, response: httpx.Response):
+        # Raised inside the breaker so ADK's 5xx answers count against it; callers handle 4xx themselves.
+        if response.status_code >= 500:
+            response.raise_for_status()
+
+    async def _post(self, path: str, payload: dict, timeout: float, retry: RetryPolicy) -> httpx.Response:
+        async def post() -> httpx.Response:
+            response = await self._require_client().post(
+                path,
+                content=json.dumps(payload),
+                # ADK joins the caller's trace when it is traced itself.
+                headers=inject_trace_context(),
+                timeout=self._timeout(timeout),
+                extensions={"trace": self._checkout_trace()},
+            )
+            self._raise_for_server_error(response)
+            return response
+
+        return await retry_async(post, retry, self.breaker)
+
+    @asynccontextmanager
+    async def _stream(self, path: str, payload: dict, timeout: float) -> AsyncIterator[httpx.Response]:
+        client = self._require_client()
+
+        async def open_stream() -> httpx.Response:
+            request = client.build_request(
+                "POST",
+                path,
+                content=json.dumps(payload),
+                headers=inject_trace_context(),
+                timeout=self._timeout(timeout),
+                extensions={"trace": self._checkout_trace()},
+            )
+            response = await client.send(request, stream=True)
+            if response.status_code >= 500:
+                await response.aread()
+                await response.aclose()
+                response.raise_for_status()
+            return response
+
+        response = await retry_async(open_stream, self.run_retry, self.breaker)
+        try:
+            yield response
+        finally:
+            await response.aclose()
+
+    async def create_session(self, session_id: str, user_id: str) -> bool:
+        """
+        Creates a session on the external ADK service, or accepts the one an earlier attempt created.
+        Returns True on success, False on failure.
+        """
+        adk_session_path = f"/apps/{self.app_name}/users/{user_id}/sessions/{session_id}"
+        try:
+            with time_stage("adk_session_create"):
+                response = await self._post(adk_session_path, {}, settings.ADK_SESSION_TIMEOUT, self.session_retry)
+            if _is_existing_session(response):
+                # A redelivered job, or a retry after a gateway error ADK answered after creating the session.
+                logger.info("ADK session %s already exists for user %s", session_id, user_id)
+                return True
+            response.raise_for_status()
+            logger.info("Created ADK session %s for user %s", session_id, user_id)
+            return True
+        except httpx.HTTPStatusError as e:
+            logger.error("Failed to create ADK session %s: HTTP %d: %s", session_id, e.response.status_code, e.response.text)
+            return False
+        except httpx.RequestError as e:
+            logger.error("Failed to create ADK session %s due to a network error: %s", session_id, e)
+            return False
+
+    def build_run_request(self, job: db_models.Job, user_id: str, message: str) -> dict:
+        """Builds the ADK /run payload, attaching the job's video reference to the user's message."""
+        return {
+            "app_name": self.app_name,
+            "user_id": user_id,
+            "session_id": str(job.id),
+            "new_message": {
+                "role": "user",
+                "parts": [
+                    {"text": message + (f"\n\nGemini File ID: {job.gemini_file_id}" if job.gemini_file_id else "") + (f"\n\nYouTube URL: {job.source_url}" if job.source_url else "")}
+                ]
+            }
+        }
+
+    async def run(self, job: db_models.Job, user_id: str, message: str) -> str:
+        """
+        Sends a message to the ADK /run endpoint and returns the last model text in the response.
+        """
+        request_data = self.build_run_request(job, user_id, message)
+        logger.debug("Sending ADK /run request: %s", request_data, extra=log_fields(settings.LOG_PAYLOAD_SAMPLE_RATE, session_id=str(job.id)))
+        with time_stage("adk_run"):
+            response = await self._post("/run", request_data, settings.ADK_RUN_TIMEOUT, self.run_retry)
+        response.raise_for_status()
+        adk_result = response.json()
+        logger.debug("Received ADK /run response: %s", adk_result, extra=log_fields(settings.LOG_PAYLOAD_SAMPLE_RATE, session_id=str(job.id)))
+
+        assistant_message = ""  # Initialize to an empty string
+        for event in adk_result:
+            if event.get("content", {}).get("role") == "model" and "text" in event.get("content", {}).get("parts", [{}])[0]:
+                assistant_message = event["content"]["parts"][0]["text"]
+        logger.info("ADK run for session %s returned %d events, %d reply chars", job.id, len(adk_result), len(assistant_message))
+        return assistant_message
+
+    async def run_chat_turn(self, db: AsyncSession, job: db_models.Job, user_id: int, message: str) -> str:
+        """
+        Runs one conversation turn: calls ADK, stores both sides of the exchange and marks the job ACTIVE.
+        Errors from ADK are propagated to the caller, which decides how to report them.
+        """
+        session_id = str(job.id)
+        assistant_message = await self.run(job, str(user_id), message)
+
+        with time_stage("history_write"):
+            await history_service.add_messages_to_history(session_id, [("USER", message), ("ASSISTANT", assistant_message)])
+        await job_crud.transition_job_async(db, job_id=job.id, user_id=user_id, status=db_models.JobStatus.ACTIVE)
+        return assistant_message
+
+    async def stream_run(self, job: db_models.Job, user_id: str, message: str) -> AsyncIterator[dict]:
+        """
+        Sends a message to the ADK /run_sse endpoint with token streaming enabled and yields its events as they arrive.
+        """
+        request_data = self.build_run_request(job, user_id, message)
+        request_data["streaming"] = True
+        with time_stage("adk_stream_run"):
+            async with self._stream("/run_sse", request_data, settings.ADK_RUN_TIMEOUT) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if line.startswith("data:"):
+                        yield json.loads(line[len("data:"):])
+
+    def stream_chat_turn(self, job: db_models.Job, user_id: int, message: str) -> StreamedTurn:
+        """
+        Streaming counterpart of run_chat_turn. The turn yields (event, payload) pairs for the client while ADK runs:
+        "delta" for model text, "tool_call"/"tool_result" for tool progress, then "done" with the final answer
+        once both sides of the exchange are stored and the job is marked ACTIVE. ADK records the turn whether or
+        not the client stays, so it is stored either way.
+        """
+        session_id = str(job.id)
+
+        async def run(events: asyncio.Queue):
+            final_text = None
+            partial_text = ""
+
+            async for event in self.stream_run(job, str(user_id), message):
+                if "error" in event:
+                    raise RuntimeError(event["error"])
+                content = event.get("content") or {}
+                for part in content.get("parts", []):
+                    function_call = part.get("functionCall") or part.get("function_call")
+                    function_response = part.get("functionResponse") or part.get("function_response")
+                    if function_call:
+                        # A new model response follows the tool, so start collecting its text afresh.
+                        partial_text = ""
+                        events.put_nowait(("tool_call", {"name": function_call.get("name")}))
+                    elif function_response:
+                        events.put_nowait(("tool_result", {"name": function_response.get("name")}))
+                    elif "text" in part and content.get("role") == "model":
+                        if event.get("partial"):
+                            partial_text += part["text"]
+                            events.put_nowait(("delta", {"text": part["text"]}))
+                        else:
+                            # The closing aggregate repeats text already streamed as partials.
+                            if not partial_text:
+                                events.put_nowait(("delta", {"text": part["text"]}))
+                            final_text = part["text"]
+                            partial_text = ""
+
+            assistant_message = final_text if final_text is not None else partial_text
+
+            with time_stage("history_write"):
+                await history_service.add_messages_to_history(session_id, [("USER", message), ("ASSISTANT", assistant_message)])
+            async with AsyncSessionLocal() as db:
+                await job_crud.transition_job_async(db, job_id=job.id, user_id=user_id, status=db_models.JobStatus.ACTIVE)
+
+            events.put_nowait(("done", {"response": assistant_message, "conversation_id": session_id, "display_video_url": job.display_video_url}))
+
+        return StreamedTurn(run)
+
+adk_service = AdkService(settings.ADK_API_URL, settings.APP_NAME)
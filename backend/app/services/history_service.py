@@ -1,40 +1,112 @@
 import json
-from typing import List, Dict
-from app.core.redis_client import redis_client
-from app.crud import job_crud
+from typing import List, Dict, Optional, Tuple
+from app.core.config import settings
+from app.core.metrics import CACHE_LOOKUPS
+from app.core.redis_client import redis_client, async_redis
+from app.crud import chat_message_crud
 from app.models import db_models
+from app.services.message_writer import STREAM_KEY
 from sqlalchemy.orm import Session
 import uuid
-from datetime import datetime
+from datetime import datetime, timedelta
 
 class HistoryService:
-    def __init__(self, client):
+    """
+    Records chat messages and serves conversation histories from a Redis read-through cache.
+
+    New messages are queued on a Redis Stream and written to PostgreSQL in batches by the message writer;
+    until then they are kept in a per-conversation pending hash, which reads merge with the stored rows.
+
+    A conversation's list is filled on the first read after a miss and kept up to date by appends while it
+    is cached. Lists expire after HISTORY_CACHE_TTL_SECONDS without use, and conversations longer than
+    HISTORY_CACHE_MAX_MESSAGES are not cached at all.
+    """
+    def __init__(self, client, async_client, ttl: int, max_messages: int):
         self.client = client
+        self.async_client = async_client
+        self.ttl = ttl
+        self.max_messages = max_messages
 
-    def add_message_to_history(self, db: Session, conversation_id: str, sender: str, message: str):
+    def _to_dict(self, message: db_models.ChatMessage) -> Dict:
+        return {
+            "id": str(message.id),
+            "job_id": str(message.job_id),
+            "sender": message.sender,
+            "content": message.content,
+            "created_at": message.created_at.isoformat()
+        }
+
+    async def add_messages_to_history(self, conversation_id: str, messages: List[Tuple[str, str]]):
         """
-        Appends a new message to the conversation history in Redis and persists it to the database.
+        Records (sender, content) messages in order with a single Redis transaction: queues them for the database
+        and appends them to the conversation's cached history.
         """
-        # Add to Redis
-        key = f"chat_history:{conversation_id}"
-        new_message_redis = {
-            "id": str(uuid.uuid4()),
-            "job_id": conversation_id,
-            "sender": sender,
-            "content": message,
-            "created_at": datetime.utcnow().isoformat()
-        }
-        self.client.rpush(key, json.dumps(new_message_redis))
-
-        # Persist to PostgreSQL
-        db_message = db_models.ChatMessage(
-            job_id=uuid.UUID(conversation_id),
-            sender=sender,
-            content=message,
-            created_at=datetime.utcnow()
-        )
-        db.add(db_message)
-        db.commit()
-        db.refresh(db_message)
-
-history_service = HistoryService(redis_client)
\ No newline at end of file
+        created_at = datetime.utcnow()
+        new_messages = [
+            {
+                "id": str(uuid.uuid4()),
+                "job_id": conversation_id,
+                "sender": sender,
+                "content": content,
+                # Keeps messages recorded together in order when sorted by time.
+                "created_at": (created_at + timedelta(microseconds=i)).isoformat()
+            }
+            for i, (sender, content) in enumerate(messages)
+        ]
+        values = [json.dumps(message) for message in new_messages]
+
+        key = self.client.history_key(conversation_id)
+        version_key = self.client.history_version_key(conversation_id)
+        pending_key = self.client.history_pending_key(conversation_id)
+        pipe = self.async_client.pipeline(transaction=True)
+        # Bumping the version aborts any rehydration that read the history before these messages were recorded.
+        pipe.incr(version_key)
+        pipe.expire(version_key, self.ttl)
+        for message, value in zip(new_messages, values):
+            pipe.hset(pending_key, message["id"], value)
+            pipe.xadd(STREAM_KEY, {"message": value})
+        pipe.rpushx(key, *values)
+        pipe.expire(key, self.ttl)
+        length = (await pipe.execute())[-2]
+        if length > self.max_messages:
+            await self.async_client.delete(key)
+
+    def get_history(self, db: Session, job_id: uuid.UUID) -> List[Dict]:
+        """
+        Returns a conversation's messages oldest first, from Redis when cached, otherwise from the database and the
+        messages not yet written to it, caching the result for the next read.
+        """
+        conversation_id = str(job_id)
+        cached = self.client.get_history(conversation_id)
+        CACHE_LOOKUPS.labels("history", "hit" if cached else "miss").inc()
+        if cached:
+            return [json.loads(value) for value in cached]
+
+        def load():
+            # Read the pending messages first: the writer removes them from there only after storing them.
+            pending = [json.loads(value) for value in self.client.get_pending_history(conversation_id)]
+            stored = [self._to_dict(message) for message in chat_message_crud.get_messages_by_job(db, job_id=job_id)]
+            messages = {message["id"]: message for message in stored + pending}
+            return [json.dumps(message) for message in sorted(messages.values(), key=lambda m: (m["created_at"], m["id"]))]
+
+        values = self.client.cache_history(conversation_id, load, self.ttl, self.max_messages)
+        return [json.loads(value) for value in values]
+
+    def get_messages_page(self, db: Session, job_id: uuid.UUID, limit: int, before: Optional[Tuple[datetime, uuid.UUID]] = None) -> Tuple[List[Dict], bool]:
+        """
+        Returns up to `limit` of a conversation's most recent messages before `before`, oldest first, and whether
+        there are older ones. Includes messages not yet written to the database.
+        """
+        conversation_id = str(job_id)
+        # Read the pending messages first: the writer removes them from there only after storing them.
+        pending = [json.loads(value) for value in self.client.get_pending_history(conversation_id)]
+        stored = [self._to_dict(message) for message in chat_message_crud.get_latest_messages_by_job(db, job_id=job_id, limit=limit + 1, before=before)]
+
+        def position(message: Dict) -> Tuple[datetime, uuid.UUID]:
+            return datetime.fromisoformat(message["created_at"]), uuid.UUID(message["id"])
+
+        messages = {message["id"]: message for message in stored + pending if before is None or position(message) < before}
+        newest = sorted(messages.values(), key=position, reverse=True)
+        return newest[:limit][::-1], len(newest) > limit
+
+history_service = HistoryService(redis_client, async_redis, settings.HISTORY_CACHE_TTL_SECONDS, settings.HISTORY_CACHE_MAX_MESSAGES)
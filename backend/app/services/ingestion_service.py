@@ -0,0 +1,182 @@
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import AsyncIterator, BinaryIO, Dict
+from fastapi import UploadFile
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.core.metrics import observe_timings
+from app.db.session import AsyncSessionLocal
+from app.crud import video_asset_crud
+from app.models import db_models
+from app.agents.planner.agent import delete_gemini_file, upload_stream_to_gemini
+from app.services.s3_service import s3_service
+
+logger = logging.getLogger(__name__)
+
+READ_CHUNK_SIZE = 1024 * 1024
+
+@dataclass
+class IngestedVideo:
+    content_hash: str
+    display_video_url: str
+    gemini_file_id: str
+    deduplicated: bool = False
+    timings: Dict[str, float] = field(default_factory=dict)
+
+
+async def _drain(queue: asyncio.Queue) -> AsyncIterator[bytes]:
+    while (chunk := await queue.get()) is not None:
+        yield chunk
+
+
+def _hash_file(fileobj: BinaryIO) -> str:
+    digest = hashlib.sha256()
+    fileobj.seek(0)
+    while chunk := fileobj.read(READ_CHUNK_SIZE):
+        digest.update(chunk)
+    fileobj.seek(0)
+    return digest.hexdigest()
+
+
+async def _read(file: UploadFile) -> AsyncIterator[bytes]:
+    await file.seek(0)
+    while chunk := await file.read(READ_CHUNK_SIZE):
+        yield chunk
+
+
+class IngestionService:
+    """
+    Stores uploaded videos once per distinct content in S3 (for display) and Gemini (for analysis).
+
+    Videos are keyed by the SHA-256 of their bytes in the video_assets table. The request streams a
+    new video straight into S3 and takes a reference on its asset; a repeat upload reuses the stored
+    object. A job worker then streams the object from S3 into Gemini, unless the asset's Gemini file
+    is still valid, reading up to `buffer_chunks` chunks ahead of the Gemini upload.
+    """
+    def __init__(self, buffer_chunks: int):
+        self.buffer_chunks = buffer_chunks
+
+    async def store_upload(self, file: UploadFile) -> IngestedVideo:
+        """
+        Makes the uploaded video available in S3, uploading it only if its content is not stored yet, and takes a
+        reference on its video asset. gemini_file_id is only set when the asset's Gemini file can be reused;
+        otherwise ensure_gemini_file provides one later. Records how long each stage took, in seconds.
+        """
+        timings: Dict[str, float] = {}
+        try:
+            return await self._store_upload(file, timings)
+        finally:
+            observe_timings(timings)
+
+    async def _store_upload(self, file: UploadFile, timings: Dict[str, float]) -> IngestedVideo:
+        started = time.perf_counter()
+        # The multipart parser has already spooled the body locally, so hashing it first is cheap
+        # next to the upload it can save. It runs off the event loop.
+        content_hash = await asyncio.to_thread(_hash_file, file.file)
+        timings["hash_seconds"] = time.perf_counter() - started
+
+        # Sessions are only held around the queries, never across an upload.
+        async with AsyncSessionLocal() as db:
+            asset = await video_asset_crud.acquire_video_asset(db, content_hash)
+        if asset:
+            gemini_file_id = asset.gemini_file_id if self._gemini_file_usable(asset) else None
+            return IngestedVideo(content_hash, asset.display_video_url, gemini_file_id, deduplicated=True, timings=timings)
+
+        size = file.size if file.size is not None else await self._measure(file)
+        s3_key = f"videos/{content_hash}{os.path.splitext(file.filename or '')[1].lower()}"
+        started = time.perf_counter()
+        display_video_url = await s3_service.upload_stream(_read(file), s3_key, file.content_type)
+        timings["s3_upload_seconds"] = time.perf_counter() - started
+        async with AsyncSessionLocal() as db:
+            asset = await video_asset_crud.create_video_asset(
+                db, content_hash=content_hash, s3_key=s3_key, display_video_url=display_video_url,
+                size_bytes=size, content_type=file.content_type
+            )
+        gemini_file_id = asset.gemini_file_id if self._gemini_file_usable(asset) else None
+        return IngestedVideo(content_hash, asset.display_video_url, gemini_file_id, timings=timings)
+
+    async def ensure_gemini_file(self, content_hash: str) -> IngestedVideo:
+        """
+        Returns a stored video with a usable Gemini file, streaming the video from S3 into Gemini unless its asset
+        already has one. Records how long the upload took, in seconds.
+        """
+        timings: Dict[str, float] = {}
+        try:
+            return await self._ensure_gemini_file(content_hash, timings)
+        finally:
+            observe_timings(timings)
+
+    async def _ensure_gemini_file(self, content_hash: str, timings: Dict[str, float]) -> IngestedVideo:
+        async with AsyncSessionLocal() as db:
+            asset = await video_asset_crud.get_video_asset(db, content_hash)
+        if asset is None:
+            raise ValueError(f"Video {content_hash} is no longer stored.")
+        if self._gemini_file_usable(asset):
+            return IngestedVideo(content_hash, asset.display_video_url, asset.gemini_file_id, deduplicated=True, timings=timings)
+
+        started = time.perf_counter()
+        gemini_file_id = await self._copy_to_gemini(asset)
+        timings["gemini_upload_seconds"] = time.perf_counter() - started
+        async with AsyncSessionLocal() as db:
+            await video_asset_crud.set_gemini_file(db, content_hash, gemini_file_id, self._gemini_expiry())
+        return IngestedVideo(content_hash, asset.display_video_url, gemini_file_id, timings=timings)
+
+    async def release(self, db: AsyncSession, content_hash: str):
+        """Drops a reference on a video asset, deleting the stored copies once nothing uses them."""
+        asset = await video_asset_crud.get_video_asset(db, content_hash)
+        if asset is None:
+            return
+        s3_key, gemini_file_id = asset.s3_key, asset.gemini_file_id
+        if await video_asset_crud.release_video_asset(db, content_hash):
+            await s3_service.delete_file(s3_key)
+            if gemini_file_id:
+                try:
+                    await delete_gemini_file(gemini_file_id)
+                except Exception as e:
+                    # Gemini expires files on its own; a failed delete only leaves it until then.
+                    logger.warning("Failed to delete Gemini file %s: %s", gemini_file_id, e)
+
+    def _gemini_file_usable(self, asset: db_models.VideoAsset) -> bool:
+        margin = timedelta(hours=settings.GEMINI_FILE_REUSE_MARGIN_HOURS)
+        return bool(asset.gemini_file_id and asset.gemini_expires_at and asset.gemini_expires_at - margin > datetime.utcnow())
+
+    def _gemini_expiry(self) -> datetime:
+        return datetime.utcnow() + timedelta(hours=settings.GEMINI_FILE_TTL_HOURS)
+
+    async def _copy_to_gemini(self, asset: db_models.VideoAsset) -> str:
+        """Streams a stored video from S3 into Gemini, downloading ahead of the upload through a bounded queue."""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.buffer_chunks)
+
+        async def download():
+            async for chunk in s3_service.download_stream(asset.s3_key, READ_CHUNK_SIZE):
+                await queue.put(chunk)
+            await queue.put(None)
+
+        tasks = [
+            asyncio.create_task(download()),
+            asyncio.create_task(upload_stream_to_gemini(
+                _drain(queue), asset.size_bytes, asset.content_type, os.path.basename(asset.s3_key)
+            )),
+        ]
+        try:
+            _, gemini_file_id = await asyncio.gather(*tasks)
+        except BaseException:
+            # The upload failing would otherwise leave the download blocked on a full queue.
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        return gemini_file_id
+
+    async def _measure(self, file: UploadFile) -> int:
+        # The multipart parser has already spooled the body locally, so seeking is cheap.
+        size = file.file.seek(0, 2)
+        await file.seek(0)
+        return size
+
+ingestion_service = IngestionService(settings.INGEST_BUFFER_CHUNKS)
@@ -0,0 +1,279 @@
+import asyncio
+import json
+import logging
+import os
+import socket
+import time
+import uuid
+from typing import List, Optional, Tuple
+from redis.exceptions import ResponseError
+from sqlalchemy import case, or_
+from app.core.admission import AdmissionRejected, adk_admission, gemini_upload_admission
+from app.core.resilience import CircuitOpenError
+from app.core.tracing import extract_trace_context, inject_trace_context, tracer
+from app.core.config import settings
+from app.core.metrics import observe_stage
+from app.core.redis_client import async_redis
+from app.crud import job_crud
+from app.db.session import AsyncSessionLocal
+from app.models import db_models
+from app.agents.planner.agent import open_video_context, wait_for_gemini_file
+from app.services.adk_service import adk_service
+from app.services.ingestion_service import ingestion_service
+from app.services.scene_index_service import scene_index_service
+
+logger = logging.getLogger(__name__)
+
+STREAM_KEY = "job_queue:start"
+GROUP_NAME = "start_workers"
+
+# Raised when a dependency is down or at capacity: nothing is wrong with the job, so it is queued again for later.
+RETRY_LATER_ERRORS = (CircuitOpenError, AdmissionRejected)
+
+async def prepare_video(job: db_models.Job):
+    """
+    Builds the scene index of a job's video and caches its context with Gemini for the conversation's tool calls.
+    Failures only cost later turns these shortcuts, so they are logged, not raised.
+    """
+    async def index_scenes():
+        try:
+            seconds = await scene_index_service.ensure_index(job)
+            if seconds is not None:
+                observe_stage("scene_index", seconds)
+        except Exception as e:
+            logger.warning("Failed to index the scenes of job %s: %s", job.id, e)
+
+    async def cache_context():
+        try:
+            await open_video_context(gemini_file_id=job.gemini_file_id or "", youtube_url=job.source_url or "")
+        except Exception as e:
+            logger.warning("Failed to cache the video context of job %s: %s", job.id, e)
+
+    preparations = [cache_context()]
+    if settings.SCENE_INDEX_ENABLED:
+        preparations.append(index_scenes())
+    await asyncio.gather(*preparations)
+
+async def run_start_job(payload: dict) -> Optional[asyncio.Task]:
+    """
+    Prepares a new conversation in the background: copies the uploaded video (if any) from S3 into Gemini unless a
+    usable Gemini file is recorded for it and waits for Gemini to process it, creates the ADK session and runs the first
+    turn while preparing the video for follow-ups, advancing the job PENDING -> PROCESSING -> ACTIVE, or ERROR on failure.
+    Runs again after an interrupted attempt: a settled job is left alone, a video already in Gemini is not uploaded
+    again and an existing ADK session is reused. A first turn interrupted after ADK ran it is sent again.
+    Once the first turn is stored, returns the still running preparation of the video for follow-ups, which the caller
+    awaits after acknowledging the job.
+    """
+    job_id = uuid.UUID(payload["job_id"])
+    user_id = payload["user_id"]
+    async with AsyncSessionLocal() as db:
+        job = await job_crud.transition_job_async(
+            db, job_id=job_id, user_id=user_id, status=db_models.JobStatus.PROCESSING,
+            # Uploaded videos go to Gemini and wait for its processing before ADK takes over.
+            current_agent=case(
+                (or_(db_models.Job.video_asset_hash.is_not(None), db_models.Job.gemini_file_id.is_not(None)), "Ingestion"),
+                else_="ADK",
+            ),
+        )
+        if not job:
+            # Missing, or already settled by an earlier delivery of this entry.
+            return
+
+        try:
+            if job.video_asset_hash and not job.gemini_file_id:
+                # Workers are bounded by their own concurrency, so they wait for a slot outside the request queue.
+                async with gemini_upload_admission.admit(user_id, max_wait=settings.JOB_VISIBILITY_TIMEOUT_SECONDS / 2, queue=False):
+                    ingested = await ingestion_service.ensure_gemini_file(job.video_asset_hash)
+                job = await job_crud.transition_job_async(
+                    db, job_id=job_id, user_id=user_id, status=db_models.JobStatus.PROCESSING,
+                    gemini_file_id=ingested.gemini_file_id,
+                    ingestion_timings={**(job.ingestion_timings or {}), **ingested.timings}
+                )
+                if not job:
+                    return
+
+            if job.gemini_file_id:
+                started = time.perf_counter()
+                await wait_for_gemini_file(job.gemini_file_id)
+                processing_seconds = time.perf_counter() - started
+                observe_stage("gemini_processing", processing_seconds)
+                job = await job_crud.transition_job_async(
+                    db, job_id=job_id, user_id=user_id, status=db_models.JobStatus.PROCESSING, current_agent="ADK",
+                    ingestion_timings={**(job.ingestion_timings or {}), "gemini_processing_seconds": processing_seconds}
+                )
+                if not job:
+                    return
+
+            # The first turn doesn't need the scene index or cached video context, so they are prepared alongside.
+            prepare_task = asyncio.create_task(prepare_video(job))
+            try:
+                async with adk_admission.admit(user_id, max_wait=settings.JOB_VISIBILITY_TIMEOUT_SECONDS / 2, queue=False):
+                    session_created = await adk_service.create_session(str(job.id), str(user_id))
+                    if not session_created:
+                        await job_crud.transition_job_async(db, job_id=job_id, user_id=user_id, status=db_models.JobStatus.ERROR, error_message="Failed to create ADK session.")
+                        return prepare_task
+
+                    await adk_service.run_chat_turn(db, job, user_id, payload["message"])
+            except BaseException:
+                await prepare_task
+                raise
+            return prepare_task
+        except RETRY_LATER_ERRORS:
+            # The worker queues the job again for later.
+            await db.rollback()
+            raise
+        except Exception as e:
+            await db.rollback()
+            await job_crud.transition_job_async(db, job_id=job_id, user_id=user_id, status=db_models.JobStatus.ERROR, error_message=f"Error processing job: {e}")
+
+async def fail_start_job(payload: dict, error_message: str):
+    """Marks a queued job as ERROR without running it, e.g. after too many delivery attempts."""
+    async with AsyncSessionLocal() as db:
+        await job_crud.transition_job_async(db, job_id=uuid.UUID(payload["job_id"]), user_id=payload["user_id"], status=db_models.JobStatus.ERROR, error_message=error_message)
+
+
+class JobQueue:
+    """
+    Redis Streams backed queue for new conversations, drained by a fixed number of worker tasks.
+
+    Entries stay pending in the consumer group until a worker acknowledges them, so work interrupted
+    by a crash or restart is reclaimed by another worker once the visibility timeout expires. A worker
+    renews its claim every third of the timeout while a job runs, so a slow job is never taken for an
+    abandoned one.
+    """
+    def __init__(self, client, concurrency: int, visibility_timeout: int, max_deliveries: int, max_requeues: int):
+        self.client = client
+        self.concurrency = concurrency
+        self.visibility_timeout_ms = visibility_timeout * 1000
+        self.max_deliveries = max_deliveries
+        self.max_requeues = max_requeues
+        self.consumer_prefix = f"{socket.gethostname()}-{os.getpid()}"
+        self._tasks: List[asyncio.Task] = []
+
+    async def enqueue_start(self, job_id: uuid.UUID, user_id: int, message: str) -> str:
+        """Queues the first turn of a new conversation and returns the stream entry id."""
+        payload = {
+            "job_id": str(job_id),
+            "user_id": user_id,
+            "message": message,
+            # The worker continues the request's trace, so the job's whole start is one trace.
+            "trace_context": inject_trace_context(),
+        }
+        return await self.client.xadd(STREAM_KEY, {"payload": json.dumps(payload)})
+
+    async def start(self):
+        """Creates the consumer group if needed and starts the worker tasks."""
+        try:
+            await self.client.xgroup_create(STREAM_KEY, GROUP_NAME, id="0", mkstream=True)
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+        self._tasks = [
+            asyncio.create_task(self._worker(f"{self.consumer_prefix}-{i}"))
+            for i in range(self.concurrency)
+        ]
+
+    async def stop(self):
+        """Cancels the worker tasks. Unacknowledged entries are picked up again after a restart."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _next_entry(self, consumer: str) -> Optional[Tuple[str, Optional[dict], int]]:
+        # Entries whose worker died before acknowledging them take priority over new work.
+        claimed = (await self.client.xautoclaim(
+            STREAM_KEY, GROUP_NAME, consumer, self.visibility_timeout_ms, start_id="0-0", count=1
+        ))[1]
+        if claimed:
+            entry_id, fields = claimed[0]
+            pending = await self.client.xpending_range(STREAM_KEY, GROUP_NAME, min=entry_id, max=entry_id, count=1)
+            deliveries = pending[0]["times_delivered"] if pending else 1
+            return entry_id, fields, deliveries
+
+        response = await self.client.xreadgroup(GROUP_NAME, consumer, {STREAM_KEY: ">"}, count=1, block=5000)
+        if not response:
+            return None
+        entry_id, fields = response[0][1][0]
+        return entry_id, fields, 1
+
+    async def _requeue(self, payload: dict, e):
+        """
+        Queues a job turned away by a dependency again once the dependency may take it, so the current entry can be
+        acknowledged instead of waiting out the visibility timeout. Fails the job after `max_requeues` attempts.
+        """
+        requeues = payload.get("requeues", 0) + 1
+        if requeues > self.max_requeues:
+            await fail_start_job(payload, f"A service is unavailable, please try again later: {e}")
+            return
+        delay = max(1.0, e.retry_after)
+        logger.warning("Job %s turned away (%s), queueing it again in %.0fs", payload["job_id"], e, delay)
+        await asyncio.sleep(delay)
+        await self.client.xadd(STREAM_KEY, {"payload": json.dumps({**payload, "requeues": requeues})})
+
+    async def _heartbeat(self, consumer: str, entry_id: str):
+        """Keeps renewing `consumer`'s claim on an entry, resetting its idle time, until cancelled."""
+        while True:
+            await asyncio.sleep(self.visibility_timeout_ms / 3000)
+            try:
+                pending = await self.client.xpending_range(STREAM_KEY, GROUP_NAME, min=entry_id, max=entry_id, count=1)
+                if not pending or pending[0]["consumer"] != consumer:
+                    # Reclaimed after renewals failed for a whole timeout; the job may now run twice.
+                    logger.warning("Job worker %s lost its claim on entry %s", consumer, entry_id)
+                    return
+                # JUSTID leaves the delivery count alone, so renewals don't count as redeliveries.
+                await self.client.xclaim(STREAM_KEY, GROUP_NAME, consumer, 0, [entry_id], justid=True)
+            except Exception as e:
+                logger.warning("Job worker %s failed to renew its claim on entry %s: %s", consumer, entry_id, e)
+
+    async def _worker(self, consumer: str):
+        while True:
+            try:
+                entry = await self._next_entry(consumer)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Job worker %s failed to read from the queue: %s", consumer, e)
+                await asyncio.sleep(1)
+                continue
+            if entry is None:
+                continue
+
+            entry_id, fields, deliveries = entry
+            heartbeat = asyncio.create_task(self._heartbeat(consumer, entry_id))
+            preparation = None
+            try:
+                if fields:
+                    payload = json.loads(fields["payload"])
+                    with tracer.start_as_current_span(
+                        "job.start", context=extract_trace_context(payload.get("trace_context")),
+                        attributes={"job.id": payload["job_id"], "job.delivery": deliveries},
+                    ):
+                        if deliveries > self.max_deliveries:
+                            await fail_start_job(payload, f"Job abandoned after {deliveries - 1} interrupted attempts.")
+                        else:
+                            try:
+                                preparation = await run_start_job(payload)
+                            except RETRY_LATER_ERRORS as e:
+                                await self._requeue(payload, e)
+                await self.client.xack(STREAM_KEY, GROUP_NAME, entry_id)
+                await self.client.xdel(STREAM_KEY, entry_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Left unacknowledged so the entry is retried after the visibility timeout.
+                logger.exception("Job worker %s failed on entry %s: %s", consumer, entry_id, e)
+            finally:
+                heartbeat.cancel()
+                await asyncio.gather(heartbeat, return_exceptions=True)
+            if preparation is not None:
+                # The job is done once its first turn is stored; a failed preparation only costs later turns a shortcut.
+                await preparation
+
+job_queue = JobQueue(
+    async_redis,
+    concurrency=settings.JOB_WORKER_CONCURRENCY,
+    visibility_timeout=settings.JOB_VISIBILITY_TIMEOUT_SECONDS,
+    max_deliveries=settings.JOB_MAX_DELIVERIES,
+    max_requeues=settings.JOB_MAX_REQUEUES,
+)
@@ -0,0 +1,137 @@
+import asyncio
+import json
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from redis.exceptions import ResponseError
+from sqlalchemy.exc import IntegrityError
+from app.core.config import settings
+from app.core.metrics import time_stage
+from app.core.redis_client import redis_client, async_redis
+from app.crud import chat_message_crud
+from app.db.session import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+STREAM_KEY = "chat_messages:pending"
+GROUP_NAME = "message_writers"
+
+class MessageWriter:
+    """
+    Writes chat messages queued on a Redis Stream to PostgreSQL in batches, one multi-row INSERT per batch.
+
+    A batch is written once it holds MESSAGE_WRITE_BATCH_SIZE messages or MESSAGE_WRITE_FLUSH_INTERVAL_SECONDS
+    have passed. Entries are acknowledged only after their batch is committed, so every message is written at least
+    once: a batch interrupted by a failure or restart is claimed again after the claim timeout, and rewriting a
+    message that is already stored is a no-op.
+    """
+    def __init__(self, client, batch_size: int, flush_interval: float, claim_idle: int):
+        self.client = client
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.claim_idle_ms = claim_idle * 1000
+        self.consumer = f"{socket.gethostname()}-{os.getpid()}"
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        """Creates the consumer group if needed and starts the writer task."""
+        try:
+            await self.client.xgroup_create(STREAM_KEY, GROUP_NAME, id="0", mkstream=True)
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Cancels the writer task. Unacknowledged entries are written after a restart."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _next_batch(self) -> List[Tuple[str, Optional[dict]]]:
+        # Batches left unacknowledged by a failed or interrupted write take priority over new messages.
+        claimed = (await self.client.xautoclaim(
+            STREAM_KEY, GROUP_NAME, self.consumer, self.claim_idle_ms, start_id="0-0", count=self.batch_size
+        ))[1]
+        if claimed:
+            return claimed
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.flush_interval
+        entries = []
+        while len(entries) < self.batch_size:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            response = await self.client.xreadgroup(
+                GROUP_NAME, self.consumer, {STREAM_KEY: ">"},
+                count=self.batch_size - len(entries), block=max(1, int(remaining * 1000))
+            )
+            if response:
+                entries.extend(response[0][1])
+        return entries
+
+    async def _write(self, entries: List[Tuple[str, Optional[dict]]]):
+        messages: Dict[str, dict] = {}
+        for _, fields in entries:
+            # Claimed entries that were deleted in the meantime come back without fields.
+            if fields:
+                message = json.loads(fields["message"])
+                messages[message["id"]] = message
+
+        rows = [
+            {
+                "id": uuid.UUID(message["id"]),
+                "job_id": uuid.UUID(message["job_id"]),
+                "sender": message["sender"],
+                "content": message["content"],
+                "created_at": datetime.fromisoformat(message["created_at"]),
+            }
+            for message in messages.values()
+        ]
+        if rows:
+            async with AsyncSessionLocal() as db:
+                try:
+                    with time_stage("db_message_batch"):
+                        await chat_message_crud.insert_messages(db, rows)
+                except IntegrityError:
+                    # A row that can never be stored would otherwise fail its whole batch on every retry.
+                    await db.rollback()
+                    for row in rows:
+                        try:
+                            await chat_message_crud.insert_messages(db, [row])
+                        except IntegrityError as e:
+                            await db.rollback()
+                            logger.error("Dropping chat message %s that cannot be stored: %s", row["id"], e)
+
+        entry_ids = [entry_id for entry_id, _ in entries]
+        pipe = self.client.pipeline(transaction=True)
+        pipe.xack(STREAM_KEY, GROUP_NAME, *entry_ids)
+        pipe.xdel(STREAM_KEY, *entry_ids)
+        for message in messages.values():
+            pipe.hdel(redis_client.history_pending_key(message["job_id"]), message["id"])
+        await pipe.execute()
+
+    async def _run(self):
+        while True:
+            try:
+                entries = await self._next_batch()
+                if entries:
+                    await self._write(entries)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Left unacknowledged so the batch is claimed again after the claim timeout.
+                logger.warning("Message writer %s failed to write a batch: %s", self.consumer, e)
+                await asyncio.sleep(1)
+
+message_writer = MessageWriter(
+    async_redis,
+    batch_size=settings.MESSAGE_WRITE_BATCH_SIZE,
+    flush_interval=settings.MESSAGE_WRITE_FLUSH_INTERVAL_SECONDS,
+    claim_idle=settings.MESSAGE_WRITE_CLAIM_IDLE_SECONDS,
+)
@@ -1,40 +1,153 @@
+import asyncio
 import boto3
-from botocore.exceptions import ClientError
+from botocore.config import Config
+from botocore.exceptions import ClientError, ConnectionError as BotoConnectionError, HTTPClientError
+from typing import AsyncIterator, Dict, List
 from app.core.config import settings
+from app.core.resilience import CircuitBreaker
+from app.core.tracing import tracer
 import logging
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# S3 rejects multipart parts smaller than this, except for the last one.
+MIN_PART_SIZE = 5 * 1024 * 1024
+
+def _is_s3_failure(e: BaseException) -> bool:
+    # Errors S3 answers on purpose, like a missing key or denied access, say nothing about its health.
+    if isinstance(e, ClientError):
+        return e.response.get("ResponseMetadata", {}).get("HTTPStatusCode", 0) >= 500
+    return isinstance(e, (BotoConnectionError, HTTPClientError))
+
 class S3Service:
     def __init__(self):
         self.s3_client = boto3.client(
             's3',
             aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-            aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY
+            aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+            region_name=settings.AWS_REGION or None,
+            endpoint_url=settings.AWS_S3_ENDPOINT_URL or None,
+            # botocore retries throttling, 5xx and connection errors itself, with jittered backoff.
+            config=Config(
+                max_pool_connections=settings.S3_MAX_POOL_CONNECTIONS,
+                retries={"max_attempts": settings.S3_MAX_ATTEMPTS, "mode": "standard"},
+            ),
+        )
+        self.breaker = CircuitBreaker(
+            "s3", settings.S3_BREAKER_FAILURES, settings.S3_BREAKER_RESET_SECONDS, is_failure=_is_s3_failure
         )
         self.bucket_name = settings.AWS_S3_BUCKET_NAME
+        self.part_size = max(settings.S3_MULTIPART_PART_SIZE, MIN_PART_SIZE)
+        self.max_concurrency = settings.S3_MULTIPART_CONCURRENCY
+
+    async def _call(self, method, **kwargs):
+        """Runs a blocking S3 client method in a thread, through the breaker."""
+        return await self.breaker.call(asyncio.to_thread, method, **kwargs)
+
+    def object_url(self, file_name: str) -> str:
+        """Returns the public URL of an object in the bucket."""
+        if settings.AWS_S3_ENDPOINT_URL:
+            return f"{settings.AWS_S3_ENDPOINT_URL.rstrip('/')}/{self.bucket_name}/{file_name}"
+        return f"https://{self.bucket_name}.s3.amazonaws.com/{file_name}"
 
-    async def upload_file(self, file_content: bytes, file_name: str, content_type: str) -> str:
+    async def upload_stream(self, chunks: AsyncIterator[bytes], file_name: str, content_type: str) -> str:
         """
-        Uploads a file to S3 and returns its public URL.
+        Uploads a stream of chunks to S3 as a multipart upload and returns its public URL.
+
+        Chunks are regrouped into parts of S3_MULTIPART_PART_SIZE bytes, and up to
+        S3_MULTIPART_CONCURRENCY parts are uploaded at once. Reading pauses while that many
+        parts are in flight, so memory stays bounded whatever the size of the stream.
+        The multipart upload is aborted if anything fails.
         """
+        with tracer.start_as_current_span("s3.upload_stream", attributes={"s3.key": file_name}):
+            return await self._upload_stream(chunks, file_name, content_type)
+
+    async def _upload_stream(self, chunks: AsyncIterator[bytes], file_name: str, content_type: str) -> str:
+        created = await self._call(
+            self.s3_client.create_multipart_upload,
+            Bucket=self.bucket_name,
+            Key=file_name,
+            ContentType=content_type,
+        )
+        upload_id = created["UploadId"]
+        slots = asyncio.Semaphore(self.max_concurrency)
+        tasks: List[asyncio.Task] = []
+
+        async def upload_part(part_number: int, body: bytes) -> Dict:
+            try:
+                with tracer.start_as_current_span("s3.upload_part", attributes={"s3.part_number": part_number, "s3.size_bytes": len(body)}):
+                    response = await self._call(
+                        self.s3_client.upload_part,
+                        Bucket=self.bucket_name,
+                        Key=file_name,
+                        UploadId=upload_id,
+                        PartNumber=part_number,
+                        Body=body,
+                    )
+                return {"PartNumber": part_number, "ETag": response["ETag"]}
+            finally:
+                slots.release()
+
+        async def submit(body: bytes):
+            await slots.acquire()
+            # Stop reading as soon as a part has failed instead of at the end of the stream.
+            for task in tasks:
+                if task.done() and task.exception():
+                    slots.release()
+                    raise task.exception()
+            tasks.append(asyncio.create_task(upload_part(len(tasks) + 1, body)))
+
         try:
-            self.s3_client.put_object(
+            buffer = bytearray()
+            async for chunk in chunks:
+                buffer.extend(chunk)
+                while len(buffer) >= self.part_size:
+                    await submit(bytes(buffer[:self.part_size]))
+                    del buffer[:self.part_size]
+            if buffer or not tasks:
+                await submit(bytes(buffer))
+
+            parts = await asyncio.gather(*tasks)
+            await self._call(
+                self.s3_client.complete_multipart_upload,
                 Bucket=self.bucket_name,
                 Key=file_name,
-                Body=file_content,
-                ContentType=content_type,
-                
+                UploadId=upload_id,
+                MultipartUpload={"Parts": parts},
             )
-            file_url = f"https://{self.bucket_name}.s3.amazonaws.com/{file_name}"
-            logger.info(f"Successfully uploaded {file_name} to S3. URL: {file_url}")
-            return file_url
-        except ClientError as e:
-            logger.error(f"Error uploading file to S3: {e}")
-            raise
-        except Exception as e:
-            logger.error(f"An unexpected error occurred during S3 upload: {e}")
+        except BaseException as e:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            logger.error("Multipart upload of %s failed, aborting: %r", file_name, e)
+            try:
+                await asyncio.to_thread(
+                    self.s3_client.abort_multipart_upload,
+                    Bucket=self.bucket_name,
+                    Key=file_name,
+                    UploadId=upload_id,
+                )
+            except Exception as abort_error:
+                logger.error("Failed to abort multipart upload %s of %s: %s", upload_id, file_name, abort_error)
             raise
 
-s3_service = S3Service()
\ No newline at end of file
+        file_url = self.object_url(file_name)
+        logger.info("Uploaded %s to S3 in %d parts: %s", file_name, len(tasks), file_url)
+        return file_url
+
+    async def download_stream(self, file_name: str, chunk_size: int) -> AsyncIterator[bytes]:
+        """Streams an object from the bucket in chunks of up to `chunk_size` bytes, reading each one when asked for it."""
+        with tracer.start_as_current_span("s3.get_object", attributes={"s3.key": file_name}):
+            response = await self._call(self.s3_client.get_object, Bucket=self.bucket_name, Key=file_name)
+        body = response["Body"]
+        try:
+            while chunk := await asyncio.to_thread(body.read, chunk_size):
+                yield chunk
+        finally:
+            body.close()
+
+    async def delete_file(self, file_name: str):
+        """Deletes an object from the bucket."""
+        await self._call(self.s3_client.delete_object, Bucket=self.bucket_name, Key=file_name)
+
+s3_service = S3Service()
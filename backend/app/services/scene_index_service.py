@@ -0,0 +1,81 @@
+import asyncio
+import json
+import logging
+import time
+from typing import List, Optional
+from google.genai import types
+from pydantic import BaseModel
+from app.agents.planner.agent import PLANNER_TOOL_MODEL, call_gemini, client
+from app.agents.planner.result_cache import youtube_video_identity
+from app.core.config import settings
+from app.crud import scene_index_crud
+from app.db.session import AsyncSessionLocal
+from app.models import db_models
+
+logger = logging.getLogger(__name__)
+
+INDEX_PROMPT = """Index this video so that questions about it can be answered later without watching it again.
+Split it into consecutive scenes, and for each scene give:
+- its start and end in seconds,
+- a detailed description of what is shown and what happens,
+- any on-screen text, verbatim (empty if there is none),
+- what is said during it, verbatim (empty if nothing is)."""
+
+class SceneSegment(BaseModel):
+    start_seconds: float
+    end_seconds: float
+    description: str
+    on_screen_text: str
+    transcript: str
+
+
+class SceneIndexService:
+    """
+    Builds the structured scene index of a job's video once, after ingestion. Jobs on a video that was indexed before,
+    such as a re-upload of the same content or another conversation on the same YouTube video, reuse its index.
+    """
+    def video_key(self, job: db_models.Job) -> Optional[str]:
+        if job.video_asset_hash:
+            return f"asset:{job.video_asset_hash}"
+        if job.source_url:
+            return youtube_video_identity(job.source_url)
+        return None
+
+    async def _generate(self, job: db_models.Job) -> List[dict]:
+        # Through the Gemini breaker and retries like every other call, and bounded, since the job waits for it.
+        if job.gemini_file_id:
+            video = await call_gemini(lambda: client.aio.files.get(name=job.gemini_file_id))
+        else:
+            video = types.Part(file_data=types.FileData(file_uri=job.source_url))
+        response = await call_gemini(lambda: asyncio.wait_for(
+            client.aio.models.generate_content(
+                model=PLANNER_TOOL_MODEL,
+                contents=[video, INDEX_PROMPT],
+                config=types.GenerateContentConfig(response_mime_type="application/json", response_schema=list[SceneSegment]),
+            ),
+            settings.SCENE_INDEX_TIMEOUT_SECONDS,
+        ))
+        return json.loads(response.text)
+
+    async def ensure_index(self, job: db_models.Job) -> Optional[float]:
+        """
+        Indexes the video of a job unless it already has an index. Returns the seconds spent indexing, or None if
+        there was nothing to do. Uses its own DB session, so it can run alongside the job's first turn.
+        """
+        video_key = self.video_key(job)
+        if video_key is None or not (job.gemini_file_id or job.source_url):
+            return None
+        # Separate short sessions, so no connection sits idle in a transaction while Gemini generates the index.
+        async with AsyncSessionLocal() as db:
+            if await scene_index_crud.get_scene_index(db, video_key):
+                return None
+        started = time.perf_counter()
+        segments = await self._generate(job)
+        async with AsyncSessionLocal() as db:
+            await scene_index_crud.create_scene_index(
+                db, video_key=video_key, model=PLANNER_TOOL_MODEL, segments=segments, video_asset_hash=job.video_asset_hash
+            )
+        logger.info("Indexed %d scenes of %s for job %s", len(segments), video_key, job.id)
+        return time.perf_counter() - started
+
+scene_index_service = SceneIndexService()
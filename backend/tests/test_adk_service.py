@@ -0,0 +1,95 @@
+import asyncio
+import json
+import uuid
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+import httpx
+import pytest
+from app.models import db_models
+from app.services import adk_service as adk_service_module
+from app.services.adk_service import AdkService
+
+
+def _sse(*events: dict) -> list:
+    return [f"data: {json.dumps(event)}\n\n".encode() for event in events]
+
+def _partial(text: str) -> dict:
+    return {"content": {"role": "model", "parts": [{"text": text}]}, "partial": True}
+
+ANSWER = _sse(_partial("A car "), _partial("chase."), {"content": {"role": "model", "parts": [{"text": "A car chase."}]}})
+
+
+@pytest.fixture
+def stored(monkeypatch):
+    """Stands in for the history and job writes of a turn, recording what they were asked to store."""
+    stored = SimpleNamespace(history=[], transitions=[])
+
+    async def add_messages_to_history(conversation_id, messages):
+        stored.history.append((conversation_id, messages))
+
+    async def transition_job_async(db, job_id, user_id, status, **values):
+        stored.transitions.append((job_id, status))
+
+    @asynccontextmanager
+    async def session():
+        yield None
+
+    monkeypatch.setattr(adk_service_module, "history_service", SimpleNamespace(add_messages_to_history=add_messages_to_history))
+    monkeypatch.setattr(adk_service_module, "job_crud", SimpleNamespace(transition_job_async=transition_job_async))
+    monkeypatch.setattr(adk_service_module, "AsyncSessionLocal", session)
+    return stored
+
+def _service(chunks: list, delay: float = 0.0) -> AdkService:
+    async def body():
+        for chunk in chunks:
+            await asyncio.sleep(delay)
+            yield chunk
+
+    service = AdkService("http://adk", "scenespeak")
+    service.client = httpx.AsyncClient(
+        base_url="http://adk", transport=httpx.MockTransport(lambda request: httpx.Response(200, content=body()))
+    )
+    return service
+
+def _job() -> db_models.Job:
+    return db_models.Job(id=uuid.uuid4(), status=db_models.JobStatus.ACTIVE)
+
+
+def test_streamed_turn_relays_events_and_stores_the_exchange(stored):
+    job = _job()
+    turn = _service(ANSWER).stream_chat_turn(job, 1, "What happens?")
+
+    async def listen():
+        events = [event async for event in turn]
+        await turn.wait()
+        return events
+
+    events = asyncio.run(listen())
+
+    assert [event for event, _ in events] == ["delta", "delta", "done"]
+    assert events[-1][1]["response"] == "A car chase."
+    assert stored.history == [(str(job.id), [("USER", "What happens?"), ("ASSISTANT", "A car chase.")])]
+    assert stored.transitions == [(job.id, db_models.JobStatus.ACTIVE)]
+
+def test_streamed_turn_is_stored_when_the_client_leaves_mid_answer(stored):
+    job = _job()
+    turn = _service(ANSWER, delay=0.05).stream_chat_turn(job, 1, "What happens?")
+
+    async def leave_after_first_delta():
+        events = turn.__aiter__()
+        first = await events.__anext__()
+        await events.aclose()
+        assert stored.history == []
+        await turn.wait()
+        return first
+
+    assert asyncio.run(leave_after_first_delta()) == ("delta", {"text": "A car "})
+    assert stored.history == [(str(job.id), [("USER", "What happens?"), ("ASSISTANT", "A car chase.")])]
+    assert stored.transitions == [(job.id, db_models.JobStatus.ACTIVE)]
+
+def test_turn_never_iterated_has_nothing_to_wait_for(stored):
+    turn = _service(ANSWER).stream_chat_turn(_job(), 1, "What happens?")
+
+    asyncio.run(turn.wait())
+
+    assert stored.history == []
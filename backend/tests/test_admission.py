@@ -0,0 +1,89 @@
+import asyncio
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+pytest.importorskip("lupa")
+
+from app.core.admission import AdmissionController, AdmissionRejected
+
+
+def _controller(global_limit: int = 2, per_user_limit: int = 1, queue_depth: int = 1, max_wait: float = 0.3, lease: float = 60) -> AdmissionController:
+    return AdmissionController(
+        fakeredis.FakeAsyncRedis(decode_responses=True), "test", "test",
+        global_limit=global_limit, per_user_limit=per_user_limit, queue_depth=queue_depth, max_wait=max_wait, lease=lease,
+    )
+
+
+def test_acquire_enforces_the_per_user_and_global_limits():
+    admission = _controller()
+
+    async def fill_up():
+        first = await admission.acquire(1)
+        with pytest.raises(AdmissionRejected) as own_cap:
+            await admission.acquire(1, max_wait=0.1)
+        await admission.acquire(2)
+        with pytest.raises(AdmissionRejected) as global_cap:
+            await admission.acquire(3, max_wait=0.1)
+        await admission.release(1, first)
+        third = await admission.acquire(3, max_wait=0)
+        return own_cap.value, global_cap.value, third, await admission.snapshot()
+
+    own_cap, global_cap, third, snapshot = asyncio.run(fill_up())
+
+    assert own_cap.status_code == 429
+    assert global_cap.status_code == 503
+    assert third is not None
+    assert (snapshot["in_flight"], snapshot["rejected_per_user"], snapshot["rejected_global"]) == (2, 1, 1)
+
+def test_queued_waiter_is_rejected_after_max_wait():
+    admission = _controller(global_limit=1)
+
+    async def wait_for_a_slot():
+        await admission.acquire(1)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        waiter = asyncio.create_task(admission.acquire(2))
+        await asyncio.sleep(0.05)
+        # The queue holds one waiter, so the next caller is turned away at once.
+        with pytest.raises(AdmissionRejected):
+            await admission.acquire(3)
+        with pytest.raises(AdmissionRejected) as rejected:
+            await waiter
+        return loop.time() - started, rejected.value, await admission.snapshot()
+
+    waited, rejected, snapshot = asyncio.run(wait_for_a_slot())
+
+    assert waited >= admission.max_wait
+    assert rejected.status_code == 503
+    assert (snapshot["in_flight"], snapshot["waiting"], snapshot["rejected_global"]) == (1, 0, 2)
+
+def test_queued_waiter_takes_a_released_slot():
+    admission = _controller(global_limit=1, max_wait=5)
+
+    async def wait_for_a_slot():
+        holder = await admission.acquire(1)
+        waiter = asyncio.create_task(admission.acquire(2))
+        await asyncio.sleep(0.1)
+        await admission.release(1, holder)
+        return await waiter, await admission.snapshot()
+
+    token, snapshot = asyncio.run(wait_for_a_slot())
+
+    assert token is not None
+    assert (snapshot["in_flight"], snapshot["waiting"]) == (1, 0)
+
+def test_slot_of_a_holder_that_never_releases_frees_when_its_lease_runs_out():
+    admission = _controller(global_limit=1, max_wait=2, lease=0.3)
+
+    async def outlive_the_holder():
+        # Taken by a worker that dies before releasing it.
+        await admission.acquire(1)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        token = await admission.acquire(2)
+        return token, loop.time() - started
+
+    token, waited = asyncio.run(outlive_the_holder())
+
+    assert token is not None
+    assert 0.2 <= waited < admission.max_wait
@@ -0,0 +1,52 @@
+import asyncio
+import httpx
+import pytest
+from app.agents.planner import agent
+from app.core.resilience import CLOSED, CircuitBreaker
+
+UPLOAD_URL = "https://upload.example.com/files?upload_id=1"
+AsyncClient = httpx.AsyncClient
+
+
+@pytest.fixture
+def breaker(monkeypatch):
+    breaker = CircuitBreaker("gemini-test", failure_threshold=2, reset_timeout=60, is_failure=agent._is_gemini_failure)
+    monkeypatch.setattr(agent, "gemini_breaker", breaker)
+    return breaker
+
+def _answer(monkeypatch, start_status: int, chunk_status: int):
+    def handler(request: httpx.Request) -> httpx.Response:
+        if str(request.url) != UPLOAD_URL:
+            return httpx.Response(start_status, headers={"x-goog-upload-url": UPLOAD_URL})
+        return httpx.Response(chunk_status, headers={"x-goog-upload-status": "final"}, json={"file": {"name": "files/abc"}})
+
+    monkeypatch.setattr(agent.httpx, "AsyncClient", lambda **kwargs: AsyncClient(transport=httpx.MockTransport(handler), **kwargs))
+
+async def _chunks():
+    yield b"video"
+
+def _upload():
+    return asyncio.run(agent.upload_stream_to_gemini(_chunks(), 5, "video/mp4", "clip.mp4"))
+
+
+@pytest.mark.parametrize("start_status, chunk_status", [(503, 200), (200, 503)])
+def test_server_errors_during_an_upload_count_against_the_breaker(monkeypatch, breaker, start_status, chunk_status):
+    _answer(monkeypatch, start_status, chunk_status)
+
+    for _ in range(2):
+        with pytest.raises(httpx.HTTPStatusError):
+            _upload()
+
+    with pytest.raises(agent.CircuitOpenError):
+        _upload()
+
+def test_client_errors_and_finished_uploads_leave_the_breaker_closed(monkeypatch, breaker):
+    _answer(monkeypatch, 400, 200)
+    for _ in range(3):
+        with pytest.raises(httpx.HTTPStatusError):
+            _upload()
+
+    _answer(monkeypatch, 200, 200)
+
+    assert _upload() == "files/abc"
+    assert (breaker.state, breaker.failures) == (CLOSED, 0)
@@ -0,0 +1,144 @@
+import asyncio
+import datetime
+import time
+import httpx
+import pytest
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+from google.auth import crypt, jwt
+from app.security.google_id_token import GoogleIdTokenVerifier
+
+CLIENT_ID = "scenespeak.apps.googleusercontent.com"
+
+
+class SigningKey:
+    """An RSA key with the self-signed certificate Google would publish for it under `kid`."""
+    def __init__(self, kid: str):
+        key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, kid)])
+        now = datetime.datetime.now(datetime.timezone.utc)
+        certificate = (
+            x509.CertificateBuilder()
+            .subject_name(name).issuer_name(name).public_key(key.public_key())
+            .serial_number(x509.random_serial_number())
+            .not_valid_before(now - datetime.timedelta(days=1)).not_valid_after(now + datetime.timedelta(days=1))
+            .sign(key, hashes.SHA256())
+        )
+        self.kid = kid
+        self.cert = certificate.public_bytes(serialization.Encoding.PEM).decode()
+        pem = key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption())
+        self.signer = crypt.RSASigner.from_string(pem, kid)
+
+    def token(self, expires_in: int = 3600, **claims) -> str:
+        now = int(time.time())
+        payload = {"iss": "https://accounts.google.com", "aud": CLIENT_ID, "sub": "1234", "email": "viewer@example.com",
+                   "iat": now, "exp": now + expires_in, **claims}
+        return jwt.encode(self.signer, payload).decode()
+
+
+class CertsEndpoint:
+    """Serves the certificates of `keys` like Google's certs URL, counting the fetches."""
+    def __init__(self, *keys: SigningKey, max_age: int = 3600):
+        self.keys = list(keys)
+        self.max_age = max_age
+        self.fetches = 0
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.fetches += 1
+        return httpx.Response(
+            200, json={key.kid: key.cert for key in self.keys}, headers={"Cache-Control": f"public, max-age={self.max_age}"}
+        )
+
+
+def _verifier(endpoint: CertsEndpoint, refresh_margin: float = 0.0, min_refresh_interval: float = 0.0) -> GoogleIdTokenVerifier:
+    verifier = GoogleIdTokenVerifier(
+        "https://certs.example.com", CLIENT_ID,
+        refresh_margin=refresh_margin, min_refresh_interval=min_refresh_interval, clock_skew=0,
+    )
+    verifier._client = httpx.AsyncClient(transport=httpx.MockTransport(endpoint))
+    return verifier
+
+
+def test_verify_uses_the_cached_certificates():
+    key = SigningKey("key-1")
+    endpoint = CertsEndpoint(key)
+    verifier = _verifier(endpoint)
+
+    async def verify_twice():
+        first = await verifier.verify(key.token())
+        second = await verifier.verify(key.token(sub="5678"))
+        await verifier.close()
+        return first, second
+
+    first, second = asyncio.run(verify_twice())
+
+    assert (first["sub"], second["sub"]) == ("1234", "5678")
+    assert endpoint.fetches == 1
+
+def test_unknown_kid_refreshes_the_certificates():
+    old_key, new_key = SigningKey("key-1"), SigningKey("key-2")
+    endpoint = CertsEndpoint(old_key)
+    verifier = _verifier(endpoint)
+
+    async def verify_across_rotation():
+        await verifier.verify(old_key.token())
+        # Google publishes a new key before its cached certificates expire.
+        endpoint.keys.append(new_key)
+        claims = await verifier.verify(new_key.token())
+        await verifier.close()
+        return claims
+
+    claims = asyncio.run(verify_across_rotation())
+
+    assert claims["sub"] == "1234"
+    assert endpoint.fetches == 2
+    assert set(verifier.certs) == {"key-1", "key-2"}
+
+def test_unknown_kid_refreshes_at_most_every_min_refresh_interval():
+    key, unpublished_key = SigningKey("key-1"), SigningKey("key-2")
+    endpoint = CertsEndpoint(key)
+    verifier = _verifier(endpoint, min_refresh_interval=60.0)
+
+    async def verify_unpublished():
+        await verifier.verify(key.token())
+        for _ in range(3):
+            with pytest.raises(ValueError):
+                await verifier.verify(unpublished_key.token())
+        await verifier.close()
+
+    asyncio.run(verify_unpublished())
+
+    assert endpoint.fetches == 1
+
+def test_certificates_are_refreshed_when_their_max_age_runs_out():
+    key = SigningKey("key-1")
+    endpoint = CertsEndpoint(key, max_age=1)
+    verifier = _verifier(endpoint, min_refresh_interval=0.1)
+
+    async def run_past_expiry():
+        await verifier.start()
+        first_expiry = verifier.expires_at
+        await asyncio.sleep(1.5)
+        await verifier.close()
+        return first_expiry
+
+    first_expiry = asyncio.run(run_past_expiry())
+
+    assert endpoint.fetches == 2
+    assert verifier.expires_at > first_expiry
+
+def test_expired_token_is_rejected_without_a_refresh():
+    key = SigningKey("key-1")
+    endpoint = CertsEndpoint(key)
+    verifier = _verifier(endpoint)
+
+    async def verify_expired():
+        with pytest.raises(ValueError, match="expired"):
+            await verifier.verify(key.token(expires_in=-60))
+        await verifier.close()
+
+    asyncio.run(verify_expired())
+
+    assert endpoint.fetches == 1
@@ -0,0 +1,65 @@
+import asyncio
+import pytest
+from sqlalchemy.orm import Session
+
+pytest.importorskip("aiosqlite")
+
+from app.crud import job_crud
+from app.models import db_models
+
+
+@pytest.fixture
+def jobs(database):
+    """Two users with a job each; yields the async session factory, the job IDs by owner and the owners."""
+    sync_engine, sessions = database
+    with Session(sync_engine, expire_on_commit=False) as db:
+        owner = db_models.User(email="owner@example.com", first_name="Ada", last_name="Owner")
+        other = db_models.User(email="other@example.com", first_name="Bob", last_name="Other")
+        db.add_all([owner, other])
+        db.flush()
+        job = db_models.Job(
+            user_id=owner.id, title="Scene", prompt="What happens?", status=db_models.JobStatus.PENDING,
+            job_type=db_models.JobType.TEXT,
+        )
+        db.add(job)
+        db.commit()
+    return sessions, job.id, owner.id, other.id
+
+
+def _transition(sessions, job_id, user_id, *statuses):
+    """Makes each transition in turn; returns the status each one returned (None if refused) and the job after them."""
+    async def transition():
+        async with sessions() as db:
+            moved = []
+            for status in statuses:
+                job = await job_crud.transition_job_async(db, job_id, user_id, status)
+                moved.append(job.status if job is not None else None)
+            current = await job_crud.get_job_async(db, job_id, user_id)
+        return moved, current
+    return asyncio.run(transition())
+
+
+def test_allowed_transitions_are_applied(jobs):
+    sessions, job_id, owner_id, _ = jobs
+
+    moved, current = _transition(sessions, job_id, owner_id, db_models.JobStatus.PROCESSING, db_models.JobStatus.ACTIVE)
+
+    assert moved == [db_models.JobStatus.PROCESSING, db_models.JobStatus.ACTIVE]
+    assert current.status == db_models.JobStatus.ACTIVE
+
+def test_disallowed_transition_is_refused(jobs):
+    sessions, job_id, owner_id, _ = jobs
+
+    moved, current = _transition(sessions, job_id, owner_id, db_models.JobStatus.ERROR, db_models.JobStatus.PROCESSING)
+
+    assert moved == [db_models.JobStatus.ERROR, None]
+    assert current.status == db_models.JobStatus.ERROR
+
+def test_transition_of_another_users_job_is_refused(jobs):
+    sessions, job_id, owner_id, other_id = jobs
+
+    moved, _ = _transition(sessions, job_id, other_id, db_models.JobStatus.PROCESSING)
+    _, current = _transition(sessions, job_id, owner_id)
+
+    assert moved == [None]
+    assert current.status == db_models.JobStatus.PENDING
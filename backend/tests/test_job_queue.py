@@ -0,0 +1,81 @@
+import asyncio
+import json
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+from app.services import job_queue as job_queue_module
+from app.services.job_queue import GROUP_NAME, STREAM_KEY, JobQueue
+
+
+class FakeStreamRedis(fakeredis.FakeAsyncRedis):
+    """fakeredis answers a blocking XREADGROUP at once; waiting a little keeps idle workers from spinning."""
+    async def xreadgroup(self, *args, **kwargs):
+        response = await super().xreadgroup(*args, **kwargs)
+        if not response:
+            await asyncio.sleep(0.05)
+        return response
+
+
+class Runs:
+    """What the stand-in for run_start_job did, and how it behaves."""
+    def __init__(self):
+        self.started = []
+        self.finished = []
+        self.duration = 0.0
+        self.preparation = None
+
+
+@pytest.fixture
+def runs(monkeypatch):
+    """Replaces run_start_job with one that takes `duration` seconds, recording each run's job id."""
+    runs = Runs()
+
+    async def run_start_job(payload):
+        runs.started.append(payload["job_id"])
+        await asyncio.sleep(runs.duration)
+        runs.finished.append(payload["job_id"])
+        return runs.preparation
+
+    monkeypatch.setattr(job_queue_module, "run_start_job", run_start_job)
+    return runs
+
+
+def test_job_running_past_the_visibility_timeout_is_not_redelivered(runs):
+    runs.duration = 2.5
+    client = FakeStreamRedis(decode_responses=True)
+    queue = JobQueue(client, concurrency=2, visibility_timeout=1, max_deliveries=3, max_requeues=3)
+
+    async def run():
+        await queue.start()
+        await client.xadd(STREAM_KEY, {"payload": json.dumps({"job_id": "job-1", "user_id": 1, "message": "Hi"})})
+        await asyncio.sleep(3.5)
+        await queue.stop()
+        return await client.xpending(STREAM_KEY, GROUP_NAME)
+
+    pending = asyncio.run(run())
+
+    assert runs.started == ["job-1"]
+    assert runs.finished == ["job-1"]
+    assert pending["pending"] == 0
+
+def test_job_is_acknowledged_before_its_preparation_finishes(runs):
+    client = FakeStreamRedis(decode_responses=True)
+    queue = JobQueue(client, concurrency=1, visibility_timeout=1, max_deliveries=3, max_requeues=3)
+    pending_while_preparing = []
+
+    async def prepare():
+        await asyncio.sleep(0.2)
+        pending_while_preparing.append((await client.xpending(STREAM_KEY, GROUP_NAME))["pending"])
+
+    async def run():
+        runs.preparation = asyncio.create_task(prepare())
+        await queue.start()
+        await client.xadd(STREAM_KEY, {"payload": json.dumps({"job_id": "job-1", "user_id": 1, "message": "Hi"})})
+        await asyncio.sleep(0.5)
+        await queue.stop()
+
+    asyncio.run(run())
+
+    assert runs.finished == ["job-1"]
+    assert pending_while_preparing == [0]
@@ -0,0 +1,108 @@
+import asyncio
+import json
+import uuid
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+fakeredis = pytest.importorskip("fakeredis")
+pytest.importorskip("aiosqlite")
+
+from app.core.redis_client import redis_client
+from app.models import db_models
+from app.services import message_writer as message_writer_module
+from app.services.message_writer import GROUP_NAME, STREAM_KEY, MessageWriter
+
+
+@pytest.fixture
+def writer(database, monkeypatch):
+    """
+    A writer on fakeredis that stores into SQLite and claims unacknowledged entries at once. Yields it, the async
+    session factory and the ID of the job its messages belong to.
+    """
+    sync_engine, sessions = database
+    with Session(sync_engine, expire_on_commit=False) as db:
+        user = db_models.User(email="viewer@example.com", first_name="Ada", last_name="Viewer")
+        db.add(user)
+        db.flush()
+        job = db_models.Job(
+            user_id=user.id, title="Scene", prompt="What happens?", status=db_models.JobStatus.ACTIVE,
+            job_type=db_models.JobType.TEXT,
+        )
+        db.add(job)
+        db.commit()
+    monkeypatch.setattr(message_writer_module, "AsyncSessionLocal", sessions)
+    writer = MessageWriter(fakeredis.FakeAsyncRedis(decode_responses=True), batch_size=10, flush_interval=0.1, claim_idle=0)
+    return writer, sessions, str(job.id)
+
+
+async def _record(writer: MessageWriter, job_id: str, *contents):
+    """Queues messages the way history_service.add_messages does, returning their IDs."""
+    created_at = datetime.utcnow()
+    ids = []
+    for i, content in enumerate(contents):
+        message = {
+            "id": str(uuid.uuid4()), "job_id": job_id, "sender": "USER", "content": content,
+            "created_at": (created_at + timedelta(microseconds=i)).isoformat(),
+        }
+        value = json.dumps(message)
+        await writer.client.hset(redis_client.history_pending_key(job_id), message["id"], value)
+        await writer.client.xadd(STREAM_KEY, {"message": value})
+        ids.append(message["id"])
+    return ids
+
+async def _stored(sessions):
+    async with sessions() as db:
+        result = await db.execute(select(db_models.ChatMessage).order_by(db_models.ChatMessage.created_at))
+        return [(str(message.id), message.content) for message in result.scalars()]
+
+async def _left_over(writer: MessageWriter, job_id: str):
+    """The entries still pending or queued, and the messages still marked as not yet written."""
+    pending = await writer.client.xpending(STREAM_KEY, GROUP_NAME)
+    return pending["pending"], await writer.client.xlen(STREAM_KEY), await writer.client.hlen(redis_client.history_pending_key(job_id))
+
+
+def test_redelivered_batch_is_written_once(writer, caplog):
+    writer, sessions, job_id = writer
+
+    async def write_twice():
+        await writer.client.xgroup_create(STREAM_KEY, GROUP_NAME, id="0", mkstream=True)
+        ids = await _record(writer, job_id, "What happens?", "The hero leaves.")
+        batch = await writer._next_batch()
+        # The batch is committed, but the writer dies before acknowledging it.
+        real_pipeline = writer.client.pipeline
+        def lost_connection(*args, **kwargs):
+            raise ConnectionError("redis went away")
+        writer.client.pipeline = lost_connection
+        with pytest.raises(ConnectionError):
+            await writer._write(batch)
+        writer.client.pipeline = real_pipeline
+
+        redelivered = await writer._next_batch()
+        await writer._write(redelivered)
+        return ids, batch, redelivered, await _stored(sessions), await _left_over(writer, job_id)
+
+    ids, batch, redelivered, stored, left_over = asyncio.run(write_twice())
+
+    assert [entry_id for entry_id, _ in redelivered] == [entry_id for entry_id, _ in batch]
+    assert stored == [(ids[0], "What happens?"), (ids[1], "The hero leaves.")]
+    assert left_over == (0, 0, 0)
+    # The stored rows were skipped by the batch INSERT, not dropped one by one after it failed.
+    assert "Dropping chat message" not in caplog.text
+
+def test_row_that_cannot_be_stored_is_dropped_from_its_batch(writer, caplog):
+    writer, sessions, job_id = writer
+
+    async def write_batch():
+        await writer.client.xgroup_create(STREAM_KEY, GROUP_NAME, id="0", mkstream=True)
+        # A message without content fails the NOT NULL constraint, and with it the multi-row INSERT.
+        ids = await _record(writer, job_id, "What happens?", None, "The hero leaves.")
+        await writer._write(await writer._next_batch())
+        return ids, await _stored(sessions), await _left_over(writer, job_id)
+
+    ids, stored, left_over = asyncio.run(write_batch())
+
+    assert stored == [(ids[0], "What happens?"), (ids[2], "The hero leaves.")]
+    assert left_over == (0, 0, 0)
+    assert f"Dropping chat message {ids[1]}" in caplog.text
@@ -0,0 +1,62 @@
+import asyncio
+import pytest
+
+moto = pytest.importorskip("moto")
+
+from app.core.config import settings
+from app.services.s3_service import MIN_PART_SIZE, S3Service
+
+CHUNK_SIZE = 1024 * 1024
+
+
+@pytest.fixture
+def s3():
+    with moto.mock_aws():
+        service = S3Service()
+        service.part_size = MIN_PART_SIZE
+        service.s3_client.create_bucket(Bucket=settings.AWS_S3_BUCKET_NAME)
+        yield service
+
+
+def _body(size: int) -> bytes:
+    return bytes(i % 251 for i in range(size))
+
+async def _chunks(body: bytes, fail_after: int = None):
+    for offset in range(0, len(body), CHUNK_SIZE):
+        if fail_after is not None and offset >= fail_after:
+            raise IOError("client went away")
+        yield body[offset:offset + CHUNK_SIZE]
+
+
+def test_upload_stream_uploads_parts_and_completes(s3):
+    body = _body(2 * MIN_PART_SIZE + 123)
+
+    url = asyncio.run(s3.upload_stream(_chunks(body), "videos/clip.mp4", "video/mp4"))
+
+    assert url == s3.object_url("videos/clip.mp4")
+    stored = s3.s3_client.get_object(Bucket=s3.bucket_name, Key="videos/clip.mp4")
+    assert stored["Body"].read() == body
+    assert stored["ContentType"] == "video/mp4"
+    assert stored["ETag"].strip('"').endswith("-3")
+    assert not s3.s3_client.list_multipart_uploads(Bucket=s3.bucket_name).get("Uploads")
+
+def test_upload_stream_aborts_when_the_stream_fails(s3):
+    body = _body(2 * MIN_PART_SIZE)
+
+    with pytest.raises(IOError, match="client went away"):
+        asyncio.run(s3.upload_stream(_chunks(body, fail_after=MIN_PART_SIZE + CHUNK_SIZE), "videos/clip.mp4", "video/mp4"))
+
+    assert not s3.s3_client.list_multipart_uploads(Bucket=s3.bucket_name).get("Uploads")
+    assert not s3.s3_client.list_objects_v2(Bucket=s3.bucket_name).get("Contents")
+
+def test_download_stream_reads_the_object_in_chunks(s3):
+    body = _body(3 * CHUNK_SIZE + 17)
+    s3.s3_client.put_object(Bucket=s3.bucket_name, Key="videos/clip.mp4", Body=body)
+
+    async def download():
+        return [chunk async for chunk in s3.download_stream("videos/clip.mp4", CHUNK_SIZE)]
+
+    chunks = asyncio.run(download())
+
+    assert [len(chunk) for chunk in chunks] == [CHUNK_SIZE, CHUNK_SIZE, CHUNK_SIZE, 17]
+    assert b"".join(chunks) == body
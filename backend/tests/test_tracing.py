@@ -0,0 +1,119 @@
+import asyncio
+import json
+import httpx
+import pytest
+from opentelemetry.trace import format_span_id, format_trace_id
+from sqlalchemy.orm import Session
+
+fakeredis = pytest.importorskip("fakeredis")
+pytest.importorskip("aiosqlite")
+
+import redis.asyncio
+from fakeredis.aioredis import FakeAsyncRedisConnection
+from fastapi.testclient import TestClient
+from app.api import chat, dependencies
+from app.core import tracing
+from app.core.admission import AdmissionController
+from app.core.metrics import InstrumentedAsyncRedis
+from app.main import app
+from app.models import db_models
+from app.services.adk_service import adk_service
+from app.services.history_service import history_service
+
+
+@pytest.fixture
+def traced_app(database, monkeypatch):
+    """
+    The app with its DB on SQLite, its Redis on fakeredis and ADK answered in process, all instrumented as in
+    production. Yields the client, the job to post to and the ADK requests seen.
+    """
+    sync_engine, sessions = database
+    with Session(sync_engine, expire_on_commit=False) as db:
+        user = db_models.User(email="viewer@example.com", first_name="Ada", last_name="Viewer")
+        db.add(user)
+        db.flush()
+        job = db_models.Job(
+            user_id=user.id, title="Scene", prompt="What happens?", status=db_models.JobStatus.ACTIVE,
+            job_type=db_models.JobType.TEXT,
+        )
+        db.add(job)
+        db.commit()
+
+    tracing.instrument_engine(sessions.kw["bind"].sync_engine, "async")
+
+    async def get_async_db():
+        async with sessions() as session:
+            yield session
+
+    async def get_current_user_async():
+        return user
+
+    server = fakeredis.FakeServer()
+    fake_redis = InstrumentedAsyncRedis(
+        connection_pool=redis.asyncio.ConnectionPool(connection_class=FakeAsyncRedisConnection, server=server),
+        metrics_client="app",
+    )
+    monkeypatch.setattr(history_service, "async_client", fake_redis)
+    monkeypatch.setattr(chat, "adk_admission", AdmissionController(
+        fake_redis, "adk", "conversation", global_limit=10, per_user_limit=2, queue_depth=10, max_wait=1.0, lease=60.0,
+    ))
+
+    adk_requests = []
+
+    def answer_adk(request: httpx.Request) -> httpx.Response:
+        adk_requests.append(request)
+        return httpx.Response(200, json=[{"content": {"role": "model", "parts": [{"text": "A chase."}]}}])
+
+    monkeypatch.setattr(adk_service, "client", httpx.AsyncClient(base_url="http://adk", transport=httpx.MockTransport(answer_adk)))
+    app.dependency_overrides[dependencies.get_async_db] = get_async_db
+    app.dependency_overrides[dependencies.get_current_user_async] = get_current_user_async
+    tracing.span_exporter.clear()
+    try:
+        yield TestClient(app), job, adk_requests
+    finally:
+        app.dependency_overrides.clear()
+
+
+def _only(spans, name):
+    matching = [span for span in spans if span.name == name]
+    assert len(matching) == 1, f"expected one {name!r} span, got {[span.name for span in spans]}"
+    return matching[0]
+
+def _children(spans, parent, name):
+    return [span for span in spans if span.name == name and span.parent is not None and span.parent.span_id == parent.context.span_id]
+
+
+def test_chat_turn_spans_hang_off_the_route_span(traced_app):
+    client, job, adk_requests = traced_app
+
+    response = client.post(f"/api/chat/{job.id}", data={"message": "What happens next?"})
+
+    assert response.status_code == 200
+    assert response.json()["response"] == "A chase."
+    spans = tracing.span_exporter.get_finished_spans()
+    route = _only(spans, "POST /api/chat/{job_id}")
+    assert route.parent is None
+    assert all(span.context.trace_id == route.context.trace_id for span in spans)
+
+    # The ADK call is a stage of the route, and ADK is handed that stage's span as its parent.
+    adk_run = _only(_children(spans, route, "adk_run"), "adk_run")
+    assert len(adk_requests) == 1
+    traceparent = adk_requests[0].headers["traceparent"]
+    assert traceparent.split("-")[1:3] == [format_trace_id(route.context.trace_id), format_span_id(adk_run.context.span_id)]
+    assert json.loads(adk_requests[0].content)["session_id"] == str(job.id)
+
+    history_write = _only(_children(spans, route, "history_write"), "history_write")
+    assert _children(spans, history_write, "redis PIPELINE")
+
+    transition = _only(_children(spans, route, "db_job_transition"), "db_job_transition")
+    assert _children(spans, transition, "db UPDATE")
+    assert _children(spans, route, "db SELECT")
+
+
+def test_redis_commands_outside_a_trace_start_no_spans(traced_app):
+    async def poll():
+        await history_service.async_client.set("key", "value")
+
+    asyncio.run(poll())
+
+    assert not [span for span in tracing.span_exporter.get_finished_spans() if span.name.startswith("redis")]
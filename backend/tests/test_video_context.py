@@ -0,0 +1,103 @@
+import asyncio
+from types import SimpleNamespace
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+from app.agents.planner.video_context import VideoContextCache
+
+MODEL = "gemini-2.5-flash"
+TTL = 600
+VIDEO = "files/abc123"
+KEY = f"video_context:{MODEL}:{VIDEO}"
+
+
+class StubCaches:
+    """Stands in for genai_client.aio.caches, recording the calls made to it."""
+    def __init__(self):
+        self.created = []
+        self.updated = []
+        self.deleted = []
+        self.before_create = None
+        self.fail_update = False
+
+    async def create(self, model, config):
+        await asyncio.sleep(0)
+        if self.before_create is not None:
+            await self.before_create()
+        self.created.append(config)
+        return SimpleNamespace(name=f"cachedContents/{len(self.created)}")
+
+    async def update(self, name, config):
+        if self.fail_update:
+            raise RuntimeError("404 cached content not found")
+        self.updated.append((name, config.ttl))
+
+    async def delete(self, name):
+        self.deleted.append(name)
+
+
+@pytest.fixture
+def caches():
+    return StubCaches()
+
+@pytest.fixture
+def cache(caches):
+    genai_client = SimpleNamespace(aio=SimpleNamespace(caches=caches))
+    return VideoContextCache(genai_client, fakeredis.FakeAsyncRedis(decode_responses=True), MODEL, TTL)
+
+
+def test_lookup_hit_leaves_a_fresh_handle_alone(cache, caches):
+    async def lookup():
+        await cache.redis_client.set(KEY, "cachedContents/1", ex=TTL)
+        return await cache.lookup(VIDEO)
+
+    assert asyncio.run(lookup()) == "cachedContents/1"
+    assert caches.updated == []
+
+def test_lookup_miss_returns_none(cache, caches):
+    assert asyncio.run(cache.lookup(VIDEO)) is None
+    assert caches.updated == []
+
+def test_lookup_extends_a_handle_past_half_its_ttl(cache, caches):
+    async def lookup():
+        await cache.redis_client.set(KEY, "cachedContents/1", ex=TTL // 4)
+        name = await cache.lookup(VIDEO)
+        return name, await cache.redis_client.ttl(KEY)
+
+    name, remaining = asyncio.run(lookup())
+
+    assert name == "cachedContents/1"
+    assert caches.updated == [("cachedContents/1", f"{TTL}s")]
+    assert remaining > TTL / 2
+
+def test_lookup_forgets_a_handle_gemini_no_longer_has(cache, caches):
+    caches.fail_update = True
+
+    async def lookup():
+        await cache.redis_client.set(KEY, "cachedContents/1", ex=TTL // 4)
+        return await cache.lookup(VIDEO), await cache.redis_client.get(KEY)
+
+    assert asyncio.run(lookup()) == (None, None)
+
+def test_create_in_background_creates_once_and_stores_the_handle(cache, caches):
+    async def create():
+        cache.create_in_background(VIDEO, ["video part"])
+        cache.create_in_background(VIDEO, ["video part"])
+        await asyncio.gather(*cache._background)
+        return await cache.redis_client.get(KEY), await cache.redis_client.ttl(KEY)
+
+    name, remaining = asyncio.run(create())
+
+    assert name == "cachedContents/1"
+    assert 0 < remaining <= TTL
+    assert len(caches.created) == 1
+    assert caches.created[0].ttl == f"{TTL}s"
+
+def test_create_keeps_the_handle_another_process_stored_first(cache, caches):
+    async def store_other_handle():
+        await cache.redis_client.set(KEY, "cachedContents/other", ex=TTL)
+    caches.before_create = store_other_handle
+
+    assert asyncio.run(cache.create(VIDEO, ["video part"])) == "cachedContents/other"
+    assert caches.deleted == ["cachedContents/1"]